@@ -11,22 +11,59 @@ MODEL_CONFIG = {
     "input_shape": (224, 224, 3),
     "target_size": (224, 224),
     "batch_size": 32,
+    "prefetch_depth": 2,
+    "decode_workers": None,
     "epochs": 50,
     "learning_rate": 0.0001,
     "validation_split": 0.2,
     "model_name": "plant_classifier.onnx",
     "backup_model_name": "plant_classifier_backup.onnx",
+    "model_variant": "fp32",
+    "model_variants": {
+        "fp32": "plant_classifier.onnx",
+        "int8_dinamico": "plant_classifier_int8_dynamic.onnx",
+        "int8_estatico": "plant_classifier_int8_qdq.onnx"
+    },
     "species_list_name": "species_list.json",
     "base_model": "MobileNetV2",
     "freeze_base": True,
     "fine_tune_layers": 20,
-    "image_quality": 85
+    "image_quality": 85,
+    "augmentation": {
+        "rotation_prob": 0.5,
+        "rotation_range": 15,
+        "flip_prob": 0.5,
+        "brightness_prob": 0.5,
+        "brightness_range": (0.8, 1.2),
+        "noise_prob": 0.3,
+        "noise_std": 0.02
+    },
+    "onnx_runtime": {
+        "graph_optimization_level": "all",
+        "intra_op_num_threads": 2,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "enable_cpu_mem_arena": True,
+        "enable_mem_pattern": True,
+        "providers": ["CPUExecutionProvider"],
+        "persist_optimized_model": True,
+        "optimized_model_dir": "optimizados"
+    },
+    "quantization": {
+        "calibration_samples": 200,
+        "evaluation_samples": 300,
+        "min_top1_agreement": 0.97,
+        "min_top5_agreement": 0.99,
+        "random_seed": 42,
+        "report_name": "quantization_report.json"
+    }
 }
 
 RETRAINING_CONFIG = {
     "min_images_total": 30,
     "min_species_with_new_images": 10,
     "min_images_per_species": 3,
+    "duplicate_max_hamming_distance": 5,
     "weekly_schedule_day": "sunday",
     "weekly_schedule_time": "01:00",
     "max_attempts_per_prediction": 3,
@@ -91,6 +128,54 @@ STREAMLIT_CONFIG = {
     "image_quality": 85
 }
 
+MONITOR_CONFIG = {
+    "probe_interval_seconds": 60
+}
+
+CACHE_CONFIG = {
+    "probabilities_cache_size": 100,
+    "prediction_cache_size": 256,
+    "prediction_cache_ttl_seconds": 900,
+    "prediction_cache_max_hamming_distance": 4
+}
+
+WRITE_QUEUE_CONFIG = {
+    "queue_size": 64,
+    "enqueue_timeout_seconds": 0.5,
+    "shutdown_timeout_seconds": 10
+}
+
+CATALOG_CONFIG = {
+    "page_size": 200,
+    "sync_mode": "listener",
+    "update_field": "fecha_actualizacion",
+    "delta_interval_seconds": 300,
+    "retry_interval_seconds": 60,
+    "negative_cache_ttl_seconds": 600,
+    "fuzzy_cutoff": 0.9,
+    "max_in_query_values": 30
+}
+
+ASYNC_FIRESTORE_CONFIG = {
+    "max_concurrency": 8,
+    "timeout_seconds": 10
+}
+
+FIRESTORE_WRITE_CONFIG = {
+    "batch_size": 20,
+    "flush_interval_ms": 2000,
+    "max_retries": 5,
+    "retry_backoff_seconds": 1,
+    "max_backoff_seconds": 60,
+    "flush_timeout_seconds": 30
+}
+
+CIRCUIT_BREAKER_CONFIG = {
+    "failure_threshold": 3,
+    "initial_backoff_seconds": 2,
+    "max_backoff_seconds": 120
+}
+
 SYSTEM_STATES = {
     "training_idle": "idle",
     "training_in_progress": "training",
@@ -105,6 +190,10 @@ PATHS = {
     "species_list_file": MODEL_DIR / MODEL_CONFIG["species_list_name"],
     "training_log_file": LOGS_DIR / "training_logs.txt",
     "session_data_file": DATA_DIR / "sessions.json",
+    "dataset_manifest_file": DATA_DIR / "dataset_manifest.sqlite",
+    "tensor_cache_dir": DATA_DIR / "cache_tensores",
+    "species_catalog_file": DATA_DIR / "catalogo_especies.json",
+    "write_journal_file": DATA_DIR / "diario_escrituras.sqlite",
     "system_log_file": LOGS_DIR / "system.log"
 }
 
@@ -192,13 +281,14 @@ if __name__ == "__main__":
     
     print(f"\nESTADISTICAS:")
     if PLANTAS_DIR.exists():
-        especies = [d for d in PLANTAS_DIR.iterdir() if d.is_dir()]
-        total_imagenes = sum(len([f for f in especie.iterdir() 
-                                if f.suffix.lower() in ['.jpg', '.jpeg', '.png']]) 
-                           for especie in especies)
-        print(f"   - Especies locales: {len(especies)}")
+        from utils.dataset_manifest import ManifestDataset
+        manifest = ManifestDataset(PLANTAS_DIR)
+        manifest.actualizar()
+        conteo = manifest.contar_por_especie()
+        total_imagenes = sum(conteo.values())
+        print(f"   - Especies locales: {len(conteo)}")
         print(f"   - Total imágenes locales: {total_imagenes}")
-        print(f"   - Promedio por especie: {total_imagenes/len(especies):.1f}")
+        print(f"   - Promedio por especie: {total_imagenes/len(conteo) if conteo else 0:.1f}")
     
     print(f"\nCONFIGURACION FIREBASE:")
     print(f"   - Tipo: {FIREBASE_CONFIG['database_type']}")
@@ -0,0 +1,192 @@
+import onnxruntime as ort
+import hashlib
+import threading
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG
+
+NIVELES_OPTIMIZACION = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+}
+
+MODOS_EJECUCION = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL
+}
+
+class ModeloCompartido:
+    """Sesión ONNX compartida entregada por el registro de modelos"""
+    
+    def __init__(self, ruta, hash_modelo, session, bytes_modelo):
+        self.ruta = ruta
+        self.hash_modelo = hash_modelo
+        self.session = session
+        self.bytes_modelo = bytes_modelo
+        self.referencias = 0
+    
+    @property
+    def clave(self):
+        """Clave única del modelo en el registro."""
+        return (str(self.ruta), self.hash_modelo)
+    
+    def ejecutar(self, entradas, salidas=None):
+        """Ejecuta la inferencia sobre la sesión compartida (ONNX Runtime admite llamadas concurrentes)."""
+        return self.session.run(salidas, entradas)
+
+class RegistroModelos:
+    """Registro de sesiones ONNX por proceso, indexado por ruta y hash del archivo"""
+    
+    def __init__(self):
+        self._modelos = {}
+        self._hashes = {}
+        self._lock = threading.Lock()
+    
+    def adquirir(self, ruta_modelo):
+        """Retorna la sesión compartida del modelo, cargándola solo si aún no existe."""
+        ruta = Path(ruta_modelo).resolve()
+        
+        with self._lock:
+            hash_modelo = self._obtener_hash(ruta)
+            clave = (str(ruta), hash_modelo)
+            
+            modelo = self._modelos.get(clave)
+            if modelo is None:
+                session = crear_sesion_onnx(ruta, hash_modelo)
+                modelo = ModeloCompartido(ruta, hash_modelo, session, ruta.stat().st_size)
+                self._modelos[clave] = modelo
+                print(f"📦 Registro: modelo cargado {ruta.name} ({hash_modelo[:12]})")
+            
+            modelo.referencias += 1
+            return modelo
+    
+    def liberar(self, modelo):
+        """Libera una referencia y descarga la sesión cuando nadie más la usa."""
+        if modelo is None:
+            return
+        
+        with self._lock:
+            modelo.referencias -= 1
+            
+            if modelo.referencias <= 0 and self._modelos.get(modelo.clave) is modelo:
+                del self._modelos[modelo.clave]
+                print(f"🧹 Registro: modelo descargado {modelo.ruta.name} ({modelo.hash_modelo[:12]})")
+    
+    def obtener_estadisticas(self):
+        """Resume los modelos cargados, sus referencias y la memoria estimada de pesos."""
+        with self._lock:
+            modelos = [
+                {
+                    "ruta": str(modelo.ruta),
+                    "hash_modelo": modelo.hash_modelo,
+                    "referencias": modelo.referencias,
+                    "bytes_modelo": modelo.bytes_modelo
+                }
+                for modelo in self._modelos.values()
+            ]
+        
+        return {
+            "modelos_cargados": len(modelos),
+            "referencias_totales": sum(m["referencias"] for m in modelos),
+            "memoria_estimada_bytes": sum(m["bytes_modelo"] for m in modelos),
+            "modelos": modelos
+        }
+    
+    def _obtener_hash(self, ruta):
+        """Calcula el hash del archivo reutilizándolo mientras no cambien tamaño ni fecha."""
+        stat = ruta.stat()
+        firma = (str(ruta), stat.st_size, stat.st_mtime_ns)
+        
+        if firma not in self._hashes:
+            self._hashes[firma] = calcular_hash_modelo(ruta)
+        
+        return self._hashes[firma]
+
+def calcular_hash_modelo(ruta_modelo, tamano_bloque=1024 * 1024):
+    """Calcula el hash SHA-256 de un archivo de modelo leyéndolo por bloques."""
+    sha256 = hashlib.sha256()
+    with open(ruta_modelo, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+def crear_opciones_sesion(config_ort):
+    """Construye las opciones de sesión de ONNX Runtime a partir de la configuración."""
+    opciones = ort.SessionOptions()
+    opciones.graph_optimization_level = NIVELES_OPTIMIZACION[config_ort["graph_optimization_level"]]
+    opciones.intra_op_num_threads = config_ort["intra_op_num_threads"]
+    opciones.inter_op_num_threads = config_ort["inter_op_num_threads"]
+    opciones.execution_mode = MODOS_EJECUCION[config_ort["execution_mode"]]
+    opciones.enable_cpu_mem_arena = config_ort["enable_cpu_mem_arena"]
+    opciones.enable_mem_pattern = config_ort["enable_mem_pattern"]
+    return opciones
+
+def proveedores_disponibles(config_ort):
+    """Retorna los proveedores configurados que la instalación de ONNX Runtime tiene disponibles."""
+    disponibles = ort.get_available_providers()
+    return [p for p in config_ort["providers"] if p in disponibles] or ["CPUExecutionProvider"]
+
+def nivel_persistido(config_ort):
+    """Nivel con el que se guarda el grafo optimizado.
+    
+    Las optimizaciones de "all" (como los layouts NCHWc) dependen del hardware, así que el
+    grafo se guarda como mucho en "extended" y esas transformaciones se aplican al cargarlo.
+    """
+    nivel = config_ort["graph_optimization_level"]
+    return "extended" if nivel == "all" else nivel
+
+def ruta_modelo_optimizado(ruta_modelo, hash_modelo, config_ort, providers):
+    """Ruta del grafo optimizado según versión de ONNX Runtime, hash del modelo, nivel persistido y proveedores."""
+    directorio = Path(ruta_modelo).parent / config_ort["optimized_model_dir"]
+    proveedores = "-".join(p.replace("ExecutionProvider", "").lower() for p in providers)
+    nombre = (f"{Path(ruta_modelo).stem}_ort{ort.__version__}_{hash_modelo[:16]}"
+              f"_{nivel_persistido(config_ort)}_{proveedores}.onnx")
+    return directorio / nombre
+
+def crear_sesion_onnx(ruta_modelo, hash_modelo, config_ort=None):
+    """Crea una sesión ONNX reutilizando el grafo optimizado persistido cuando existe."""
+    config_ort = config_ort or MODEL_CONFIG["onnx_runtime"]
+    
+    providers = proveedores_disponibles(config_ort)
+    
+    if config_ort["persist_optimized_model"] and config_ort["graph_optimization_level"] != "disable":
+        ruta_optimizada = ruta_modelo_optimizado(ruta_modelo, hash_modelo, config_ort, providers)
+        nivel = nivel_persistido(config_ort)
+        
+        if not ruta_optimizada.exists():
+            try:
+                ruta_optimizada.parent.mkdir(exist_ok=True)
+                opciones = crear_opciones_sesion(config_ort)
+                opciones.graph_optimization_level = NIVELES_OPTIMIZACION[nivel]
+                opciones.optimized_model_filepath = str(ruta_optimizada)
+                session = ort.InferenceSession(str(ruta_modelo), opciones, providers=providers)
+                print(f"💾 Grafo optimizado guardado: {ruta_optimizada.name}")
+                if nivel == config_ort["graph_optimization_level"]:
+                    return session
+            except Exception as e:
+                print(f"⚠️ No se pudo persistir el grafo optimizado: {e}")
+        
+        if ruta_optimizada.exists():
+            try:
+                opciones = crear_opciones_sesion(config_ort)
+                if nivel == config_ort["graph_optimization_level"]:
+                    opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+                session = ort.InferenceSession(str(ruta_optimizada), opciones, providers=providers)
+                print(f"⚡ Grafo optimizado reutilizado: {ruta_optimizada.name}")
+                return session
+            except Exception as e:
+                print(f"⚠️ Grafo optimizado inválido, se descarta: {e}")
+                ruta_optimizada.unlink(missing_ok=True)
+    
+    opciones = crear_opciones_sesion(config_ort)
+    return ort.InferenceSession(str(ruta_modelo), opciones, providers=providers)
+
+registro_modelos = RegistroModelos()
+
+def obtener_estadisticas_registro():
+    """Función de conveniencia para consultar el estado del registro de modelos."""
+    return registro_modelos.obtener_estadisticas()
@@ -1,4 +1,3 @@
-import onnxruntime as ort
 import numpy as np
 import json
 import sys
@@ -6,7 +5,8 @@ from pathlib import Path
 from datetime import datetime
 
 sys.path.append(str(Path(__file__).parent.parent))
-from config import PATHS, RETRAINING_CONFIG
+from config import PATHS, MODEL_CONFIG, RETRAINING_CONFIG
+from model.model_registry import registro_modelos
 
 class ModelUtils:
     """Utilidades para cargar y usar el modelo ONNX"""
@@ -16,17 +16,27 @@ class ModelUtils:
         self.species_names = None
         self.num_classes = None
         self.metadata = None
+        self.species_index = {}
+        self.layout_entrada = "NCHW"
+        self.model_file = None
+        self.model_hash = None
+        self._modelo_compartido = None
     
-    def cargar_modelo(self):
+    def cargar_modelo(self, variante=None):
         """Carga el modelo ONNX desde archivo y sus metadatos asociados."""
         try:
-            model_file = PATHS["model_file"].parent / "plant_classifier.onnx"
+            model_file = ruta_variante_modelo(variante)
             
             if not model_file.exists():
                 print(f"❌ Modelo ONNX no encontrado: {model_file}")
                 return False
             
-            self.session = ort.InferenceSession(str(model_file))
+            self.liberar_modelo()
+            self._modelo_compartido = registro_modelos.adquirir(model_file)
+            self.session = self._modelo_compartido.session
+            self.layout_entrada = detectar_layout_entrada(self.session.get_inputs()[0].shape)
+            self.model_file = model_file
+            self.model_hash = self._modelo_compartido.hash_modelo
             print(f"✅ Modelo ONNX cargado: {model_file}")
             
             metadata_file = PATHS["model_file"].parent / "model_metadata.json"
@@ -48,89 +58,189 @@ class ModelUtils:
                     print(f"❌ No se encontraron metadatos ni lista de especies")
                     return False
             
+            self.species_index = {nombre: idx for idx, nombre in enumerate(self.species_names)}
+            
             return True
             
         except Exception as e:
             print(f"❌ Error cargando modelo: {e}")
             return False
     
+    def liberar_modelo(self):
+        """Libera la referencia a la sesión compartida del registro de modelos."""
+        if self._modelo_compartido is not None:
+            registro_modelos.liberar(self._modelo_compartido)
+            self._modelo_compartido = None
+            self.session = None
+    
     def predecir_especie(self, imagen_procesada, especies_excluir=None):
         """Predice la especie de planta a partir de una imagen procesada usando el modelo ONNX."""
         if self.session is None:
             return {"error": "Modelo no cargado"}
         
         try:
-            if imagen_procesada.dtype != np.float32:
-                imagen_procesada = imagen_procesada.astype(np.float32)
-            
-            input_name = self.session.get_inputs()[0].name
-            output = self.session.run(None, {input_name: imagen_procesada})
+            probabilidades = self.calcular_probabilidades(imagen_procesada)
             
-            logits = output[0][0]  # Primer output, primera muestra
-            
-            exp_logits = np.exp(logits - np.max(logits))
-            predicciones = exp_logits / np.sum(exp_logits)
-            predicciones_originales = predicciones.copy()
-            
-            if especies_excluir:
-                print(f"🚫 ModelUtils: Excluyendo {len(especies_excluir)} especies")
-                especies_excluidas_indices = []
-                
-                for especie in especies_excluir:
-                    if especie in self.species_names:
-                        idx = self.species_names.index(especie)
-                        especies_excluidas_indices.append(idx)
-                        predicciones[idx] = 1e-10
-                        print(f"   🚫 Excluida: {especie} (índice {idx})")
-                
-                suma_predicciones = np.sum(predicciones)
-                if suma_predicciones > 0:
-                    predicciones = predicciones / suma_predicciones
+            resultado = self.rankear_probabilidades(probabilidades, especies_excluir)
             
-            indices_ordenados = np.argsort(predicciones_originales)[::-1]
-            
-            idx_prediccion = None
-            for idx in indices_ordenados:
-                especie_candidata = self.species_names[idx]
-                if especies_excluir is None or especie_candidata not in especies_excluir:
-                    idx_prediccion = idx
-                    confianza = float(predicciones_originales[idx])
-                    especie_predicha = especie_candidata
-                    break
+            print(f"✅ ModelUtils: Predicción final: {resultado['especie_predicha']} (confianza: {resultado['confianza']:.4f})")
+            return resultado
             
-            if idx_prediccion is None:
-                idx_prediccion = indices_ordenados[0]
-                confianza = float(predicciones_originales[idx_prediccion])
-                especie_predicha = self.species_names[idx_prediccion]
-                print(f"⚠️ Todas las especies están excluidas, usando: {especie_predicha}")
+        except Exception as e:
+            print(f"❌ ERROR en predicción: {e}")
+            return {"error": f"Error en predicción: {e}"}
+    
+    def predecir_lote(self, imagenes, especies_excluir=None, exclusiones_por_imagen=None):
+        """Predice la especie de varias imágenes ejecutando el modelo por lotes.
+        
+        Args:
+            imagenes: Array (N, C, H, W) ya procesado o lista de imágenes
+                      (procesadas, PIL Image, numpy array o ruta)
+            especies_excluir: Especies a excluir en todas las imágenes
+            exclusiones_por_imagen: Lista opcional con las especies a excluir de cada imagen
+        
+        Returns:
+            list: Un resultado por imagen con el mismo formato que predecir_especie;
+                  si el lote falla, cada imagen recibe su propio resultado de error
+        """
+        n_imagenes = len(imagenes)
+        
+        if self.session is None:
+            return [{"error": "Modelo no cargado"} for _ in range(n_imagenes)]
+        
+        if exclusiones_por_imagen is None:
+            exclusiones = [especies_excluir] * n_imagenes
+        elif len(exclusiones_por_imagen) != n_imagenes:
+            error = "La lista de exclusiones no coincide con el número de imágenes"
+            return [{"error": error} for _ in range(n_imagenes)]
+        else:
+            exclusiones = [
+                set(especies_excluir or ()) | set(excluir or ())
+                for excluir in exclusiones_por_imagen
+            ]
+        
+        try:
+            lote = self._preparar_lote(imagenes)
             
-            top_indices = np.argsort(predicciones_originales)[::-1]
-            top_predicciones = []
+            entrada = self.session.get_inputs()[0]
+            tamano_lote = entrada.shape[0] if isinstance(entrada.shape[0], int) else MODEL_CONFIG["batch_size"]
             
-            for idx in top_indices[:10]:
-                especie_top = self.species_names[idx]
-                confianza_top = float(predicciones_originales[idx])
+            resultados = []
+            for inicio in range(0, n_imagenes, tamano_lote):
+                fin = inicio + tamano_lote
+                logits_lote = self.session.run(None, {entrada.name: lote[inicio:fin]})[0]
                 
-                if especies_excluir is None or especie_top not in especies_excluir:
-                    top_predicciones.append({
-                        "especie": especie_top,
-                        "confianza": confianza_top,
-                        "indice": int(idx)
-                    })
+                for logits, excluir in zip(logits_lote, exclusiones[inicio:fin]):
+                    resultados.append(self._postprocesar_logits(logits, excluir))
             
-            resultado = {
-                "especie_predicha": especie_predicha,
-                "confianza": confianza,
-                "indice_especie": int(idx_prediccion),
-                "top_predicciones": top_predicciones
-            }
-            
-            print(f"✅ ModelUtils: Predicción final: {especie_predicha} (confianza: {confianza:.4f})")
-            return resultado
+            print(f"✅ ModelUtils: Lote de {n_imagenes} imágenes procesado")
+            return resultados
             
         except Exception as e:
-            print(f"❌ ERROR en predicción: {e}")
-            return {"error": f"Error en predicción: {e}"}
+            print(f"❌ ERROR en predicción por lote: {e}")
+            return [{"error": f"Error en predicción por lote: {e}"} for _ in range(n_imagenes)]
+    
+    def _preparar_lote(self, imagenes):
+        """Combina imágenes procesadas o sin procesar en un único tensor (N, C, H, W)."""
+        if isinstance(imagenes, np.ndarray) and imagenes.ndim == 4:
+            return np.ascontiguousarray(imagenes, dtype=np.float32)
+        
+        from utils.image_processing import ImageProcessor
+        processor = ImageProcessor()
+        
+        tensores = []
+        for imagen in imagenes:
+            if isinstance(imagen, np.ndarray) and imagen.ndim == 4:
+                tensor = imagen
+            else:
+                tensor = processor.procesar_para_prediccion(imagen, self.layout_entrada)
+                if tensor is None:
+                    raise ValueError("No se pudo procesar una de las imágenes del lote")
+            tensores.append(tensor.astype(np.float32, copy=False))
+        
+        return np.concatenate(tensores, axis=0)
+    
+    def calcular_probabilidades(self, imagen_procesada):
+        """Ejecuta el modelo y retorna el vector completo de probabilidades de una imagen."""
+        if imagen_procesada.dtype != np.float32:
+            imagen_procesada = imagen_procesada.astype(np.float32)
+        
+        input_name = self.session.get_inputs()[0].name
+        output = self.session.run(None, {input_name: imagen_procesada})
+        
+        return calcular_softmax(output[0][0])
+    
+    def _postprocesar_logits(self, logits, especies_excluir=None):
+        """Convierte los logits de una imagen en la predicción ordenada respetando exclusiones."""
+        return self.rankear_probabilidades(calcular_softmax(logits), especies_excluir)
+    
+    def rankear_probabilidades(self, probabilidades, especies_excluir=None, top_k=10):
+        """Ordena un vector de probabilidades ya calculado aplicando las especies excluidas."""
+        indices, confianzas = self.calcular_top_k(probabilidades, top_k, especies_excluir)
+        
+        if len(indices) > 0:
+            idx_prediccion = int(indices[0])
+        else:
+            idx_prediccion = int(np.argmax(probabilidades))
+            print(f"⚠️ Todas las especies están excluidas, usando: {self.species_names[idx_prediccion]}")
+        
+        top_predicciones = [
+            {
+                "especie": self.species_names[idx],
+                "confianza": float(confianza),
+                "indice": int(idx)
+            }
+            for idx, confianza in zip(indices, confianzas)
+        ]
+        
+        return {
+            "especie_predicha": self.species_names[idx_prediccion],
+            "confianza": float(probabilidades[idx_prediccion]),
+            "indice_especie": idx_prediccion,
+            "top_predicciones": top_predicciones
+        }
+    
+    def calcular_top_k(self, probabilidades, top_k=10, especies_excluir=None):
+        """Retorna los índices y probabilidades de las K especies más probables no excluidas.
+        
+        Returns:
+            tuple: (indices, probabilidades) como arrays ordenados de mayor a menor
+        """
+        mascara = self._mascara_exclusion(especies_excluir)
+        
+        if mascara is not None:
+            candidatas = np.where(mascara, -np.inf, probabilidades)
+            disponibles = int(mascara.size - np.count_nonzero(mascara))
+            print(f"🚫 ModelUtils: Excluyendo {mascara.size - disponibles} especies")
+        else:
+            candidatas = probabilidades
+            disponibles = probabilidades.size
+        
+        k = min(top_k, disponibles)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=probabilidades.dtype)
+        
+        if k < candidatas.size:
+            indices = np.argpartition(candidatas, -k)[-k:]
+        else:
+            indices = np.arange(candidatas.size)
+        indices = indices[np.argsort(candidatas[indices])[::-1]]
+        
+        return indices, probabilidades[indices]
+    
+    def _mascara_exclusion(self, especies_excluir):
+        """Construye una máscara booleana con las especies excluidas, o None si no hay ninguna."""
+        if not especies_excluir:
+            return None
+        
+        indices = [self.species_index[especie] for especie in especies_excluir
+                   if especie in self.species_index]
+        if not indices:
+            return None
+        
+        mascara = np.zeros(len(self.species_names), dtype=bool)
+        mascara[indices] = True
+        return mascara
     
     def obtener_top_especies(self, imagen_procesada, top_k=6, especies_excluir=None):
         """Obtiene las K especies con mayor probabilidad de predicción."""
@@ -159,7 +269,8 @@ class ModelUtils:
             return validacion
         
         try:
-            test_image = np.random.random((1, 224, 224, 3)).astype(np.float32)
+            forma = (1, 3, 224, 224) if self.layout_entrada == "NCHW" else (1, 224, 224, 3)
+            test_image = np.random.random(forma).astype(np.float32)
             
             input_name = self.session.get_inputs()[0].name
             output = self.session.run(None, {input_name: test_image})
@@ -185,7 +296,11 @@ class ModelUtils:
             "especies": self.num_classes,
             "nombres_especies": self.species_names[:10] if self.species_names else [],
             "tipo_modelo": "ONNX Runtime",
+            "archivo_modelo": self.model_file.name if self.model_file else None,
+            "hash_modelo": self.model_hash,
+            "registro": registro_modelos.obtener_estadisticas(),
             "input_shape": self.session.get_inputs()[0].shape,
+            "layout_entrada": self.layout_entrada,
             "output_shape": self.session.get_outputs()[0].shape
         }
         
@@ -259,6 +374,34 @@ class ModelUtils:
             print(f"❌ Error obteniendo especies similares: {e}")
             return []
 
+def ruta_variante_modelo(variante=None):
+    """Resuelve el archivo ONNX de la variante configurada, usando FP32 si no está disponible."""
+    variante = variante or MODEL_CONFIG["model_variant"]
+    variantes = MODEL_CONFIG["model_variants"]
+    
+    if variante not in variantes:
+        print(f"⚠️ Variante de modelo desconocida '{variante}', usando fp32")
+        variante = "fp32"
+    
+    model_file = PATHS["model_file"].parent / variantes[variante]
+    
+    if variante != "fp32" and not model_file.exists():
+        print(f"⚠️ Variante '{variante}' no encontrada ({model_file.name}), usando fp32")
+        model_file = PATHS["model_file"].parent / variantes["fp32"]
+    
+    return model_file
+
+def detectar_layout_entrada(forma_entrada):
+    """Determina si el modelo espera tensores NCHW o NHWC a partir de la forma de su entrada."""
+    if len(forma_entrada) == 4 and forma_entrada[-1] == 3 and forma_entrada[1] != 3:
+        return "NHWC"
+    return "NCHW"
+
+def calcular_softmax(logits):
+    """Convierte logits en probabilidades de forma numéricamente estable."""
+    exp_logits = np.exp(logits - np.max(logits))
+    return exp_logits / np.sum(exp_logits)
+
 def cargar_modelo_global():
     """Carga el modelo ONNX y lo retorna listo para usar."""
     model_utils = ModelUtils()
@@ -282,6 +425,8 @@ def verificar_estado_modelo():
     info = model_utils.obtener_info_modelo()
     necesidad_retrain = model_utils.verificar_necesidad_reentrenamiento()
     
+    model_utils.liberar_modelo()
+    
     return {
         "disponible": True,
         "valido": validacion["es_valido"],
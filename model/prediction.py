@@ -1,56 +1,181 @@
 import numpy as np
+import threading
+import time
 import sys
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
-import requests
-import json
 
 sys.path.append(str(Path(__file__).parent.parent))
 
-from config import RETRAINING_CONFIG, API_CONFIG
-from model.model_utils import ModelUtils
-from utils.image_processing import procesar_imagen_simple
-from utils.firebase_config import obtener_info_planta, guardar_analisis
+from config import CACHE_CONFIG
+from utils.image_writer import escritor_imagenes
+from utils.dataset_manifest import calcular_hash_perceptual, distancia_hamming
 
 
+class CacheProbabilidades:
+    """Cache LRU acotado de vectores de probabilidad indexados por hash de imagen"""
+    
+    def __init__(self, max_entradas=None):
+        self.max_entradas = max_entradas or CACHE_CONFIG["probabilities_cache_size"]
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, clave):
+        """Retorna el vector en cache marcándolo como usado recientemente."""
+        with self._lock:
+            probabilidades = self._entradas.get(clave)
+            if probabilidades is not None:
+                self._entradas.move_to_end(clave)
+            return probabilidades
+    
+    def guardar(self, clave, probabilidades):
+        """Almacena un vector descartando el menos usado si se supera el límite."""
+        with self._lock:
+            self._entradas[clave] = probabilidades
+            self._entradas.move_to_end(clave)
+            
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+    
+    def limpiar(self):
+        """Elimina todas las entradas del cache."""
+        with self._lock:
+            self._entradas.clear()
+
+class CachePredicciones:
+    """Cache acotado con expiración de predicciones completas indexadas por hash perceptual"""
+    
+    def __init__(self, max_entradas=None, ttl_segundos=None, distancia_maxima=None):
+        self.max_entradas = max_entradas or CACHE_CONFIG["prediction_cache_size"]
+        self.ttl_segundos = ttl_segundos or CACHE_CONFIG["prediction_cache_ttl_seconds"]
+        if distancia_maxima is None:
+            distancia_maxima = CACHE_CONFIG["prediction_cache_max_hamming_distance"]
+        self.distancia_maxima = distancia_maxima
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._estadisticas = {"aciertos": 0, "fallos": 0, "expiradas": 0}
+    
+    def obtener(self, contexto, hash_perceptual):
+        """Busca una predicción para una imagen igual o casi igual dentro del mismo contexto.
+        
+        Args:
+            contexto: Tupla hashable con lo que afecta al resultado (modelo, exclusiones)
+            hash_perceptual: dHash de la imagen consultada
+        
+        Returns:
+            dict: Predicción en cache o None
+        """
+        with self._lock:
+            self._purgar_expiradas()
+            
+            candidatas = [clave for clave in self._entradas if clave[0] == contexto]
+            if candidatas:
+                distancias = distancia_hamming(hash_perceptual, [clave[1] for clave in candidatas])
+                mejor = int(np.argmin(distancias))
+                
+                if distancias[mejor] <= self.distancia_maxima:
+                    clave = candidatas[mejor]
+                    self._entradas.move_to_end(clave)
+                    self._estadisticas["aciertos"] += 1
+                    return self._entradas[clave][1]
+            
+            self._estadisticas["fallos"] += 1
+            return None
+    
+    def guardar(self, contexto, hash_perceptual, prediccion):
+        """Almacena una predicción descartando la menos usada si se supera el límite."""
+        clave = (contexto, hash_perceptual)
+        
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + self.ttl_segundos, prediccion)
+            self._entradas.move_to_end(clave)
+            
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+    
+    def _purgar_expiradas(self):
+        """Elimina las entradas cuyo tiempo de vida terminó."""
+        ahora = time.monotonic()
+        expiradas = [clave for clave, (expira, _) in self._entradas.items() if expira <= ahora]
+        
+        for clave in expiradas:
+            del self._entradas[clave]
+        self._estadisticas["expiradas"] += len(expiradas)
+    
+    def obtener_estadisticas(self):
+        """Retorna los contadores de aciertos y fallos y el tamaño actual del cache."""
+        with self._lock:
+            consultas = self._estadisticas["aciertos"] + self._estadisticas["fallos"]
+            return {
+                **self._estadisticas,
+                "entradas": len(self._entradas),
+                "tasa_aciertos": self._estadisticas["aciertos"] / consultas if consultas else 0.0
+            }
+    
+    def limpiar(self):
+        """Elimina todas las entradas del cache."""
+        with self._lock:
+            self._entradas.clear()
+
 class PlantPredictor:
     """Sistema principal de predicción de plantas"""
     
     def __init__(self):
         self.model_utils = None
         self.modelo_cargado = False
+        self.cache_probabilidades = CacheProbabilidades()
+        self.cache_predicciones = CachePredicciones()
+        
+        # La conexión con Firestore se abre en segundo plano mientras se carga el modelo
+        from utils.firebase_config import conectar_firestore_en_segundo_plano
+        conectar_firestore_en_segundo_plano()
+        
         self.cargar_modelo()
     
     def cargar_modelo(self):
-        """Carga el modelo entrenado"""
+        """Inicializa y carga el modelo de aprendizaje automático."""
         try:
+            from model.model_utils import ModelUtils
             self.model_utils = ModelUtils()
             self.modelo_cargado = self.model_utils.cargar_modelo()
             
             if self.modelo_cargado:
-                print(f"✅ Modelo cargado: {len(self.model_utils.species_names)} especies")
+                print(f"✅ Predictor: Modelo cargado: {len(self.model_utils.species_names)} especies")
             else:
-                print("❌ No se pudo cargar el modelo")
+                print("❌ Predictor: No se pudo cargar el modelo")
                 
         except Exception as e:
-            print(f"❌ Error cargando modelo: {e}")
+            print(f"❌ Error cargando modelo en predictor: {e}")
             self.modelo_cargado = False
     
     def verificar_modelo_disponible(self):
-        """Verifica si el modelo está disponible"""
+        """Verifica si el modelo está listo para realizar predicciones."""
         return self.modelo_cargado and self.model_utils is not None
     
-    def predecir_planta(self, imagen, especies_excluir=None):
-        """
-        Predice la especie de una planta
+    def obtener_probabilidades(self, imagen, hash_imagen=None):
+        """Obtiene el vector de probabilidades de una imagen, ejecutando el modelo solo la primera vez."""
+        from utils.image_processing import calcular_hash_imagen, procesar_imagen_simple
         
-        Args:
-            imagen: Imagen a analizar (PIL Image, numpy array, etc.)
-            especies_excluir: Lista de especies a excluir
+        if hash_imagen is None:
+            hash_imagen = calcular_hash_imagen(imagen)
+        clave = (self.model_utils.model_hash, hash_imagen)
         
-        Returns:
-            dict: Resultado de la predicción
-        """
+        probabilidades = self.cache_probabilidades.obtener(clave)
+        if probabilidades is not None:
+            print(f"💨 Predictor: Probabilidades en cache para imagen {hash_imagen[:8]}")
+            return probabilidades
+        
+        imagen_procesada = procesar_imagen_simple(imagen, self.model_utils.layout_entrada)
+        if imagen_procesada is None:
+            return None
+        
+        probabilidades = self.model_utils.calcular_probabilidades(imagen_procesada)
+        self.cache_probabilidades.guardar(clave, probabilidades)
+        return probabilidades
+    
+    def predecir_planta(self, imagen, especies_excluir=None, hash_imagen=None, hash_perceptual=None):
+        """Identifica la especie de planta en una imagen dada, reutilizando el resultado de fotos repetidas."""
         if not self.verificar_modelo_disponible():
             return {
                 "error": "Modelo no disponible",
@@ -58,19 +183,29 @@ class PlantPredictor:
             }
         
         try:
-            imagen_procesada = procesar_imagen_simple(imagen)
+            if hash_perceptual is None:
+                hash_perceptual = calcular_hash_perceptual(imagen)
+            contexto = (self.model_utils.model_hash, frozenset(especies_excluir or ()))
+            
+            respuesta = self.cache_predicciones.obtener(contexto, hash_perceptual)
+            if respuesta is not None:
+                print(f"💨 Predictor: Predicción en cache para imagen repetida ({respuesta['especie_predicha']})")
+                return {**respuesta, "desde_cache": True, "timestamp": datetime.now().isoformat()}
+            
+            probabilidades = self.obtener_probabilidades(imagen, hash_imagen)
             
-            if imagen_procesada is None:
+            if probabilidades is None:
                 return {
                     "error": "Error procesando imagen",
                     "mensaje": "No se pudo procesar la imagen"
                 }
             
-            resultado = self.model_utils.predecir_especie(imagen_procesada, especies_excluir)
+            if especies_excluir:
+                print(f"🚫 Predictor: Excluyendo {len(especies_excluir)} especies: {list(especies_excluir)[:3]}...")
             
-            if "error" in resultado:
-                return resultado
+            resultado = self.model_utils.rankear_probabilidades(probabilidades, especies_excluir)
             
+            from utils.firebase_config import obtener_info_planta
             info_especie = obtener_info_planta(resultado["especie_predicha"])
             
             respuesta = {
@@ -82,52 +217,49 @@ class PlantPredictor:
                 "timestamp": datetime.now().isoformat()
             }
             
+            self.cache_predicciones.guardar(contexto, hash_perceptual, respuesta)
+            
+            print(f"✅ Predictor: {resultado['especie_predicha']} (confianza: {resultado['confianza']:.3f})")
             return respuesta
             
         except Exception as e:
+            print(f"❌ Error en predicción: {e}")
             return {
                 "error": "Error en predicción",
                 "mensaje": str(e)
             }
     
-    def obtener_top_especies(self, imagen, cantidad=6, especies_excluir=None):
-        """
-        Obtiene las top especies más probables
-        
-        Args:
-            imagen: Imagen a analizar
-            cantidad: Número de especies a retornar
-            especies_excluir: Especies a excluir
-        
-        Returns:
-            list: Lista de especies con información completa
-        """
+    def obtener_top_especies(self, imagen, cantidad=6, especies_excluir=None, hash_imagen=None):
+        """Obtiene las especies más probables ordenadas por confianza."""
         if not self.verificar_modelo_disponible():
             return []
         
         try:
-            imagen_procesada = procesar_imagen_simple(imagen)
+            probabilidades = self.obtener_probabilidades(imagen, hash_imagen)
             
-            if imagen_procesada is None:
+            if probabilidades is None:
                 return []
             
-            top_especies = self.model_utils.obtener_top_especies(
-                imagen_procesada, cantidad, especies_excluir
-            )
+            print(f"🔍 Predictor: Obteniendo top {cantidad} especies, excluyendo {len(especies_excluir) if especies_excluir else 0}")
+            
+            ranking = self.model_utils.rankear_probabilidades(probabilidades, especies_excluir, top_k=cantidad)
+            top_especies = ranking["top_predicciones"]
+            
+            from utils.firebase_config import obtener_info_plantas
+            info_especies = obtener_info_plantas([especie_data["especie"] for especie_data in top_especies])
             
             especies_completas = []
             
             for especie_data in top_especies:
-                info_especie = obtener_info_planta(especie_data["especie"])
-                
                 especie_completa = {
                     "especie": especie_data["especie"],
                     "confianza": especie_data["confianza"],
-                    "info": info_especie
+                    "info": info_especies[especie_data["especie"]]
                 }
                 
                 especies_completas.append(especie_completa)
             
+            print(f"✅ Predictor: Retornando {len(especies_completas)} especies")
             return especies_completas
             
         except Exception as e:
@@ -136,20 +268,9 @@ class PlantPredictor:
     
     def guardar_resultado_feedback(self, imagen, especie_final, session_id, 
                                  correcto=True, metodo="prediccion"):
-        """
-        Guarda el resultado del feedback del usuario
-        
-        Args:
-            imagen: Imagen original
-            especie_final: Especie confirmada por el usuario
-            session_id: ID de la sesión
-            correcto: Si la predicción fue correcta
-            metodo: Método usado (prediccion, seleccion_manual)
-        
-        Returns:
-            dict: Resultado del guardado
-        """
+        """Almacena el feedback del usuario sobre la predicción realizada."""
         try:
+            from utils.firebase_config import guardar_analisis
             datos_analisis = {
                 "especie_final": especie_final,
                 "session_id": session_id,
@@ -160,9 +281,18 @@ class PlantPredictor:
             
             guardar_analisis(datos_analisis)
             
-            resultado_api = self._enviar_imagen_a_api(
-                imagen, especie_final, session_id, correcto, metodo
+            if isinstance(imagen, np.ndarray):
+                imagen = imagen.copy()
+            
+            escritor_imagenes.encolar(
+                self._enviar_imagen_a_api,
+                imagen, especie_final, session_id, correcto, metodo,
+                descripcion=f"envío a API de sesión {session_id}"
             )
+            resultado_api = {
+                "status": "encolado",
+                "pendientes": escritor_imagenes.obtener_estadisticas()["pendientes"]
+            }
             
             return {
                 "exito": True,
@@ -171,13 +301,14 @@ class PlantPredictor:
             }
             
         except Exception as e:
+            print(f"❌ Error guardando feedback: {e}")
             return {
                 "error": "Error guardando feedback",
                 "mensaje": str(e)
             }
     
     def _enviar_imagen_a_api(self, imagen, especie, session_id, correcto, metodo):
-        """Envía imagen a la API para guardado (vía Ngrok)"""
+        """Envía la imagen procesada a la API externa para almacenamiento."""
         try:
             import base64
             import io
@@ -189,7 +320,6 @@ class PlantPredictor:
                 else:
                     return {"error": "Formato de imagen no soportado"}
             
-            # Convertir a base64
             img_buffer = io.BytesIO()
             imagen.save(img_buffer, format='JPEG', quality=85)
             img_str = base64.b64encode(img_buffer.getvalue()).decode()
@@ -209,7 +339,5 @@ class PlantPredictor:
                 "mensaje": "Imagen enviada a API (simulado)"
             }
             
-            
         except Exception as e:
             return {"error": f"Error enviando a API: {e}"}
-
@@ -0,0 +1,218 @@
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+)
+import numpy as np
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from datetime import datetime
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG, PATHS
+from model.model_registry import crear_opciones_sesion, proveedores_disponibles
+from model.model_utils import detectar_layout_entrada
+from utils.image_processing import DatasetManager
+
+class LectorCalibracion(CalibrationDataReader):
+    """Entrega imágenes del dataset como entradas de calibración para la cuantización estática"""
+    
+    def __init__(self, rutas_imagenes, input_name, processor, layout="NCHW"):
+        self.rutas_imagenes = list(rutas_imagenes)
+        self.input_name = input_name
+        self.processor = processor
+        self.layout = layout
+        self._iterador = None
+        self.rewind()
+    
+    def get_next(self):
+        """Retorna la siguiente entrada de calibración o None al terminar."""
+        for ruta in self._iterador:
+            tensor = self.processor.procesar_para_prediccion(ruta, self.layout)
+            if tensor is not None:
+                return {self.input_name: tensor.astype(np.float32)}
+        return None
+    
+    def rewind(self):
+        """Reinicia el recorrido de imágenes de calibración."""
+        self._iterador = iter(self.rutas_imagenes)
+
+class CuantizadorModelo:
+    """Genera variantes INT8 del modelo y valida su concordancia con el modelo FP32"""
+    
+    def __init__(self, config=None):
+        self.config = config or MODEL_CONFIG["quantization"]
+        self.model_dir = PATHS["model_file"].parent
+        self.modelo_fp32 = self.model_dir / MODEL_CONFIG["model_variants"]["fp32"]
+        self.dataset_manager = DatasetManager()
+    
+    def dividir_muestras(self):
+        """Separa una muestra de calibración y otra de evaluación disjuntas de las imágenes del manifest."""
+        muestras, _ = self.dataset_manager.listar_muestras()
+        rutas = [ruta for ruta, _ in muestras]
+        
+        if not rutas:
+            raise Exception(f"No se encontraron imágenes en {self.dataset_manager.plantas_dir}")
+        
+        random.Random(self.config["random_seed"]).shuffle(rutas)
+        
+        n_evaluacion = min(self.config["evaluation_samples"], len(rutas) // 2)
+        evaluacion = rutas[:n_evaluacion]
+        calibracion = rutas[n_evaluacion:n_evaluacion + self.config["calibration_samples"]]
+        
+        return calibracion, evaluacion
+    
+    def cuantizar(self, modo, calibracion=None):
+        """Genera el modelo INT8 en modo 'dinamico' o 'estatico' (QDQ) en un archivo temporal."""
+        variante = f"int8_{modo}"
+        destino = self.model_dir / MODEL_CONFIG["model_variants"][variante]
+        temporal = destino.with_suffix(".tmp.onnx")
+        
+        print(f"⚙️ Cuantizando modelo ({modo})...")
+        
+        if modo == "dinamico":
+            quantize_dynamic(
+                str(self.modelo_fp32), str(temporal),
+                weight_type=QuantType.QInt8
+            )
+        elif modo == "estatico":
+            entrada = ort.InferenceSession(str(self.modelo_fp32)).get_inputs()[0]
+            lector = LectorCalibracion(
+                calibracion,
+                entrada.name,
+                self.dataset_manager.processor,
+                detectar_layout_entrada(entrada.shape)
+            )
+            quantize_static(
+                str(self.modelo_fp32), str(temporal), lector,
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True
+            )
+        else:
+            raise ValueError(f"Modo de cuantización no soportado: {modo}")
+        
+        return variante, temporal, destino
+    
+    def evaluar_concordancia(self, ruta_candidato, evaluacion):
+        """Compara top-1/top-5 y latencia del modelo candidato contra el modelo FP32."""
+        config_ort = MODEL_CONFIG["onnx_runtime"]
+        providers = proveedores_disponibles(config_ort)
+        session_fp32 = ort.InferenceSession(str(self.modelo_fp32), crear_opciones_sesion(config_ort), providers=providers)
+        session_int8 = ort.InferenceSession(str(ruta_candidato), crear_opciones_sesion(config_ort), providers=providers)
+        input_name = session_fp32.get_inputs()[0].name
+        layout = detectar_layout_entrada(session_fp32.get_inputs()[0].shape)
+        
+        coincidencias_top1 = 0
+        coincidencias_top5 = 0
+        tiempos_fp32 = []
+        tiempos_int8 = []
+        evaluadas = 0
+        
+        for ruta in evaluacion:
+            tensor = self.dataset_manager.processor.procesar_para_prediccion(ruta, layout)
+            if tensor is None:
+                continue
+            
+            inicio = time.perf_counter()
+            logits_fp32 = session_fp32.run(None, {input_name: tensor})[0][0]
+            tiempos_fp32.append(time.perf_counter() - inicio)
+            
+            inicio = time.perf_counter()
+            logits_int8 = session_int8.run(None, {input_name: tensor})[0][0]
+            tiempos_int8.append(time.perf_counter() - inicio)
+            
+            top1_fp32 = int(np.argmax(logits_fp32))
+            top5_int8 = np.argpartition(logits_int8, -5)[-5:]
+            
+            coincidencias_top1 += int(top1_fp32 == int(np.argmax(logits_int8)))
+            coincidencias_top5 += int(top1_fp32 in top5_int8)
+            evaluadas += 1
+        
+        if evaluadas == 0:
+            raise Exception("Ninguna imagen de evaluación pudo procesarse")
+        
+        return {
+            "imagenes_evaluadas": evaluadas,
+            "concordancia_top1": coincidencias_top1 / evaluadas,
+            "concordancia_top5": coincidencias_top5 / evaluadas,
+            "latencia_fp32_ms": float(np.median(tiempos_fp32) * 1000),
+            "latencia_int8_ms": float(np.median(tiempos_int8) * 1000),
+            "tamano_fp32_bytes": self.modelo_fp32.stat().st_size,
+            "tamano_int8_bytes": Path(ruta_candidato).stat().st_size
+        }
+    
+    def generar_variantes(self, modos=("dinamico", "estatico")):
+        """Cuantiza, evalúa y publica solo las variantes que cumplen la tolerancia configurada."""
+        if not self.modelo_fp32.exists():
+            raise Exception(f"Modelo FP32 no encontrado: {self.modelo_fp32}")
+        
+        calibracion, evaluacion = self.dividir_muestras()
+        print(f"📊 Muestras: {len(calibracion)} calibración, {len(evaluacion)} evaluación")
+        
+        reporte = {
+            "timestamp": datetime.now().isoformat(),
+            "onnxruntime": ort.__version__,
+            "tolerancia": {
+                "min_top1_agreement": self.config["min_top1_agreement"],
+                "min_top5_agreement": self.config["min_top5_agreement"]
+            },
+            "variantes": {}
+        }
+        
+        for modo in modos:
+            variante, temporal, destino = self.cuantizar(modo, calibracion)
+            
+            try:
+                metricas = self.evaluar_concordancia(temporal, evaluacion)
+                aprobada = (metricas["concordancia_top1"] >= self.config["min_top1_agreement"] and
+                            metricas["concordancia_top5"] >= self.config["min_top5_agreement"])
+                
+                if aprobada:
+                    temporal.replace(destino)
+                    print(f"✅ Variante {variante} aprobada: {destino.name}")
+                else:
+                    temporal.unlink(missing_ok=True)
+                    print(f"❌ Variante {variante} rechazada por pérdida de precisión")
+                
+                reporte["variantes"][variante] = {
+                    **metricas,
+                    "aprobada": aprobada,
+                    "archivo": destino.name if aprobada else None
+                }
+                
+                print(f"   Top-1: {metricas['concordancia_top1']:.3f} | Top-5: {metricas['concordancia_top5']:.3f}")
+                print(f"   Latencia: {metricas['latencia_fp32_ms']:.1f}ms → {metricas['latencia_int8_ms']:.1f}ms")
+            
+            except Exception as e:
+                temporal.unlink(missing_ok=True)
+                print(f"❌ Error evaluando variante {variante}: {e}")
+                reporte["variantes"][variante] = {"aprobada": False, "error": str(e)}
+        
+        ruta_reporte = self.model_dir / self.config["report_name"]
+        with open(ruta_reporte, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+        print(f"📝 Reporte guardado en {ruta_reporte}")
+        
+        return reporte
+
+def cuantizar_modelo(modos=("dinamico", "estatico")):
+    """Función de conveniencia para generar las variantes INT8 del modelo."""
+    return CuantizadorModelo().generar_variantes(modos)
+
+if __name__ == "__main__":
+    print("🔢 CUANTIZACIÓN INT8 DEL MODELO")
+    print("=" * 50)
+    
+    modos = tuple(sys.argv[1:]) or ("dinamico", "estatico")
+    reporte = cuantizar_modelo(modos)
+    
+    aprobadas = [v for v, datos in reporte["variantes"].items() if datos.get("aprobada")]
+    if aprobadas:
+        print(f"\n✅ Variantes disponibles: {', '.join(aprobadas)}")
+        print("   Selecciónalas con MODEL_CONFIG['model_variant'] en config.py")
+    else:
+        print("\n⚠️ Ninguna variante cumplió la tolerancia de precisión")
@@ -26,52 +26,10 @@ st.set_page_config(
     initial_sidebar_state=STREAMLIT_CONFIG["initial_sidebar_state"]
 )
 
-@st.cache_resource
 def inicializar_firestore_app():
-    """Inicializa Firestore una sola vez usando cache con reconexión automática"""
-    try:
-        print("🔥 Inicializando Firestore...")
-        
-        if "firebase" in st.secrets:
-            import firebase_admin
-            from firebase_admin import credentials, firestore
-            
-            try:
-                if firebase_admin._apps:
-                    test_db = firestore.client()
-                    test_db.collection('test').limit(1).get()
-                    print("✅ Conexión Firebase existente válida")
-                    
-                    firestore_manager.db = test_db
-                    firestore_manager.initialized = True
-                    return True
-            except Exception as conn_error:
-                print(f"⚠️ Conexión existente inválida, reinicializando: {conn_error}")
-                firebase_admin._apps.clear()
-            
-            try:
-                firebase_creds = dict(st.secrets["firebase"])
-                cred = credentials.Certificate(firebase_creds)
-                app = firebase_admin.initialize_app(cred)
-                
-                db = firestore.client()
-                db.collection('sistema_test').limit(1).get()
-                
-                firestore_manager.db = db
-                firestore_manager.initialized = True
-                print("✅ Firestore reinicializado exitosamente desde secrets")
-                return True
-                
-            except Exception as init_error:
-                print(f"❌ Error reinicializando Firebase: {init_error}")
-                return False
-        else:
-            print("❌ No se encontraron secrets de Firebase")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Excepción general inicializando Firestore: {e}")
-        return False
+    """Lanza la conexión de Firestore en segundo plano y retorna sin esperar si ya está lista"""
+    firestore_manager.conectar_en_segundo_plano()
+    return firestore_manager.verificar_salud_conexion()
 
 def inicializar_estado():
     """Inicializa todos los estados necesarios"""
@@ -1,5 +1,5 @@
 import streamlit as st
-from PIL import Image
+from utils.image_processing import cargar_imagen_subida
 from ui.screens.upload import mostrar_imagen_y_procesar
 
 def pantalla_tomar_foto():
@@ -17,7 +17,7 @@ def pantalla_tomar_foto():
     
     if camera_image is not None:
         try:
-            imagen = Image.open(camera_image)
+            imagen = cargar_imagen_subida(camera_image)
             mostrar_imagen_y_procesar(imagen, "cámara")
         except Exception as e:
             st.error(f"❌ Error procesando foto: {e}")
@@ -1,5 +1,5 @@
 import streamlit as st
-from PIL import Image
+from utils.image_processing import cargar_imagen_subida
 from config import STREAMLIT_CONFIG
 
 def pantalla_upload_archivo():
@@ -39,7 +39,7 @@ def pantalla_upload_archivo():
             return
         
         try:
-            imagen = Image.open(uploaded_file)
+            imagen = cargar_imagen_subida(uploaded_file)
             mostrar_imagen_y_procesar(imagen, "archivo")
         except Exception as e:
             st.error(f"❌ Error cargando imagen: {e}")
@@ -103,7 +103,7 @@ def procesar_identificacion():
                 st.session_state.especies_descartadas = set()
             
             # Hacer predicción
-            resultado = hacer_prediccion_con_info(imagen, None)
+            resultado = hacer_prediccion_con_info(imagen, None, sesion)
             
             if resultado.get("exito"):
                 st.session_state.resultado_actual = resultado
@@ -153,9 +153,12 @@ def limpiar_sesion(mantener_especies_descartadas=False):
     except:
         pass
 
-def hacer_prediccion_con_info(imagen, especies_excluir=None):
+def hacer_prediccion_con_info(imagen, especies_excluir=None, sesion=None):
     """
     Hace predicción y obtiene información de Firestore
+    
+    Args:
+        sesion: Sesión de la imagen; sus hashes evitan volver a hashear la imagen
     """
     from utils.session_manager import session_manager
     from utils.firebase_config import obtener_info_planta_basica
@@ -163,7 +166,11 @@ def hacer_prediccion_con_info(imagen, especies_excluir=None):
     
     try:
         # Hacer predicción con el modelo
-        resultado = session_manager.predictor.predecir_planta(imagen, especies_excluir)
+        resultado = session_manager.predictor.predecir_planta(
+            imagen, especies_excluir,
+            hash_imagen=sesion.hash_imagen if sesion else None,
+            hash_perceptual=sesion.hash_perceptual if sesion else None
+        )
         
         if resultado.get("exito"):
             especie_predicha = resultado["especie_predicha"]
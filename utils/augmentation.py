@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG
+
+def aumentar_lote(imagenes, rng=None, config=None):
+    """Aplica rotación, volteo, brillo y ruido aleatorios a un lote completo (N, H, W, 3) en float32.
+    
+    Args:
+        imagenes: Lote normalizado en [0, 1]; se modifica en el lugar
+        rng: np.random.Generator para resultados reproducibles
+        config: Parámetros de augmentation (por defecto MODEL_CONFIG["augmentation"])
+    
+    Returns:
+        np.ndarray: El mismo lote con las transformaciones aplicadas
+    """
+    rng = rng or np.random.default_rng()
+    config = config or MODEL_CONFIG["augmentation"]
+    n = len(imagenes)
+    if n == 0:
+        return imagenes
+    
+    rotar = rng.random(n) < config["rotation_prob"]
+    angulos = rng.uniform(-config["rotation_range"], config["rotation_range"], n)
+    voltear = rng.random(n) < config["flip_prob"]
+    ajustar_brillo = rng.random(n) < config["brightness_prob"]
+    factores = rng.uniform(*config["brightness_range"], n).astype(np.float32)
+    agregar_ruido = rng.random(n) < config["noise_prob"]
+    
+    if rotar.any():
+        imagenes[rotar] = _rotar_lote(imagenes[rotar], angulos[rotar])
+    
+    if voltear.any():
+        imagenes[voltear] = imagenes[voltear, :, ::-1]
+    
+    if ajustar_brillo.any():
+        factores[~ajustar_brillo] = 1.0
+        imagenes *= factores[:, None, None, None]
+        np.clip(imagenes, 0, 1, out=imagenes)
+    
+    if agregar_ruido.any():
+        forma_ruido = (int(agregar_ruido.sum()),) + imagenes.shape[1:]
+        ruido = rng.standard_normal(forma_ruido, dtype=np.float32)
+        ruido *= config["noise_std"]
+        imagenes[agregar_ruido] = np.clip(imagenes[agregar_ruido] + ruido, 0, 1)
+    
+    return imagenes
+
+def _rotar_lote(imagenes, angulos):
+    """Rota cada imagen alrededor de su centro con borde negro.
+    
+    Los ángulos llegan como arreglo del lote; la rotación en sí se delega a
+    cv2.warpAffine porque su kernel es mucho más rápido que un remuestreo
+    bilineal con indexado de NumPy.
+    """
+    _, h, w, _ = imagenes.shape
+    centro = (w // 2, h // 2)
+    
+    for i, angulo in enumerate(angulos):
+        matriz_rot = cv2.getRotationMatrix2D(centro, float(angulo), 1.0)
+        imagenes[i] = cv2.warpAffine(imagenes[i], matriz_rot, (w, h))
+    
+    return imagenes
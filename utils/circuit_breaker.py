@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import CIRCUIT_BREAKER_CONFIG
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+class CircuitoAbierto(Exception):
+    """Se lanza cuando el circuito está abierto y la llamada se rechaza sin tocar la red"""
+
+class InterruptorCircuito:
+    """Máquina de estados cerrado/abierto/semiabierto que infiere la salud del servicio a partir de las llamadas reales"""
+    
+    def __init__(self, sondeo, nombre="servicio", config=None):
+        """
+        Args:
+            sondeo: Función sin argumentos que reconecta si hace falta y retorna True si el servicio responde
+            nombre: Nombre del servicio para los mensajes
+            config: Umbral de fallos y tiempos de espera (por defecto CIRCUIT_BREAKER_CONFIG)
+        """
+        self.sondeo = sondeo
+        self.nombre = nombre
+        self.config = config or CIRCUIT_BREAKER_CONFIG
+        
+        self.estado = CERRADO
+        self._fallos_consecutivos = 0
+        self._espera_actual = self.config["initial_backoff_seconds"]
+        self._proximo_sondeo = None
+        self._hilo_sondeo = None
+        self._lock = threading.Lock()
+        self._estadisticas = {
+            "aperturas": 0,
+            "rechazadas": 0,
+            "sondeos_fallidos": 0,
+            "ultimo_error": None,
+            "ultimo_cambio": None
+        }
+    
+    def permitir(self):
+        """Indica si se puede llamar al servicio; con el circuito abierto rechaza de inmediato."""
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            self._estadisticas["rechazadas"] += 1
+            return False
+    
+    def registrar_exito(self):
+        """Registra una llamada exitosa y reinicia el conteo de fallos."""
+        with self._lock:
+            self._fallos_consecutivos = 0
+    
+    def registrar_fallo(self, error):
+        """Registra una llamada fallida y abre el circuito al alcanzar el umbral."""
+        with self._lock:
+            self._fallos_consecutivos += 1
+            self._estadisticas["ultimo_error"] = str(error)
+            if self._fallos_consecutivos < self.config["failure_threshold"]:
+                return
+        
+        self.abrir(error)
+    
+    def abrir(self, motivo):
+        """Abre el circuito y programa el sondeo de reconexión en segundo plano."""
+        with self._lock:
+            self._estadisticas["ultimo_error"] = str(motivo)
+            if self.estado == CERRADO:
+                self.estado = ABIERTO
+                self._estadisticas["aperturas"] += 1
+                self._estadisticas["ultimo_cambio"] = datetime.now().isoformat()
+                print(f"🔌 Circuito de {self.nombre} abierto: {motivo}")
+            
+            if self._hilo_sondeo is not None and self._hilo_sondeo.is_alive():
+                return
+            
+            self._hilo_sondeo = threading.Thread(
+                target=self._bucle_sondeo,
+                name=f"circuito-{self.nombre}",
+                daemon=True
+            )
+            self._hilo_sondeo.start()
+    
+    def ejecutar(self, funcion, *args, **kwargs):
+        """Ejecuta una llamada al servicio a través del circuito.
+        
+        Raises:
+            CircuitoAbierto: Si el circuito no permite llamadas
+        """
+        if not self.permitir():
+            raise CircuitoAbierto(f"{self.nombre} no disponible")
+        
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception as e:
+            self.registrar_fallo(e)
+            raise
+        
+        self.registrar_exito()
+        return resultado
+    
+    def _bucle_sondeo(self):
+        """Espera con backoff exponencial y prueba el servicio en estado semiabierto hasta que responda."""
+        while True:
+            with self._lock:
+                espera = self._espera_actual
+                self._proximo_sondeo = time.time() + espera
+            
+            time.sleep(espera)
+            
+            with self._lock:
+                self.estado = SEMIABIERTO
+            
+            try:
+                disponible = self.sondeo()
+            except Exception as e:
+                print(f"⚠️ Sondeo de {self.nombre} falló: {e}")
+                disponible = False
+            
+            with self._lock:
+                self._estadisticas["ultimo_cambio"] = datetime.now().isoformat()
+                self._proximo_sondeo = None
+                
+                if disponible:
+                    self.estado = CERRADO
+                    self._fallos_consecutivos = 0
+                    self._espera_actual = self.config["initial_backoff_seconds"]
+                    print(f"✅ Circuito de {self.nombre} cerrado: servicio disponible")
+                    return
+                
+                self.estado = ABIERTO
+                self._estadisticas["sondeos_fallidos"] += 1
+                self._espera_actual = min(self._espera_actual * 2, self.config["max_backoff_seconds"])
+    
+    def obtener_estadisticas(self):
+        """Retorna el estado del circuito y sus contadores."""
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "fallos_consecutivos": self._fallos_consecutivos,
+                "proximo_sondeo_en": (
+                    max(0.0, round(self._proximo_sondeo - time.time(), 1))
+                    if self._proximo_sondeo is not None else None
+                ),
+                **self._estadisticas
+            }
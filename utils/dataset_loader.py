@@ -0,0 +1,159 @@
+import numpy as np
+import queue
+import threading
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG
+
+_FIN_EPOCA = object()
+
+class CargadorDataset:
+    """Itera el dataset en lotes barajados sin cargarlo completo en memoria"""
+    
+    def __init__(self, muestras, processor, tamano_lote=None, barajar=True, semilla=None,
+                 funcion_augmentation=None, profundidad_prefetch=None, decodificador=None,
+                 cache=None, filas_cache=None):
+        """
+        Args:
+            muestras: Lista de tuplas (ruta_imagen, etiqueta)
+            processor: ImageProcessor usado para decodificar y redimensionar
+            tamano_lote: Imágenes por lote (por defecto MODEL_CONFIG["batch_size"])
+            barajar: Si True, cambia el orden en cada época
+            semilla: Semilla del generador aleatorio del orden y la augmentation
+            funcion_augmentation: Función opcional (imagenes, rng) aplicada a cada lote cargado
+            profundidad_prefetch: Lotes preparados por adelantado en segundo plano
+            decodificador: DecodificadorParalelo opcional para repartir cada lote entre procesos
+            cache: CacheTensores opcional de la que leer las imágenes ya redimensionadas
+            filas_cache: Fila de la cache correspondiente a cada muestra
+        """
+        self.muestras = list(muestras)
+        self.processor = processor
+        self.tamano_lote = tamano_lote or MODEL_CONFIG["batch_size"]
+        self.barajar = barajar
+        self.funcion_augmentation = funcion_augmentation
+        self.profundidad_prefetch = profundidad_prefetch or MODEL_CONFIG["prefetch_depth"]
+        self.decodificador = decodificador
+        self.cache = cache
+        self.filas_cache = None if filas_cache is None else np.asarray(filas_cache)
+        self.rng = np.random.default_rng(semilla)
+        
+        target_h, target_w = self.processor.target_size
+        self.forma_imagen = (target_h, target_w, 3)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.cerrar()
+    
+    def cerrar(self):
+        """Libera los procesos del decodificador paralelo, si se usa."""
+        if self.decodificador is not None:
+            self.decodificador.cerrar()
+    
+    def __len__(self):
+        """Número de lotes por época."""
+        return (len(self.muestras) + self.tamano_lote - 1) // self.tamano_lote
+    
+    def __iter__(self):
+        """Recorre una época entregando tuplas (imagenes, etiquetas) mientras se preparan las siguientes."""
+        orden = self.rng.permutation(len(self.muestras)) if self.barajar else np.arange(len(self.muestras))
+        lotes = [orden[i:i + self.tamano_lote] for i in range(0, len(orden), self.tamano_lote)]
+        
+        cola = queue.Queue(maxsize=self.profundidad_prefetch)
+        detener = threading.Event()
+        
+        hilo = threading.Thread(
+            target=self._producir_lotes,
+            args=(lotes, cola, detener),
+            name="cargador-dataset",
+            daemon=True
+        )
+        hilo.start()
+        
+        try:
+            while True:
+                elemento = cola.get()
+                if elemento is _FIN_EPOCA:
+                    break
+                if isinstance(elemento, Exception):
+                    raise elemento
+                yield elemento
+        finally:
+            detener.set()
+            hilo.join()
+    
+    def _producir_lotes(self, lotes, cola, detener):
+        """Carga los lotes en segundo plano y los deja en la cola acotada."""
+        try:
+            for indices in lotes:
+                if detener.is_set():
+                    return
+                
+                lote = self._cargar_lote(indices)
+                if lote[0].shape[0] > 0 and not self._poner(cola, lote, detener):
+                    return
+            
+            self._poner(cola, _FIN_EPOCA, detener)
+        
+        except Exception as e:
+            self._poner(cola, e, detener)
+    
+    def _poner(self, cola, elemento, detener):
+        """Encola un elemento sin bloquearse indefinidamente si el consumidor se detuvo."""
+        while not detener.is_set():
+            try:
+                cola.put(elemento, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _cargar_lote(self, indices):
+        """Obtiene las imágenes de un lote por la vía configurada y aplica la augmentation al lote completo."""
+        if self.cache is not None:
+            imagenes, etiquetas = self._cargar_lote_cache(indices)
+        elif self.decodificador is not None:
+            imagenes, etiquetas = self._cargar_lote_paralelo(indices)
+        else:
+            imagenes, etiquetas = self._decodificar_lote(indices)
+        
+        if self.funcion_augmentation is not None:
+            imagenes = self.funcion_augmentation(imagenes, self.rng)
+        
+        return imagenes, etiquetas
+    
+    def _decodificar_lote(self, indices):
+        """Decodifica las imágenes de un lote en un array preasignado, omitiendo las que fallen."""
+        imagenes = np.empty((len(indices),) + self.forma_imagen, dtype=np.float32)
+        etiquetas = np.empty(len(indices), dtype=np.int64)
+        cargadas = 0
+        
+        for indice in indices:
+            ruta, etiqueta = self.muestras[indice]
+            imagen = self.processor.cargar_y_procesar_imagen(ruta)
+            
+            if imagen is None:
+                continue
+            
+            imagenes[cargadas] = imagen
+            etiquetas[cargadas] = etiqueta
+            cargadas += 1
+        
+        return imagenes[:cargadas], etiquetas[:cargadas]
+    
+    def _cargar_lote_cache(self, indices):
+        """Lee el lote directamente de la cache de tensores mapeada en memoria."""
+        imagenes = self.cache.leer_lote(self.filas_cache[indices])
+        etiquetas = np.array([self.muestras[indice][1] for indice in indices], dtype=np.int64)
+        return imagenes, etiquetas
+    
+    def _cargar_lote_paralelo(self, indices):
+        """Reparte la decodificación del lote entre los procesos del decodificador."""
+        rutas = [self.muestras[indice][0] for indice in indices]
+        etiquetas = np.array([self.muestras[indice][1] for indice in indices], dtype=np.int64)
+        
+        imagenes, validas, _ = self.decodificador.decodificar_lote(rutas)
+        return imagenes, etiquetas[validas]
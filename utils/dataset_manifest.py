@@ -0,0 +1,341 @@
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from PIL import Image, ImageOps
+from datetime import datetime
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import PLANTAS_DIR, PATHS, RETRAINING_CONFIG
+
+EXTENSIONES_IMAGEN = ['.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG']
+
+ESQUEMA_MANIFEST = """
+CREATE TABLE IF NOT EXISTS carpetas (
+    especie TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imagenes (
+    ruta TEXT PRIMARY KEY,
+    especie TEXT NOT NULL,
+    tamano INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    es_usuario INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_imagenes_especie ON imagenes (especie, es_usuario);
+CREATE INDEX IF NOT EXISTS idx_imagenes_hash ON imagenes (hash);
+CREATE TABLE IF NOT EXISTS huellas (
+    ruta TEXT PRIMARY KEY,
+    especie TEXT NOT NULL,
+    hash_perceptual INTEGER,
+    votos INTEGER NOT NULL DEFAULT 1,
+    ultimo_voto TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_huellas_especie ON huellas (especie);
+"""
+
+class ManifestDataset:
+    """Índice persistente en SQLite de las imágenes del dataset de plantas"""
+    
+    def __init__(self, plantas_dir=None, ruta_db=None):
+        self.plantas_dir = Path(plantas_dir or PLANTAS_DIR)
+        self.ruta_db = Path(ruta_db or PATHS["dataset_manifest_file"])
+        self._conexion = None
+        self._lock = threading.RLock()
+    
+    def _conectar(self):
+        """Abre la base de datos del manifest y crea el esquema si no existe."""
+        if self._conexion is None:
+            self.ruta_db.parent.mkdir(parents=True, exist_ok=True)
+            self._conexion = sqlite3.connect(str(self.ruta_db), check_same_thread=False)
+            self._conexion.executescript(ESQUEMA_MANIFEST)
+        return self._conexion
+    
+    def actualizar(self, completo=False):
+        """Sincroniza el manifest con el disco.
+        
+        Solo se recorren las carpetas cuya fecha de modificación cambió desde la última
+        sincronización; dentro de ellas se vuelven a hashear los archivos cuyo tamaño o
+        fecha cambió. Una imagen sobrescrita en su lugar no cambia la fecha de la carpeta,
+        por lo que solo se detecta con completo=True.
+        
+        Args:
+            completo: Si True, recorre todas las carpetas y vuelve a hashear todos los archivos
+        
+        Returns:
+            dict: Número de imágenes agregadas, modificadas y eliminadas
+        """
+        cambios = {"agregadas": 0, "modificadas": 0, "eliminadas": 0}
+        
+        with self._lock:
+            conexion = self._conectar()
+            
+            carpetas_registradas = dict(conexion.execute("SELECT especie, mtime_ns FROM carpetas"))
+            carpetas_actuales = {}
+            
+            if self.plantas_dir.exists():
+                for carpeta in self.plantas_dir.iterdir():
+                    if carpeta.is_dir():
+                        carpetas_actuales[carpeta.name] = carpeta.stat().st_mtime_ns
+            
+            for especie in set(carpetas_registradas) - set(carpetas_actuales):
+                cursor = conexion.execute("DELETE FROM imagenes WHERE especie = ?", (especie,))
+                cambios["eliminadas"] += cursor.rowcount
+                conexion.execute("DELETE FROM carpetas WHERE especie = ?", (especie,))
+            
+            for especie, mtime_ns in carpetas_actuales.items():
+                if carpetas_registradas.get(especie) != mtime_ns or completo:
+                    self._sincronizar_carpeta(conexion, especie, cambios, completo)
+                    conexion.execute(
+                        "INSERT OR REPLACE INTO carpetas (especie, mtime_ns) VALUES (?, ?)",
+                        (especie, mtime_ns)
+                    )
+            
+            if cambios["eliminadas"]:
+                conexion.execute("DELETE FROM huellas WHERE ruta NOT IN (SELECT ruta FROM imagenes)")
+            
+            conexion.commit()
+        
+        if any(cambios.values()):
+            print(f"🗂️ Manifest actualizado: {cambios}")
+        
+        return cambios
+    
+    def _sincronizar_carpeta(self, conexion, especie, cambios, completo=False):
+        """Compara el tamaño y la fecha de los archivos de una carpeta con sus filas en el manifest."""
+        registradas = {
+            ruta: (tamano, mtime_ns)
+            for ruta, tamano, mtime_ns in conexion.execute(
+                "SELECT ruta, tamano, mtime_ns FROM imagenes WHERE especie = ?", (especie,)
+            )
+        }
+        
+        vistas = set()
+        for archivo in (self.plantas_dir / especie).iterdir():
+            if archivo.suffix not in EXTENSIONES_IMAGEN or not archivo.is_file():
+                continue
+            
+            ruta = f"{especie}/{archivo.name}"
+            vistas.add(ruta)
+            stat = archivo.stat()
+            firma = (stat.st_size, stat.st_mtime_ns)
+            
+            if registradas.get(ruta) == firma and not completo:
+                continue
+            
+            hash_contenido = calcular_hash_archivo(archivo)
+            if ruta in registradas:
+                hash_anterior = conexion.execute(
+                    "SELECT hash FROM imagenes WHERE ruta = ?", (ruta,)
+                ).fetchone()[0]
+                if hash_anterior != hash_contenido:
+                    cambios["modificadas"] += 1
+                    conexion.execute("UPDATE huellas SET hash_perceptual = NULL WHERE ruta = ?", (ruta,))
+            else:
+                cambios["agregadas"] += 1
+            
+            conexion.execute(
+                "INSERT OR REPLACE INTO imagenes (ruta, especie, tamano, mtime_ns, hash, es_usuario) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (ruta, especie, stat.st_size, stat.st_mtime_ns,
+                 hash_contenido, int('user_' in archivo.name))
+            )
+        
+        eliminadas = set(registradas) - vistas
+        if eliminadas:
+            conexion.executemany("DELETE FROM imagenes WHERE ruta = ?", [(r,) for r in eliminadas])
+            cambios["eliminadas"] += len(eliminadas)
+    
+    def _ruta_relativa(self, ruta_archivo):
+        """Convierte la ruta de una imagen a la clave 'especie/archivo' usada en el manifest."""
+        ruta_archivo = Path(ruta_archivo)
+        return f"{ruta_archivo.parent.name}/{ruta_archivo.name}"
+    
+    def registrar_imagen(self, ruta_archivo, hash_contenido, hash_perceptual=None):
+        """Agrega al manifest una imagen recién guardada sin esperar a la próxima sincronización."""
+        ruta_archivo = Path(ruta_archivo)
+        ruta = self._ruta_relativa(ruta_archivo)
+        especie = ruta_archivo.parent.name
+        stat = ruta_archivo.stat()
+        
+        with self._lock:
+            conexion = self._conectar()
+            conexion.execute(
+                "INSERT OR REPLACE INTO imagenes (ruta, especie, tamano, mtime_ns, hash, es_usuario) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (ruta, especie, stat.st_size, stat.st_mtime_ns, hash_contenido,
+                 int('user_' in ruta_archivo.name))
+            )
+            conexion.commit()
+        
+        if hash_perceptual is not None:
+            self.guardar_hash_perceptual(ruta_archivo, hash_perceptual)
+    
+    def buscar_duplicado(self, especie, hash_contenido, hash_perceptual=None, distancia_maxima=None):
+        """Busca en la especie una imagen idéntica (mismo hash) o casi idéntica (hash perceptual cercano).
+        
+        Returns:
+            Path: Ruta de la imagen existente, o None si no hay duplicado
+        """
+        filas = self._consultar(
+            "SELECT ruta FROM imagenes WHERE especie = ? AND hash = ? LIMIT 1",
+            (especie, hash_contenido)
+        )
+        if filas:
+            return self.plantas_dir / filas[0][0]
+        
+        if hash_perceptual is None:
+            return None
+        
+        if distancia_maxima is None:
+            distancia_maxima = RETRAINING_CONFIG["duplicate_max_hamming_distance"]
+        
+        filas = self._consultar(
+            "SELECT ruta, hash_perceptual FROM huellas "
+            "WHERE especie = ? AND hash_perceptual IS NOT NULL",
+            (especie,)
+        )
+        if not filas:
+            return None
+        
+        distancias = distancia_hamming(hash_perceptual, [h for _, h in filas])
+        mejor = int(np.argmin(distancias))
+        
+        if distancias[mejor] <= distancia_maxima:
+            return self.plantas_dir / filas[mejor][0]
+        return None
+    
+    def registrar_voto(self, ruta_archivo, votos=1):
+        """Suma votos a una imagen existente en lugar de guardar una copia duplicada.
+        
+        Returns:
+            int: Total de votos de la imagen (ella misma cuenta como uno)
+        """
+        ruta = self._ruta_relativa(ruta_archivo)
+        
+        with self._lock:
+            conexion = self._conectar()
+            conexion.execute(
+                "INSERT INTO huellas (ruta, especie, votos, ultimo_voto) VALUES (?, ?, 1 + ?, ?) "
+                "ON CONFLICT(ruta) DO UPDATE SET votos = votos + ?, ultimo_voto = excluded.ultimo_voto",
+                (ruta, Path(ruta_archivo).parent.name, votos, datetime.now().isoformat(), votos)
+            )
+            conexion.commit()
+            return conexion.execute("SELECT votos FROM huellas WHERE ruta = ?", (ruta,)).fetchone()[0]
+    
+    def listar_imagenes_usuario(self, especie):
+        """Retorna (ruta, hash, hash_perceptual) de las imágenes de usuarios de una especie, de la más antigua a la más reciente."""
+        filas = self._consultar(
+            "SELECT i.ruta, i.hash, h.hash_perceptual FROM imagenes i "
+            "LEFT JOIN huellas h ON h.ruta = i.ruta "
+            "WHERE i.especie = ? AND i.es_usuario = 1 ORDER BY i.mtime_ns, i.ruta",
+            (especie,)
+        )
+        return [(self.plantas_dir / ruta, hash_contenido, hash_perceptual)
+                for ruta, hash_contenido, hash_perceptual in filas]
+    
+    def guardar_hash_perceptual(self, ruta_archivo, hash_perceptual):
+        """Almacena el hash perceptual calculado para una imagen ya registrada."""
+        with self._lock:
+            conexion = self._conectar()
+            conexion.execute(
+                "INSERT INTO huellas (ruta, especie, hash_perceptual) VALUES (?, ?, ?) "
+                "ON CONFLICT(ruta) DO UPDATE SET hash_perceptual = excluded.hash_perceptual",
+                (self._ruta_relativa(ruta_archivo), Path(ruta_archivo).parent.name, hash_perceptual)
+            )
+            conexion.commit()
+    
+    def obtener_votos(self, especie=None):
+        """Retorna los votos de las imágenes que recibieron duplicados, indexados por ruta."""
+        if especie is None:
+            filas = self._consultar("SELECT ruta, votos FROM huellas WHERE votos > 1")
+        else:
+            filas = self._consultar(
+                "SELECT ruta, votos FROM huellas WHERE votos > 1 AND especie = ?", (especie,)
+            )
+        return {self.plantas_dir / ruta: votos for ruta, votos in filas}
+    
+    def _consultar(self, sql, parametros=()):
+        """Ejecuta una consulta de lectura sobre el manifest."""
+        with self._lock:
+            return self._conectar().execute(sql, parametros).fetchall()
+    
+    def contar_por_especie(self):
+        """Retorna el número de imágenes de cada especie, incluidas las carpetas vacías."""
+        filas = self._consultar(
+            "SELECT c.especie, COUNT(i.ruta) FROM carpetas c "
+            "LEFT JOIN imagenes i ON i.especie = c.especie GROUP BY c.especie"
+        )
+        return dict(filas)
+    
+    def contar_imagenes_nuevas(self):
+        """Cuenta las imágenes de usuarios por especie."""
+        filas = self._consultar(
+            "SELECT especie, COUNT(*) FROM imagenes WHERE es_usuario = 1 GROUP BY especie"
+        )
+        detalle = dict(filas)
+        return sum(detalle.values()), len(detalle), detalle
+    
+    def listar_imagenes(self, especie):
+        """Retorna las rutas ordenadas de las imágenes registradas para una especie."""
+        filas = self._consultar(
+            "SELECT ruta FROM imagenes WHERE especie = ? ORDER BY ruta", (especie,)
+        )
+        return [self.plantas_dir / ruta for (ruta,) in filas]
+    
+    def obtener_hashes(self):
+        """Retorna el hash de contenido de cada imagen registrada indexado por su ruta."""
+        filas = self._consultar("SELECT ruta, hash FROM imagenes")
+        return {self.plantas_dir / ruta: hash_imagen for ruta, hash_imagen in filas}
+    
+    def listar_especies(self):
+        """Retorna los nombres de las carpetas de especies en orden alfabético."""
+        return [especie for (especie,) in self._consultar("SELECT especie FROM carpetas ORDER BY especie")]
+
+def calcular_hash_archivo(ruta, tamano_bloque=1024 * 1024):
+    """Calcula el hash del contenido de un archivo leyéndolo por bloques."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            hasher.update(bloque)
+    return hasher.hexdigest()
+
+def calcular_hash_perceptual(imagen):
+    """Calcula el dHash de 64 bits de una imagen, estable ante recompresión y cambios de tamaño.
+    
+    Args:
+        imagen: PIL Image, numpy array, ruta o archivo subido (file-like)
+    
+    Returns:
+        int: Hash como entero con signo de 64 bits (almacenable en SQLite)
+    """
+    if isinstance(imagen, (str, Path)) or hasattr(imagen, 'read'):
+        origen = imagen
+        posicion = origen.tell() if hasattr(origen, 'seek') else None
+        
+        with Image.open(origen) as archivo:
+            archivo.draft('RGB', (64, 64))
+            imagen = ImageOps.exif_transpose(archivo)
+            imagen.load()
+        
+        # Un archivo subido se vuelve a leer después para la predicción
+        if posicion is not None:
+            origen.seek(posicion)
+    
+    if isinstance(imagen, np.ndarray):
+        if imagen.dtype == np.float32 or imagen.dtype == np.float64:
+            imagen = (imagen * 255).astype(np.uint8)
+        imagen = Image.fromarray(imagen)
+    
+    gris = np.asarray(imagen.convert("L").resize((9, 8), Image.BOX, reducing_gap=2.0), dtype=np.int16)
+    bits = (gris[:, 1:] > gris[:, :-1]).flatten()
+    
+    return int(np.packbits(bits).view(">i8")[0])
+
+def distancia_hamming(hash_perceptual, hashes):
+    """Cuenta los bits distintos entre un hash perceptual y una lista de hashes."""
+    diferencias = np.array(hashes, dtype=np.int64) ^ np.int64(hash_perceptual)
+    return np.unpackbits(diferencias.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
@@ -1,15 +1,22 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+import concurrent.futures
 import json
 import os
 import re
+import threading
+import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
 import sys
 from typing import Dict, List, Optional, Any
 
 sys.path.append(str(Path(__file__).parent.parent))
-from config import FIREBASE_CONFIG, API_CONFIG
+from config import FIREBASE_CONFIG, API_CONFIG, CATALOG_CONFIG
+from utils.species_catalog import CatalogoEspecies
+from utils.circuit_breaker import InterruptorCircuito, CERRADO
+from utils.firestore_writer import EscritorLotesFirestore
+from utils.firestore_async import AccesoFirestoreAsync
 
 class FirestoreManager:
     """Gestiona la conexión y operaciones con Firestore Database - VERSION CORREGIDA"""
@@ -22,130 +29,159 @@ class FirestoreManager:
         self.plantas_schema = FIREBASE_CONFIG["plantas_schema"]
         
         self._nombre_cache = {}
+        self.circuito = InterruptorCircuito(self._sondear_conexion, nombre="Firestore")
+        self.catalogo = CatalogoEspecies(self._normalizar_nombre_a_modelo, circuito=self.circuito)
+        self.escritor = EscritorLotesFirestore(self.obtener_cliente, self.circuito)
+        self.acceso_async = AccesoFirestoreAsync(self)
+        
+        self._ruta_credenciales = FIREBASE_CONFIG["service_account_path"]
+        self._cliente_fallido = False
+        self.generacion_cliente = 0
+        self._hilo_conexion = None
+        self._lock_cliente = threading.Lock()
         
     def initialize_firestore(self, service_account_path=None):
-        """Inicializa la conexión con Firestore usando credenciales de servicio."""
-        try:
-            if service_account_path is None:
-                service_account_path = FIREBASE_CONFIG["service_account_path"]
-            
-            cred_path = Path(service_account_path)
-            if not cred_path.exists():
-                print(f"❌ Archivo de credenciales no encontrado: {cred_path}")
-                return False
-            
-            if firebase_admin._apps:
-                print("✅ Firebase ya está inicializado")
-                self.initialized = True
-                self.db = firestore.client()
-                return True
+        """Abre la conexión con Firestore y comprueba que responda con una lectura, sin escrituras."""
+        if service_account_path is not None:
+            self._ruta_credenciales = service_account_path
             
-            cred = credentials.Certificate(str(cred_path))
-            firebase_admin.initialize_app(cred, {
-                'projectId': FIREBASE_CONFIG["project_id"]
-            })
-            
-            self.db = firestore.client()
-            self.initialized = True
-            
-            print("🔥 Firestore inicializado exitosamente")
-            print(f"📊 Proyecto: {FIREBASE_CONFIG['project_id']}")
-            print(f"📋 Colección plantas: {self.collections['plantas']}")
-            
-            if self._test_connection():
-                self._cargar_cache_nombres()
-                return True
-            else:
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error inicializando Firestore: {e}")
+        if self.obtener_cliente() is None:
             return False
     
-    def _test_connection(self, reintentos=3):
-        """Prueba la conexión con Firestore realizando un test de escritura y lectura."""
-        import time
+        return self.verificar_conectividad()
+        
+    def obtener_cliente(self, forzar=False):
+        """Fábrica única de la conexión: crea el cliente de Firestore la primera vez que se necesita.
+        
+        Usa los secrets de Streamlit si existen y, si no, el archivo de credenciales de servicio.
+        Crear el cliente no toca la red. Un fallo se recuerda y solo se reintenta con forzar=True,
+        que es lo que hace la reconexión en segundo plano del circuito.
         
-        for intento in range(reintentos):
+        La reconexión crea un cliente nuevo sobre la misma app de Firebase en lugar de borrarla,
+        así las llamadas en curso del escritor y de la capa asíncrona terminan con el cliente anterior.
+        
+        Returns:
+            firestore.Client o None si no hay credenciales válidas
+        """
+        with self._lock_cliente:
+            if self.db is not None and not forzar:
+                return self.db
+            if self._cliente_fallido and not forzar:
+                return None
+            
             try:
-                print(f"🔍 Test de conexión Firestore (intento {intento + 1}/{reintentos})")
+                if not firebase_admin._apps:
+                    cred = self._obtener_credenciales()
+                    if cred is None:
+                        self._cliente_fallido = True
+                        return None
                 
-                sistema_ref = self.db.collection('sistema_test')
-                doc_ref = sistema_ref.document('conexion_test')
+                    firebase_admin.initialize_app(cred, {
+                        'projectId': FIREBASE_CONFIG["project_id"]
+                    })
                 
-                doc_ref.set({
-                    'timestamp': datetime.now(),
-                    'mensaje': 'Conexión exitosa a Firestore',
-                    'version': '1.0_corregida',
-                    'intento': intento + 1
-                })
-                
-                doc = doc_ref.get()
-                if doc.exists:
-                    print("✅ Test de conexión Firestore exitoso")
-                    doc_ref.delete()
-                    return True
+                if forzar and self.db is not None:
+                    app = firebase_admin.get_app()
+                    self.db = firestore.Client(
+                        credentials=app.credential.get_credential(),
+                        project=app.project_id
+                    )
                 else:
-                    print("⚠️ Conexión establecida pero no se pudo leer datos")
+                    self.db = firestore.client()
+                self.generacion_cliente += 1
+                self.initialized = True
+                self._cliente_fallido = False
+                
+                print("🔥 Cliente de Firestore creado")
+                print(f"📊 Proyecto: {FIREBASE_CONFIG['project_id']}")
+                return self.db
                     
             except Exception as e:
-                print(f"❌ Error en test de conexión Firestore (intento {intento + 1}): {e}")
+                print(f"❌ Error creando cliente de Firestore: {e}")
+                self.db = None
+                self.initialized = False
+                self._cliente_fallido = True
+                return None
                 
-                if intento < reintentos - 1:
-                    tiempo_espera = (intento + 1) * 2
-                    print(f"⏳ Esperando {tiempo_espera}s antes del siguiente intento...")
-                    time.sleep(tiempo_espera)
-                else:
-                    print(f"❌ Falló después de {reintentos} intentos")
+    def _obtener_credenciales(self):
+        """Retorna las credenciales de los secrets de Streamlit o del archivo de servicio."""
+        try:
+            import streamlit as st
+            if "firebase" in st.secrets:
+                return credentials.Certificate(dict(st.secrets["firebase"]))
+        except Exception:
+            pass
                     
-        return False
+        cred_path = Path(self._ruta_credenciales)
+        if cred_path.exists():
+            return credentials.Certificate(str(cred_path))
     
-    def verificar_salud_conexion(self):
-        """Verifica si la conexión con Firestore está activa y responde correctamente."""
-        if not self.initialized or not self.db:
+        print(f"❌ Archivo de credenciales no encontrado: {cred_path}")
+        return None
+    
+    def conectar_en_segundo_plano(self):
+        """Abre la conexión y precarga el catálogo en un hilo, para solaparlo con la carga del modelo."""
+        with self._lock_cliente:
+            if self._hilo_conexion is not None:
+                return
+            
+            self._hilo_conexion = threading.Thread(
+                target=self._calentar_conexion,
+                name="firestore-conexion",
+                daemon=True
+            )
+            self._hilo_conexion.start()
+    
+    def _calentar_conexion(self):
+        """Crea el cliente, carga el catálogo y arranca el reproductor del diario de escrituras."""
+        if self.obtener_cliente() is not None:
+            self._cargar_cache_nombres()
+        
+        # Reproduce las escrituras que quedaron en el diario de ejecuciones anteriores
+        self.escritor.iniciar()
+    
+    def verificar_conectividad(self):
+        """Comprueba la conexión leyendo un solo documento de la colección de plantas."""
+        if self.obtener_cliente() is None:
             return False
             
         try:
-            self.db.collection('sistema_test').limit(1).get()
+            list(self.db.collection(self.collections["plantas"]).limit(1).stream())
             return True
         except Exception as e:
-            print(f"⚠️ Conexión Firebase perdida: {e}")
+            print(f"⚠️ Firestore no responde: {e}")
             return False
     
+    def verificar_salud_conexion(self):
+        """Indica si Firestore está disponible según el estado del circuito, sin consultar la red."""
+        return bool(self.initialized and self.db) and self.circuito.estado == CERRADO
+    
+    def _sondear_conexion(self):
+        """Sondeo de solo lectura usado por el circuito; reconecta si la conexión no responde."""
+        if self.initialized and self.db and self.verificar_conectividad():
+            return True
+        
+        return self.reconectar_firestore()
+    
+    def _disponible(self):
+        """Retorna True si se puede consultar Firestore; si no hay conexión abre el circuito para reconectar en segundo plano."""
+        if self.obtener_cliente() is None:
+            self.circuito.abrir("Firestore no inicializado")
+            return False
+        
+        return self.circuito.permitir()
+    
     def reconectar_firestore(self):
-        """Intenta reconectar a Firestore usando configuración de Streamlit secrets."""
-        try:
-            print("🔄 Intentando reconectar a Firestore...")
+        """Recrea el cliente de Firestore y comprueba la conexión con una lectura."""
+        print("🔄 Intentando reconectar a Firestore...")
+        if self.obtener_cliente(forzar=True) is None:
+            return False
             
-            import streamlit as st
+        if self.verificar_conectividad():
+            print("✅ Reconexión exitosa")
+            return True
             
-            if "firebase" in st.secrets:
-                import firebase_admin
-                from firebase_admin import credentials, firestore
-                
-                if firebase_admin._apps:
-                    firebase_admin._apps.clear()
-                
-                firebase_creds = dict(st.secrets["firebase"])
-                cred = credentials.Certificate(firebase_creds)
-                firebase_admin.initialize_app(cred)
-                
-                self.db = firestore.client()
-                self.initialized = True
-                
-                if self._test_connection(reintentos=1):
-                    print("✅ Reconexión exitosa usando secrets")
-                    return True
-                else:
-                    print("❌ Test de reconexión falló")
-                    return False
-            else:
-                print("❌ No se encontraron secrets de Firebase para reconexión")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error durante reconexión: {e}")
-            return False
+        return False
     
     def _normalizar_nombre_a_firestore(self, nombre_modelo: str) -> List[str]:
         """Convierte nombre del modelo al formato de nombres en Firestore."""
@@ -205,29 +241,31 @@ class FirestoreManager:
         return nombre
     
     def _cargar_cache_nombres(self):
-        """Carga un cache de nombres científicos para acelerar búsquedas futuras."""
+        """Carga el catálogo completo de especies y llena el cache de nombres científicos."""
         try:
-            print("📋 Cargando cache de nombres científicos...")
+            print("📋 Cargando catálogo de especies...")
             
-            plantas_ref = self.db.collection(self.collections["plantas"])
-            docs = plantas_ref.limit(50).stream()
-            
-            for doc in docs:
-                data = doc.to_dict()
-                nombre_firestore = data.get('nombre_cientifico', '')
-                if nombre_firestore:
-                    nombre_modelo = self._normalizar_nombre_a_modelo(nombre_firestore)
-                    self._nombre_cache[nombre_modelo] = nombre_firestore
+            if self.catalogo.asegurar_cargado(self.db, esperar=True):
+                self._nombre_cache.update(self.catalogo.nombres_firestore())
             
             print(f"✅ Cache cargado con {len(self._nombre_cache)} nombres")
             
         except Exception as e:
             print(f"⚠️ Error cargando cache de nombres: {e}")
     
+    def _buscar_en_catalogo(self, nombre_cientifico: str) -> Optional[Dict[str, Any]]:
+        """Busca la especie en el catálogo local sin consultar la red."""
+        self.catalogo.asegurar_cargado(self.obtener_cliente() if self.circuito.estado == CERRADO else None)
+        data = self.catalogo.obtener(nombre_cientifico)
+        if data is None:
+            return None
+        
+        return self._procesar_datos_firestore(data, nombre_cientifico)
+    
     def obtener_info_especie_basica(self, nombre_cientifico: str) -> Dict[str, Any]:
-        """Obtiene información básica de una especie con normalización de nombres y reconexiones automáticas."""
-        """
-        Búsqueda básica con normalización de nombres y reconexión automática
+        """Obtiene información básica de una especie con normalización de nombres.
+        
+        Si Firestore falla, el circuito rechaza las búsquedas de inmediato y reconecta en segundo plano.
         
         Args:
             nombre_cientifico: Nombre científico de la especie (formato del modelo)
@@ -236,33 +274,133 @@ class FirestoreManager:
             dict: Información básica de la especie
         """
         try:
-            if not self.initialized or not self.verificar_salud_conexion():
-                print("⚠️ Firestore no disponible, intentando reconectar...")
-                if not self.reconectar_firestore():
-                    print("❌ No se pudo reconectar a Firestore")
-                    return self._generar_info_error(nombre_cientifico, "Conexión a Firebase perdida")
+            info_catalogo = self._buscar_en_catalogo(nombre_cientifico)
+            if info_catalogo is not None:
+                return info_catalogo
             
-            print(f"🔍 Búsqueda con normalización para: {nombre_cientifico}")
+            if self.catalogo.es_ausente(nombre_cientifico):
+                print(f"💨 Especie ausente en cache negativa: {nombre_cientifico}")
+                return self._generar_info_no_encontrada(nombre_cientifico)
+            
+            if not self._disponible():
+                return self._generar_info_error(nombre_cientifico, "Conexión a Firebase no disponible")
             
-            for intento in range(2):
+            print(f"🔍 Búsqueda con normalización para: {nombre_cientifico}")
+            return self.circuito.ejecutar(self._ejecutar_busqueda, nombre_cientifico)
+                    
+        except Exception as e:
+            print(f"❌ Error en búsqueda: {e}")
+            return self._generar_info_error(nombre_cientifico, str(e))
+    
+    def obtener_info_especies(self, nombres_cientificos: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene la información de varias especies con una sola consulta a Firestore.
+        
+        Primero resuelve desde el catálogo local; las faltantes se piden con consultas
+        'in' sobre todas sus variaciones de nombre. Las que la consulta en lote no encontró
+        solo pasan por la búsqueda parcial; la búsqueda individual completa por variaciones
+        se reserva para cuando la consulta en lote no pudo ejecutarse.
+        
+        Args:
+            nombres_cientificos: Nombres de especies en formato del modelo
+        
+        Returns:
+            dict: Nombre del modelo → información básica de la especie
+        """
+        resultados = {}
+        pendientes = []
+        for nombre in dict.fromkeys(nombres_cientificos):
+            info_catalogo = self._buscar_en_catalogo(nombre)
+            if info_catalogo is not None:
+                resultados[nombre] = info_catalogo
+            elif self.catalogo.es_ausente(nombre):
+                resultados[nombre] = self._generar_info_no_encontrada(nombre)
+            else:
+                pendientes.append(nombre)
+        
+        # Si el lote respondió, sus variaciones exactas ya se consultaron para las faltantes
+        solo_parcial = False
+        if pendientes and self._disponible():
+            try:
+                resultados.update(self.circuito.ejecutar(self._buscar_lote_por_variaciones, pendientes))
+                solo_parcial = True
+            except Exception as e:
+                print(f"⚠️ Error en búsqueda en lote: {e}")
+            pendientes = [nombre for nombre in pendientes if nombre not in resultados]
+        
+        if pendientes:
+            busqueda = "parcial" if solo_parcial else "individual"
+            print(f"🔍 Resolviendo {len(pendientes)} especies con búsqueda {busqueda}")
+            if self.acceso_async.obtener_cliente_async() is not None:
+                resueltos = {}
+                motivo = None
                 try:
-                    return self._ejecutar_busqueda(nombre_cientifico)
+                    self.acceso_async.ejecutar(
+                        self.acceso_async.obtener_info_especies(pendientes, resueltos, solo_parcial)
+                    )
+                except concurrent.futures.TimeoutError:
+                    motivo = "Tiempo de espera agotado consultando Firestore"
                 except Exception as e:
-                    print(f"❌ Error en búsqueda (intento {intento + 1}): {e}")
-                    
-                    if intento == 0:
-                        print("🔄 Intentando reconectar...")
-                        if self.reconectar_firestore():
-                            continue
-                    
-                    return self._generar_info_error(nombre_cientifico, str(e))
-                    
+                    motivo = str(e)
+                
+                if motivo:
+                    print(f"⚠️ Búsqueda asíncrona incompleta ({len(resueltos)}/{len(pendientes)}): {motivo}")
+                
+                # Las especies ya resueltas se conservan aunque la espera se haya cortado
+                for nombre in pendientes:
+                    resultados[nombre] = resueltos.get(nombre) or self._generar_info_error(nombre, motivo)
+            elif solo_parcial:
+                for nombre in pendientes:
+                    resultados[nombre] = self._resolver_con_busqueda_parcial(nombre)
+            else:
+                for nombre in pendientes:
+                    resultados[nombre] = self.obtener_info_especie_basica(nombre)
+        
+        return resultados
+    
+    def _resolver_con_busqueda_parcial(self, nombre_cientifico: str) -> Dict[str, Any]:
+        """Resuelve una especie que la consulta en lote no encontró usando solo la búsqueda parcial."""
+        try:
+            resultado = self.circuito.ejecutar(self._busqueda_parcial_inteligente, nombre_cientifico)
         except Exception as e:
-            print(f"❌ Error general en búsqueda: {e}")
+            print(f"❌ Error en búsqueda parcial: {e}")
             return self._generar_info_error(nombre_cientifico, str(e))
+        
+        if resultado is None:
+            self.catalogo.registrar_ausente(nombre_cientifico)
+            return self._generar_info_no_encontrada(nombre_cientifico)
+        return resultado
+    
+    def _buscar_lote_por_variaciones(self, nombres_cientificos: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Consulta con 'in' todas las variaciones de nombre de las especies indicadas."""
+        nombre_por_variacion = {}
+        for nombre in nombres_cientificos:
+            variaciones = [self._nombre_cache[nombre]] if nombre in self._nombre_cache else []
+            for variacion in variaciones + self._normalizar_nombre_a_firestore(nombre):
+                nombre_por_variacion.setdefault(variacion, nombre)
+        
+        variaciones = list(nombre_por_variacion)
+        limite = CATALOG_CONFIG["max_in_query_values"]
+        plantas_ref = self.db.collection(self.collections["plantas"])
+        
+        resultados = {}
+        for desde in range(0, len(variaciones), limite):
+            query = plantas_ref.where('nombre_cientifico', 'in', variaciones[desde:desde + limite])
+            for doc in query.stream():
+                data = doc.to_dict()
+                nombre = nombre_por_variacion.get(data.get('nombre_cientifico'))
+                if nombre is not None and nombre not in resultados:
+                    self._nombre_cache[nombre] = data['nombre_cientifico']
+                    resultados[nombre] = self._procesar_datos_firestore(data, nombre)
+        
+        print(f"📦 Búsqueda en lote: {len(resultados)}/{len(nombres_cientificos)} especies en "
+              f"{(len(variaciones) + limite - 1) // limite} consultas")
+        return resultados
     
     def _ejecutar_busqueda(self, nombre_cientifico: str) -> Dict[str, Any]:
-        """Ejecuta la búsqueda principal de especies en Firestore con normalización de nombres."""
+        """Ejecuta la búsqueda principal de especies en Firestore con normalización de nombres.
+        
+        Solo se usa cuando el catálogo local no está disponible o proviene de un snapshot.
+        """
         if nombre_cientifico in self._nombre_cache:
             nombre_firestore = self._nombre_cache[nombre_cientifico]
             print(f"💨 Encontrado en cache: {nombre_firestore}")
@@ -292,55 +430,47 @@ class FirestoreManager:
             return resultado_parcial
         
         print(f"❌ No encontrado en Firestore: {nombre_cientifico}")
+        self.catalogo.registrar_ausente(nombre_cientifico)
         return self._generar_info_no_encontrada(nombre_cientifico)
     
     def _buscar_por_nombre_exacto(self, nombre_firestore: str, nombre_original: str) -> Dict[str, Any]:
-        """Realiza búsqueda exacta por nombre científico en Firestore."""
-        try:
-            plantas_ref = self.db.collection(self.collections["plantas"])
-            query = plantas_ref.where('nombre_cientifico', '==', nombre_firestore).limit(1)
-            docs = list(query.stream())
-            
-            if docs:
-                data = docs[0].to_dict()
-                return self._procesar_datos_firestore(data, nombre_original)
-            else:
-                return self._generar_info_no_encontrada(nombre_original)
-                
-        except Exception as e:
-            return self._generar_info_error(nombre_original, str(e))
+        """Realiza búsqueda exacta por nombre científico en Firestore; los errores de red se propagan al circuito."""
+        plantas_ref = self.db.collection(self.collections["plantas"])
+        query = plantas_ref.where('nombre_cientifico', '==', nombre_firestore).limit(1)
+        docs = list(query.stream())
+            
+        if docs:
+            data = docs[0].to_dict()
+            return self._procesar_datos_firestore(data, nombre_original)
+        else:
+            return self._generar_info_no_encontrada(nombre_original)
     
     def _busqueda_parcial_inteligente(self, nombre_cientifico: str) -> Optional[Dict[str, Any]]:
         """Realiza búsqueda parcial por género y especie cuando no se encuentra coincidencia exacta."""
-        try:
-            partes = nombre_cientifico.replace('_', ' ').split()
+        partes = nombre_cientifico.replace('_', ' ').split()
             
-            if len(partes) >= 2:
-                genero = partes[0]
-                especie = partes[1]
+        if len(partes) >= 2:
+            genero = partes[0]
+            especie = partes[1]
                 
-                print(f"🔍 Buscando género '{genero}' y especie '{especie}'")
+            print(f"🔍 Buscando género '{genero}' y especie '{especie}'")
                 
-                plantas_ref = self.db.collection(self.collections["plantas"])
+            plantas_ref = self.db.collection(self.collections["plantas"])
                 
-                docs = plantas_ref.limit(50).stream()
+            docs = plantas_ref.limit(50).stream()
                 
-                for doc in docs:
-                    data = doc.to_dict()
-                    nombre_doc = data.get('nombre_cientifico', '').lower()
+            for doc in docs:
+                data = doc.to_dict()
+                nombre_doc = data.get('nombre_cientifico', '').lower()
                     
-                    if genero.lower() in nombre_doc and especie.lower() in nombre_doc:
-                        print(f"🎯 Coincidencia parcial encontrada: {data.get('nombre_cientifico')}")
+                if genero.lower() in nombre_doc and especie.lower() in nombre_doc:
+                    print(f"🎯 Coincidencia parcial encontrada: {data.get('nombre_cientifico')}")
                         
-                        self._nombre_cache[nombre_cientifico] = data.get('nombre_cientifico')
+                    self._nombre_cache[nombre_cientifico] = data.get('nombre_cientifico')
                         
-                        return self._procesar_datos_firestore(data, nombre_cientifico)
+                    return self._procesar_datos_firestore(data, nombre_cientifico)
             
-            return None
-            
-        except Exception as e:
-            print(f"❌ Error en búsqueda parcial: {e}")
-            return None
+        return None
     
     def _procesar_datos_firestore(self, data: Dict[str, Any], nombre_original: str) -> Dict[str, Any]:
         """Procesa y formatea los datos obtenidos de Firestore para presentación."""
@@ -429,11 +559,11 @@ class FirestoreManager:
         return self.obtener_info_especie_basica(nombre_cientifico)
     
     def guardar_analisis_usuario(self, datos_analisis: Dict[str, Any]) -> Dict[str, str]:
-        """Guarda los datos de análisis de un usuario en la colección de Firestore."""
-        if not self.initialized:
-            print("⚠️ Firestore no inicializado")
-            return {"status": "error", "mensaje": "Firestore no inicializado"}
+        """Registra el análisis de un usuario en el diario local de escrituras, que lo envía a Firestore en lote.
         
+        El id del documento se deriva de la sesión y del evento (especie, método y resultado),
+        así un clic repetido se descarta en el diario y un reenvío sobrescribe el mismo documento.
+        """
         try:
             analisis_completo = {
                 **datos_analisis,
@@ -443,20 +573,40 @@ class FirestoreManager:
                 "version_sistema": "1.0_corregida"
             }
             
-            analisis_ref = self.db.collection(self.collections["analisis_usuarios"])
-            doc_ref = analisis_ref.add(analisis_completo)
+            clave = doc_id = None
+            if datos_analisis.get("session_id"):
+                evento = "/".join(str(datos_analisis.get(campo)) for campo in
+                                  ("session_id", "especie_final", "metodo", "correcto"))
+                clave = f"{self.collections['analisis_usuarios']}/{evento}"
+                doc_id = uuid.uuid5(uuid.NAMESPACE_URL, clave).hex
             
-            print(f"✅ Análisis guardado en Firestore: {doc_ref[1].id}")
-            return {"status": "guardado", "id": doc_ref[1].id}
+            doc_id = self.registrar_documento("analisis_usuarios", analisis_completo, doc_id, clave)
+            return {"status": "encolado", "id": doc_id}
             
         except Exception as e:
             print(f"❌ Error guardando análisis: {e}")
             return {"status": "error", "mensaje": str(e)}
     
+    def registrar_documento(self, clave_coleccion: str, datos: Dict[str, Any], doc_id: Optional[str] = None,
+                            clave: Optional[str] = None) -> str:
+        """Registra un documento en el diario local para escribirlo en lote en una colección configurada.
+        
+        Args:
+            clave_coleccion: Clave en FIREBASE_CONFIG["collections"] (analisis_usuarios, sesiones_usuarios, ...)
+            datos: Contenido del documento
+            doc_id: Id opcional; si se omite se genera uno para que los reintentos sean idempotentes
+            clave: Clave de deduplicación opcional; mientras haya una escritura pendiente con
+                   la misma clave, las siguientes se descartan
+        
+        Returns:
+            str: Id del documento
+        """
+        return self.escritor.agregar(self.collections[clave_coleccion], datos, doc_id, clave)
+    
     def listar_todas_especies(self, limite: int = 100) -> List[Dict[str, Any]]:
         """Obtiene una lista de todas las especies disponibles en la base de datos."""
         try:
-            if not self.initialized:
+            if not self._disponible():
                 return []
             
             plantas_ref = self.db.collection(self.collections["plantas"])
@@ -485,6 +635,10 @@ def inicializar_firestore():
     """Función de conveniencia para inicializar la conexión con Firestore."""
     return firestore_manager.initialize_firestore()
 
+def conectar_firestore_en_segundo_plano():
+    """Función de conveniencia para abrir la conexión con Firestore sin bloquear el arranque."""
+    firestore_manager.conectar_en_segundo_plano()
+
 def obtener_info_planta_basica(nombre_especie):
     """Función de conveniencia para obtener información básica de una planta."""
     return firestore_manager.obtener_info_especie_basica(nombre_especie)
@@ -493,6 +647,10 @@ def obtener_info_planta(nombre_especie):
     """Función de conveniencia para obtener información completa de una planta."""
     return firestore_manager.obtener_info_especie_basica(nombre_especie)
 
+def obtener_info_plantas(nombres_especies):
+    """Función de conveniencia para obtener la información de varias plantas en una sola consulta."""
+    return firestore_manager.obtener_info_especies(nombres_especies)
+
 def guardar_analisis(datos):
     """Función de conveniencia para guardar datos de análisis en Firestore."""
     return firestore_manager.guardar_analisis_usuario(datos)
@@ -501,11 +659,36 @@ def establecer_url_api_global(url_api):
     """Función de conveniencia para establecer la URL de la API globalmente."""
     firestore_manager.establecer_url_api(url_api)
 
+def obtener_estadisticas_escritura():
+    """Función de conveniencia para consultar el diario de escrituras en lote."""
+    return firestore_manager.escritor.obtener_estadisticas()
+
+def vaciar_escrituras_firestore(timeout=None):
+    """Función de conveniencia para forzar la escritura de los documentos pendientes (espera como máximo timeout segundos)."""
+    return firestore_manager.escritor.vaciar(timeout)
+
+def reintentar_escrituras_fallidas():
+    """Función de conveniencia para devolver a la cola las escrituras que agotaron sus reintentos."""
+    return firestore_manager.escritor.reactivar_fallidas()
+
+def consultar_en_paralelo(*corrutinas, timeout=None):
+    """Función de conveniencia para lanzar varias lecturas asíncronas de Firestore y esperar una sola vez."""
+    return firestore_manager.acceso_async.consultar_en_paralelo(*corrutinas, timeout=timeout)
+
+def obtener_estado_conexion():
+    """Función de conveniencia para consultar el estado del circuito de Firestore."""
+    return firestore_manager.circuito.obtener_estadisticas()
+
 def listar_especies_disponibles(limite=100):
     """Función de conveniencia para listar especies disponibles en la base de datos."""
     return firestore_manager.listar_todas_especies(limite)
 
+def obtener_estadisticas_catalogo():
+    """Función de conveniencia para consultar el estado del catálogo local de especies."""
+    return firestore_manager.catalogo.obtener_estadisticas()
+
 firebase_manager = firestore_manager
+acceso_firestore_async = firestore_manager.acceso_async
 
 if __name__ == "__main__":
     print("🔥 TESTING FIREBASE CONFIG CORREGIDO")
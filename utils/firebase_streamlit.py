@@ -1,39 +1,15 @@
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
 import json
 from pathlib import Path
 import sys
 
 sys.path.append(str(Path(__file__).parent.parent))
 from config import FIREBASE_CONFIG
+from utils.firebase_config import firestore_manager
 
-@st.cache_resource
 def initialize_firebase():
-    """Inicializa Firebase una sola vez para toda la aplicación Streamlit usando cache."""
-    try:
-        if firebase_admin._apps:
-            print("🔥 Firebase ya inicializado")
-            return firestore.client()
-        
-        cred_path = Path(FIREBASE_CONFIG["service_account_path"])
-        
-        if not cred_path.exists():
-            print(f"❌ Archivo de credenciales no encontrado: {cred_path}")
-            return None
-        
-        cred = credentials.Certificate(str(cred_path))
-        firebase_admin.initialize_app(cred, {
-            'projectId': FIREBASE_CONFIG["project_id"]
-        })
-        
-        db = firestore.client()
-        print("✅ Firebase inicializado exitosamente para Streamlit")
-        return db
-        
-    except Exception as e:
-        print(f"❌ Error inicializando Firebase: {e}")
-        return None
+    """Retorna el cliente de Firestore compartido, creado de forma diferida por FirestoreManager."""
+    return firestore_manager.obtener_cliente()
 
 @st.cache_data(ttl=600)
 def get_plant_from_firestore(species_name):
@@ -44,9 +20,6 @@ def get_plant_from_firestore(species_name):
         if not db:
             return None
         
-        collection_name = FIREBASE_CONFIG["collections"]["plantas"]
-        plantas_ref = db.collection(collection_name)
-        
         search_variations = [
             species_name,
             species_name.replace('_', ' '),
@@ -54,26 +27,36 @@ def get_plant_from_firestore(species_name):
             species_name.replace('_', ' ').replace('(', ' (').replace(')', ') ')
         ]
         
-        for variation in search_variations:
-            query = plantas_ref.where('nombre_cientifico', '==', variation).limit(1)
-            docs = list(query.stream())
+        variaciones = list(dict.fromkeys(search_variations))
+        acceso = firestore_manager.acceso_async
+        
+        if acceso.obtener_cliente_async() is not None:
+            doc_data = acceso.ejecutar(acceso.buscar_por_variaciones(variaciones))
+        else:
+            # Sin AsyncClient se consulta con el cliente síncrono, una variación a la vez
+            doc_data = None
+            plantas_ref = db.collection(FIREBASE_CONFIG["collections"]["plantas"])
+            for variation in variaciones:
+                docs = list(plantas_ref.where('nombre_cientifico', '==', variation).limit(1).stream())
+                if docs:
+                    doc_data = docs[0].to_dict()
+                    break
             
-            if docs:
-                doc_data = docs[0].to_dict()
-                print(f"✅ Encontrado en Firestore: {variation}")
+        if doc_data:
+            print(f"✅ Encontrado en Firestore: {doc_data.get('nombre_cientifico')}")
                 
-                return {
-                    "found": True,
-                    "nombre_comun": doc_data.get('nombre_comun', 'Nombre no disponible'),
-                    "nombre_cientifico": doc_data.get('nombre_cientifico', species_name),
-                    "descripcion": doc_data.get('descripcion', 'Descripción no disponible'),
-                    "familia": doc_data.get('taxonomia', {}).get('familia', '') if isinstance(doc_data.get('taxonomia'), dict) else '',
-                    "origen": doc_data.get('fecha_observacion', ''),
-                    "fuente": doc_data.get('fuente', ''),
-                    "imagenes": doc_data.get('imagenes', []),
-                    "taxonomia": doc_data.get('taxonomia', {}) if isinstance(doc_data.get('taxonomia'), dict) else {},
-                    "fuente_datos": "Firebase Firestore"
-                }
+            return {
+                "found": True,
+                "nombre_comun": doc_data.get('nombre_comun', 'Nombre no disponible'),
+                "nombre_cientifico": doc_data.get('nombre_cientifico', species_name),
+                "descripcion": doc_data.get('descripcion', 'Descripción no disponible'),
+                "familia": doc_data.get('taxonomia', {}).get('familia', '') if isinstance(doc_data.get('taxonomia'), dict) else '',
+                "origen": doc_data.get('fecha_observacion', ''),
+                "fuente": doc_data.get('fuente', ''),
+                "imagenes": doc_data.get('imagenes', []),
+                "taxonomia": doc_data.get('taxonomia', {}) if isinstance(doc_data.get('taxonomia'), dict) else {},
+                "fuente_datos": "Firebase Firestore"
+            }
         
         print(f"❌ No encontrado en Firestore: {species_name}")
         return None
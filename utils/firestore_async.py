@@ -0,0 +1,292 @@
+import asyncio
+import concurrent.futures
+import threading
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import ASYNC_FIRESTORE_CONFIG
+
+async def reunir_acotado(corrutinas, limite=None, devolver_excepciones=True):
+    """Ejecuta varias corrutinas a la vez con un máximo de llamadas simultáneas.
+    
+    Args:
+        corrutinas: Corrutinas a ejecutar
+        limite: Máximo de corrutinas en curso (por defecto ASYNC_FIRESTORE_CONFIG["max_concurrency"])
+        devolver_excepciones: Si True, los errores se retornan en la lista en lugar de propagarse
+    
+    Returns:
+        list: Resultados en el mismo orden de las corrutinas
+    """
+    semaforo = asyncio.Semaphore(limite or ASYNC_FIRESTORE_CONFIG["max_concurrency"])
+    
+    async def _acotada(corrutina):
+        async with semaforo:
+            return await corrutina
+    
+    return await asyncio.gather(
+        *(_acotada(corrutina) for corrutina in corrutinas),
+        return_exceptions=devolver_excepciones
+    )
+
+class AccesoFirestoreAsync:
+    """Acceso a Firestore con AsyncClient para lanzar varias lecturas independientes y esperar una sola vez"""
+    
+    def __init__(self, manager, cliente=None, limite=None):
+        """
+        Args:
+            manager: FirestoreManager que aporta el catálogo, el circuito y el formato de los resultados
+            cliente: AsyncClient (o un cliente falso para pruebas); por defecto se crea al primer uso
+            limite: Máximo de lecturas simultáneas
+        """
+        self.manager = manager
+        self.limite = limite or ASYNC_FIRESTORE_CONFIG["max_concurrency"]
+        self._cliente_async = cliente
+        self._cliente_inyectado = cliente is not None
+        self._generacion_cliente = None
+        self._semaforo = None
+        self._loop = None
+        self._lock = threading.Lock()
+    
+    def obtener_cliente_async(self):
+        """Retorna el AsyncClient con las credenciales de la app de Firebase del cliente síncrono.
+        
+        Si el cliente síncrono se recreó (reconexión), el AsyncClient también se recrea.
+        """
+        if self._cliente_inyectado:
+            return self._cliente_async
+        
+        if self.manager.obtener_cliente() is None:
+            return None
+        
+        with self._lock:
+            generacion = self.manager.generacion_cliente
+            if self._cliente_async is None or self._generacion_cliente != generacion:
+                try:
+                    import firebase_admin
+                    from google.cloud import firestore
+                    app = firebase_admin.get_app()
+                    self._cliente_async = firestore.AsyncClient(
+                        credentials=app.credential.get_credential(),
+                        project=app.project_id
+                    )
+                    self._generacion_cliente = generacion
+                except Exception as e:
+                    print(f"❌ Error creando cliente asíncrono de Firestore: {e}")
+                    self._cliente_async = None
+            return self._cliente_async
+    
+    def _obtener_loop(self):
+        """Retorna el event loop propio, que corre en un hilo aparte para servir al hilo de Streamlit."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="firestore-async",
+                    daemon=True
+                ).start()
+            return self._loop
+    
+    def ejecutar(self, corrutina, timeout=None):
+        """Ejecuta una corrutina desde código síncrono y espera su resultado.
+        
+        Raises:
+            concurrent.futures.TimeoutError: Si no termina a tiempo; la corrutina se cancela en el event loop
+        """
+        futuro = asyncio.run_coroutine_threadsafe(corrutina, self._obtener_loop())
+        try:
+            return futuro.result(timeout or ASYNC_FIRESTORE_CONFIG["timeout_seconds"])
+        except concurrent.futures.TimeoutError:
+            futuro.cancel()
+            raise
+    
+    async def _leer(self, lectura):
+        """Espera una lectura de Firestore respetando el máximo de lecturas simultáneas de la instancia."""
+        # Se crea dentro del event loop, en su hilo, y se comparte entre todas las consultas anidadas
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.limite)
+        
+        try:
+            async with self._semaforo:
+                return await lectura
+        finally:
+            # Una lectura cancelada mientras esperaba turno nunca llegó a ejecutarse
+            if asyncio.iscoroutine(lectura):
+                lectura.close()
+    
+    def consultar_en_paralelo(self, *corrutinas, timeout=None):
+        """Lanza varias lecturas a la vez y espera una sola vez; los errores se retornan en su posición."""
+        return self.ejecutar(reunir_acotado(corrutinas, self.limite), timeout)
+    
+    async def buscar_por_variaciones(self, variaciones):
+        """Consulta todas las variaciones de un nombre a la vez y retorna el primer documento por orden de preferencia."""
+        cliente = self.obtener_cliente_async()
+        if cliente is None:
+            return None
+        
+        plantas_ref = cliente.collection(self.manager.collections["plantas"])
+        consultas = [
+            self._leer(plantas_ref.where('nombre_cientifico', '==', variacion).limit(1).get())
+            for variacion in variaciones
+        ]
+        
+        for docs in await asyncio.gather(*consultas):
+            if docs:
+                return docs[0].to_dict()
+        return None
+    
+    async def _busqueda_parcial(self, nombre_cientifico):
+        """Versión asíncrona de la búsqueda parcial por género y especie."""
+        partes = nombre_cientifico.replace('_', ' ').split()
+        if len(partes) < 2:
+            return None
+        
+        genero, especie = partes[0].lower(), partes[1].lower()
+        plantas_ref = self.obtener_cliente_async().collection(self.manager.collections["plantas"])
+        
+        for doc in await self._leer(plantas_ref.limit(50).get()):
+            data = doc.to_dict()
+            nombre_doc = data.get('nombre_cientifico', '').lower()
+            if genero in nombre_doc and especie in nombre_doc:
+                return data
+        return None
+    
+    async def obtener_info_especie(self, nombre_cientifico, solo_parcial=False):
+        """Obtiene la información básica de una especie con el mismo formato que la búsqueda síncrona.
+        
+        Args:
+            nombre_cientifico: Nombre de la especie en formato del modelo
+            solo_parcial: Si True, omite las consultas exactas por variación (ya respondidas
+                          por una consulta en lote) y va directo a la búsqueda parcial
+        """
+        manager = self.manager
+        
+        data = manager.catalogo.obtener(nombre_cientifico)
+        if data is not None:
+            return manager._procesar_datos_firestore(data, nombre_cientifico)
+        if manager.catalogo.es_ausente(nombre_cientifico):
+            return manager._generar_info_no_encontrada(nombre_cientifico)
+        
+        if self.obtener_cliente_async() is None or not manager.circuito.permitir():
+            return manager._generar_info_error(nombre_cientifico, "Conexión a Firebase no disponible")
+        
+        variaciones = manager._normalizar_nombre_a_firestore(nombre_cientifico)
+        if nombre_cientifico in manager._nombre_cache:
+            variaciones.insert(0, manager._nombre_cache[nombre_cientifico])
+        
+        try:
+            data = None
+            if not solo_parcial:
+                data = await self.buscar_por_variaciones(list(dict.fromkeys(variaciones)))
+            if data is None:
+                data = await self._busqueda_parcial(nombre_cientifico)
+            manager.circuito.registrar_exito()
+        
+        except Exception as e:
+            manager.circuito.registrar_fallo(e)
+            print(f"❌ Error en búsqueda asíncrona de {nombre_cientifico}: {e}")
+            return manager._generar_info_error(nombre_cientifico, str(e))
+        
+        if data is None:
+            manager.catalogo.registrar_ausente(nombre_cientifico)
+            return manager._generar_info_no_encontrada(nombre_cientifico)
+        
+        manager._nombre_cache[nombre_cientifico] = data.get('nombre_cientifico')
+        return manager._procesar_datos_firestore(data, nombre_cientifico)
+    
+    async def obtener_info_especies(self, nombres_cientificos, resultados=None, solo_parcial=False):
+        """Obtiene la información de varias especies a la vez.
+        
+        Args:
+            nombres_cientificos: Nombres de especies en formato del modelo
+            resultados: Diccionario opcional que se va llenando a medida que cada especie se
+                        resuelve, para conservar las ya resueltas si la espera se corta
+            solo_parcial: Si True, cada especie se resuelve solo con la búsqueda parcial
+        
+        Returns:
+            dict: Nombre del modelo → información básica de la especie
+        """
+        resultados = {} if resultados is None else resultados
+        
+        async def _resolver(nombre):
+            resultados[nombre] = await self.obtener_info_especie(nombre, solo_parcial)
+        
+        await asyncio.gather(*(_resolver(nombre) for nombre in dict.fromkeys(nombres_cientificos)))
+        return resultados
+    
+    async def obtener_documento(self, clave_coleccion, doc_id):
+        """Lee un documento por id de una colección configurada; retorna None si no existe."""
+        cliente = self.obtener_cliente_async()
+        if cliente is None:
+            return None
+        
+        doc = await self._leer(cliente.collection(self.manager.collections[clave_coleccion]).document(doc_id).get())
+        return doc.to_dict() if doc.exists else None
+    
+    async def contar_documentos(self, clave_coleccion):
+        """Cuenta los documentos de una colección configurada con una consulta de agregación."""
+        cliente = self.obtener_cliente_async()
+        if cliente is None:
+            return None
+        
+        resultado = await self._leer(cliente.collection(self.manager.collections[clave_coleccion]).count().get())
+        return resultado[0][0].value
+
+if __name__ == "__main__":
+    import time
+    from utils.firebase_config import FirestoreManager
+    
+    print("⏱️ Benchmark de lecturas concurrentes contra un cliente falso con latencia")
+    
+    LATENCIA = 0.05
+    
+    class _DocumentoFalso:
+        def __init__(self, data):
+            self._data = data
+            self.exists = data is not None
+        
+        def to_dict(self):
+            return dict(self._data)
+    
+    class _ConsultaFalsa:
+        def __init__(self, documentos, filtro=None):
+            self.documentos = documentos
+            self.filtro = filtro
+        
+        def where(self, campo, operador, valor):
+            return _ConsultaFalsa(self.documentos, (campo, valor))
+        
+        def limit(self, cantidad):
+            return self
+        
+        async def get(self):
+            await asyncio.sleep(LATENCIA)
+            campo, valor = self.filtro
+            return [_DocumentoFalso(d) for d in self.documentos if d.get(campo) == valor][:1]
+    
+    class _ClienteFalso:
+        def __init__(self, documentos):
+            self.documentos = documentos
+        
+        def collection(self, nombre):
+            return _ConsultaFalsa(self.documentos)
+    
+    documentos = [{"nombre_cientifico": f"Genero{i} especie{i} L."} for i in range(20)]
+    nombres = [f"Genero{i}_especie{i}_L" for i in range(10)]
+    
+    manager = FirestoreManager()
+    acceso = AccesoFirestoreAsync(manager, cliente=_ClienteFalso(documentos))
+    
+    inicio = time.perf_counter()
+    for nombre in nombres:
+        acceso.ejecutar(acceso.obtener_info_especie(nombre))
+    secuencial = time.perf_counter() - inicio
+    
+    manager._nombre_cache.clear()
+    inicio = time.perf_counter()
+    acceso.ejecutar(acceso.obtener_info_especies(nombres))
+    concurrente = time.perf_counter() - inicio
+    
+    print(f"   Secuencial:   {secuencial * 1000:.0f}ms para {len(nombres)} especies")
+    print(f"   Concurrente:  {concurrente * 1000:.0f}ms (máximo {acceso.limite} lecturas simultáneas)")
@@ -0,0 +1,258 @@
+import atexit
+import threading
+import time
+import uuid
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import FIRESTORE_WRITE_CONFIG
+from utils.write_journal import DiarioEscrituras
+
+LIMITE_LOTE_FIRESTORE = 500
+
+ESCRITO = "escrito"
+FALLIDO = "fallido"
+SIN_CONEXION = "sin_conexion"
+
+class EscritorLotesFirestore:
+    """Registra cada documento en el diario local y lo reproduce en Firestore con WriteBatch cada N documentos o T milisegundos"""
+    
+    def __init__(self, obtener_cliente, circuito, diario=None, config=None):
+        """
+        Args:
+            obtener_cliente: Función que retorna el cliente de Firestore (o None si no hay conexión)
+            circuito: InterruptorCircuito que registra el resultado de cada commit
+            diario: DiarioEscrituras donde se persisten las escrituras pendientes
+            config: Tamaño de lote, intervalo y reintentos (por defecto FIRESTORE_WRITE_CONFIG)
+        """
+        self.obtener_cliente = obtener_cliente
+        self.circuito = circuito
+        self.diario = diario or DiarioEscrituras()
+        self.config = config or FIRESTORE_WRITE_CONFIG
+        self.tamano_lote = min(self.config["batch_size"], LIMITE_LOTE_FIRESTORE)
+        self.intervalo = self.config["flush_interval_ms"] / 1000.0
+        
+        self._profundidad = 0
+        self._en_vuelo = 0
+        self._primer_pendiente = None
+        self._reintentar_en = 0.0
+        self._fallos_seguidos = 0
+        self._forzar = False
+        self._detenido = False
+        self._hilo = None
+        self._condicion = threading.Condition()
+        self._estadisticas = {
+            "escritos": 0,
+            "lotes": 0,
+            "reintentos": 0,
+            "descartados": 0,
+            "ultimo_error": None
+        }
+        atexit.register(self.detener)
+    
+    def iniciar(self):
+        """Arranca el reproductor del diario; las escrituras que quedaron de ejecuciones anteriores se envían primero."""
+        with self._condicion:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            
+            self._detenido = False
+            self._profundidad = self.diario.contar_pendientes()
+            if self._profundidad:
+                print(f"📒 Diario de escrituras: {self._profundidad} pendientes de ejecuciones anteriores")
+                self._primer_pendiente = time.monotonic() - self.intervalo
+            
+            self._hilo = threading.Thread(
+                target=self._procesar_diario,
+                name="escritor-firestore",
+                daemon=True
+            )
+            self._hilo.start()
+    
+    def agregar(self, coleccion, datos, doc_id=None, clave=None):
+        """Registra un documento en el diario local y retorna de inmediato.
+        
+        El id del documento se fija aquí, así un lote reintentado sobrescribe los mismos
+        documentos en lugar de duplicarlos.
+        
+        Args:
+            coleccion: Colección de destino
+            datos: Contenido del documento
+            doc_id: Id opcional del documento
+            clave: Clave de deduplicación opcional; una segunda escritura con la misma clave se ignora
+        
+        Returns:
+            str: Id del documento en la colección
+        """
+        self.iniciar()
+        doc_id = doc_id or uuid.uuid4().hex
+        
+        if self.diario.agregar(coleccion, doc_id, datos, clave):
+            with self._condicion:
+                self._profundidad += 1
+                if self._primer_pendiente is None:
+                    self._primer_pendiente = time.monotonic()
+                self._condicion.notify()
+        
+        return doc_id
+    
+    def reactivar_fallidas(self):
+        """Devuelve al diario pendiente las escrituras que agotaron sus reintentos."""
+        reactivadas = self.diario.reintentar_fallidas()
+        if reactivadas:
+            self.iniciar()
+            with self._condicion:
+                self._profundidad = self.diario.contar_pendientes()
+                if self._primer_pendiente is None:
+                    self._primer_pendiente = time.monotonic()
+                self._condicion.notify()
+        return reactivadas
+    
+    def vaciar(self, timeout=None):
+        """Fuerza el envío de todo el diario y espera a que termine.
+        
+        Args:
+            timeout: Segundos máximos de espera (por defecto flush_timeout_seconds); con el
+                     circuito abierto el diario no puede vaciarse y la espera termina al vencer
+        
+        Returns:
+            bool: True si el diario quedó vacío antes del timeout
+        """
+        if timeout is None:
+            timeout = self.config["flush_timeout_seconds"]
+        
+        with self._condicion:
+            self._forzar = True
+            self._reintentar_en = 0.0
+            self._condicion.notify()
+            vacio = self._condicion.wait_for(
+                lambda: self._profundidad == 0 and self._en_vuelo == 0, timeout
+            )
+            self._forzar = False
+            return vacio
+    
+    def detener(self, timeout=10):
+        """Hace un último intento de envío y detiene el reproductor; lo pendiente sigue en el diario."""
+        with self._condicion:
+            if self._hilo is None or not self._hilo.is_alive():
+                return
+            hilo = self._hilo
+            self._detenido = True
+            self._reintentar_en = 0.0
+            self._condicion.notify()
+        
+        hilo.join(timeout)
+        if self._profundidad:
+            print(f"📒 {self._profundidad} escrituras quedan en el diario para la próxima ejecución")
+    
+    def obtener_estadisticas(self):
+        """Retorna la profundidad y el retraso del diario junto con los contadores de escritura."""
+        metricas = self.diario.obtener_metricas()
+        with self._condicion:
+            return {
+                "pendientes": metricas["profundidad"],
+                "retraso_segundos": metricas["retraso_segundos"],
+                "fallidas_en_diario": metricas["fallidas"],
+                "tamano_lote": self.tamano_lote,
+                **self._estadisticas
+            }
+    
+    def _lote_listo(self):
+        """Indica si ya corresponde enviar un lote."""
+        if not self._profundidad or time.monotonic() < self._reintentar_en:
+            return False
+        if self._forzar or self._detenido or self._profundidad >= self.tamano_lote:
+            return True
+        return time.monotonic() - self._primer_pendiente >= self.intervalo
+    
+    def _tiempo_espera(self):
+        """Calcula cuánto puede dormir el hilo antes del siguiente lote por tiempo o reintento."""
+        if not self._profundidad:
+            return None
+        limite = max(self._primer_pendiente + self.intervalo, self._reintentar_en)
+        return max(0.0, limite - time.monotonic())
+    
+    def _procesar_diario(self):
+        """Bucle del reproductor: envía el diario en orden de llegada, un lote a la vez."""
+        while True:
+            with self._condicion:
+                while not self._lote_listo():
+                    if self._detenido and not self._profundidad:
+                        return
+                    self._condicion.wait(self._tiempo_espera())
+            
+            lote = self.diario.leer_pendientes(self.tamano_lote)
+            with self._condicion:
+                self._en_vuelo = len(lote)
+            resultado = self._escribir_lote(lote) if lote else ESCRITO
+            
+            with self._condicion:
+                self._en_vuelo = 0
+                if not lote:
+                    self._profundidad = 0
+                elif resultado == ESCRITO:
+                    self._profundidad = max(0, self._profundidad - len(lote))
+                    self._fallos_seguidos = 0
+                else:
+                    self._programar_reintento(lote, contar_intento=resultado == FALLIDO)
+                self._primer_pendiente = time.monotonic() if self._profundidad else None
+                self._condicion.notify_all()
+                
+                # Al detener solo se hace un último intento; lo que falle queda en el diario
+                if resultado != ESCRITO and self._detenido:
+                    return
+    
+    def _escribir_lote(self, lote):
+        """Envía un lote con un solo commit y lo borra del diario si Firestore lo confirma.
+        
+        Returns:
+            str: ESCRITO, FALLIDO si el commit falló, o SIN_CONEXION si no se intentó por estar Firestore caído
+        """
+        db = self.obtener_cliente()
+        if db is None:
+            # Sin cliente no hay lecturas que abran el circuito: se abre aquí para que reconecte
+            self.circuito.abrir("Firestore no inicializado")
+            return SIN_CONEXION
+        if not self.circuito.permitir():
+            return SIN_CONEXION
+        
+        try:
+            batch = db.batch()
+            for documento in lote:
+                batch.set(db.collection(documento["coleccion"]).document(documento["id"]), documento["datos"])
+            self.circuito.ejecutar(batch.commit)
+        
+        except Exception as e:
+            with self._condicion:
+                self._estadisticas["ultimo_error"] = str(e)
+            print(f"❌ Error escribiendo lote en Firestore ({len(lote)} documentos): {e}")
+            return FALLIDO
+        
+        self.diario.confirmar([documento["secuencia"] for documento in lote])
+        
+        with self._condicion:
+            self._estadisticas["escritos"] += len(lote)
+            self._estadisticas["lotes"] += 1
+            self._estadisticas["ultimo_error"] = None
+        print(f"✅ Lote de {len(lote)} documentos escrito en Firestore")
+        return ESCRITO
+    
+    def _programar_reintento(self, lote, contar_intento=True):
+        """Registra el fallo en el diario y programa el siguiente intento con backoff exponencial.
+        
+        Mientras el circuito está abierto el lote espera en el diario sin consumir reintentos.
+        """
+        if contar_intento:
+            agotadas = self.diario.registrar_fallo(
+                [documento["secuencia"] for documento in lote],
+                self._estadisticas["ultimo_error"],
+                self.config["max_retries"]
+            )
+            self._profundidad = max(0, self._profundidad - agotadas)
+            self._estadisticas["descartados"] += agotadas
+            self._estadisticas["reintentos"] += 1
+            self._fallos_seguidos += 1
+        
+        espera = self.config["retry_backoff_seconds"] * 2 ** max(self._fallos_seguidos - 1, 0)
+        self._reintentar_en = time.monotonic() + min(espera, self.config["max_backoff_seconds"])
@@ -1,14 +1,97 @@
 import cv2
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 import os
+import math
 import json
+import hashlib
 from pathlib import Path
 from datetime import datetime
 import sys
+import threading
 
 sys.path.append(str(Path(__file__).parent.parent))
-from config import MODEL_CONFIG, PLANTAS_DIR, PATHS
+from config import MODEL_CONFIG, PLANTAS_DIR, PATHS, STREAMLIT_CONFIG, RETRAINING_CONFIG
+from utils.dataset_manifest import (
+    ManifestDataset, EXTENSIONES_IMAGEN, calcular_hash_archivo, calcular_hash_perceptual, distancia_hamming
+)
+from utils.dataset_loader import CargadorDataset
+from utils.parallel_decoder import DecodificadorParalelo
+from utils.tensor_cache import CacheTensores
+from utils.augmentation import aumentar_lote
+from utils.image_writer import escritor_imagenes, codificar_jpeg, escribir_archivo_atomico
+
+LUT_NORMALIZACION = np.arange(256, dtype=np.float32) / 255.0
+
+_buffers_hilo = threading.local()
+
+def crear_tensor_entrada(target_size, layout="NCHW"):
+    """Crea un tensor float32 contiguo (1, ...) con la disposición indicada."""
+    target_h, target_w = target_size
+    forma = (1, 3, target_h, target_w) if layout == "NCHW" else (1, target_h, target_w, 3)
+    return np.zeros(forma, dtype=np.float32)
+
+def obtener_buffer_entrada(target_size, layout="NCHW"):
+    """Retorna el tensor de entrada reutilizable del hilo actual para el tamaño y disposición dados."""
+    buffers = getattr(_buffers_hilo, "buffers", None)
+    if buffers is None:
+        buffers = _buffers_hilo.buffers = {}
+    
+    clave = (tuple(target_size), layout)
+    if clave not in buffers:
+        buffers[clave] = crear_tensor_entrada(target_size, layout)
+    return buffers[clave]
+
+def corregir_orientacion(imagen):
+    """Aplica la orientación EXIF de la imagen solo cuando es distinta de la normal."""
+    try:
+        orientacion = imagen.getexif().get(0x0112, 1)
+    except Exception:
+        return imagen
+    
+    if orientacion != 1:
+        return ImageOps.exif_transpose(imagen)
+    return imagen
+
+def decodificar_imagen(origen, tamano_minimo=None, max_pixeles=None):
+    """Decodifica una imagen a la menor escala posible que siga cubriendo el tamaño requerido.
+    
+    Para JPEG usa la decodificación reducida del códec (draft), de modo que una foto
+    de 12-48 MP nunca se decodifica completa si solo se necesita una versión pequeña.
+    
+    Args:
+        origen: Ruta, archivo subido (file-like) o PIL Image aún sin cargar
+        tamano_minimo: (ancho, alto) que el resultado debe cubrir tras un letterbox
+        max_pixeles: Máximo de píxeles permitido en la imagen decodificada
+    
+    Returns:
+        PIL.Image: Imagen RGB con la orientación EXIF aplicada
+    """
+    imagen = origen if isinstance(origen, Image.Image) else Image.open(origen)
+    ancho, alto = imagen.size
+    
+    if tamano_minimo is not None:
+        target_w, target_h = tamano_minimo
+        escala = min(target_w / ancho, target_h / alto, 1.0)
+        imagen.draft('RGB', (math.ceil(ancho * escala), math.ceil(alto * escala)))
+    
+    if max_pixeles is not None and ancho * alto > max_pixeles:
+        escala = math.sqrt(max_pixeles / (ancho * alto))
+        tamano_maximo = (max(1, int(ancho * escala)), max(1, int(alto * escala)))
+        imagen.draft('RGB', tamano_maximo)
+        imagen.thumbnail(tamano_maximo, reducing_gap=None)
+    
+    imagen = corregir_orientacion(imagen)
+    
+    if imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+    
+    return imagen
+
+def cargar_imagen_subida(archivo):
+    """Decodifica una imagen subida por el usuario limitando sus píxeles según max_file_size."""
+    max_pixeles = STREAMLIT_CONFIG["max_file_size"] * 1024 * 1024 // 3
+    return decodificar_imagen(archivo, max_pixeles=max_pixeles)
 
 class ImageProcessor:
     """Clase para manejar todo el procesamiento de imágenes"""
@@ -20,21 +103,8 @@ class ImageProcessor:
     def cargar_y_procesar_imagen(self, ruta_imagen):
         """Carga y procesa una imagen desde múltiples formatos preparándola para el modelo."""
         try:
-            if isinstance(ruta_imagen, (str, Path)):
-                imagen = cv2.imread(str(ruta_imagen))
-                if imagen is None:
-                    print(f"❌ Error: No se pudo cargar la imagen {ruta_imagen}")
-                    return None
-                imagen = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
-                
-            elif isinstance(ruta_imagen, Image.Image):
-                imagen = np.array(ruta_imagen.convert('RGB'))
-                
-            elif isinstance(ruta_imagen, np.ndarray):
-                imagen = ruta_imagen.copy()
-                
-            else:
-                print(f"❌ Tipo de imagen no soportado: {type(ruta_imagen)}")
+            imagen = self._cargar_rgb(ruta_imagen)
+            if imagen is None:
                 return None
             
             imagen_redim = self._redimensionar_con_aspecto(imagen)
@@ -47,22 +117,71 @@ class ImageProcessor:
             print(f"❌ Error procesando imagen: {e}")
             return None
     
-    def procesar_para_prediccion(self, imagen):
-        """Procesa una imagen agregando dimensión batch y convirtiendo al formato ONNX."""
-        img_procesada = self.cargar_y_procesar_imagen(imagen)
+    def procesar_para_prediccion(self, imagen, layout="NCHW", buffer=None):
+        """Procesa una imagen en un solo paso escribiendo directamente el tensor de entrada del modelo.
+        
+        Args:
+            imagen: Imagen a procesar (ruta, PIL Image o numpy array)
+            layout: Disposición del tensor esperada por el modelo ("NCHW" o "NHWC")
+            buffer: Tensor float32 preasignado de forma (1, ...) a reutilizar
+            
+        Returns:
+            np.ndarray: Tensor (1, C, H, W) o (1, H, W, C) listo para ONNX, o None si falla
+        """
+        try:
+            imagen = self._cargar_rgb(imagen)
+            if imagen is None:
+                return None
+            
+            tensor = buffer if buffer is not None else crear_tensor_entrada(self.target_size, layout)
+            vista_hwc = tensor[0].transpose(1, 2, 0) if layout == "NCHW" else tensor[0]
         
-        if img_procesada is not None:
-            img_batch = np.expand_dims(img_procesada, axis=0)
+            nuevo_w, nuevo_h, x_offset, y_offset = self._calcular_letterbox(imagen.shape[:2])
+            imagen_redim = cv2.resize(imagen, (nuevo_w, nuevo_h))
             
-            img_onnx = np.transpose(img_batch, (0, 3, 1, 2))
+            tensor.fill(0)
+            destino = vista_hwc[y_offset:y_offset+nuevo_h, x_offset:x_offset+nuevo_w]
             
-            return img_onnx
+            if imagen_redim.dtype == np.uint8:
+                np.take(LUT_NORMALIZACION, imagen_redim, out=destino, mode='clip')
+            else:
+                np.divide(imagen_redim, 255.0, out=destino, casting='unsafe')
+            
+            return tensor
         
+        except Exception as e:
+            print(f"❌ Error procesando imagen: {e}")
+            return None
+    
+    def _cargar_rgb(self, ruta_imagen):
+        """Obtiene la imagen como array RGB (H, W, 3) sin copias innecesarias."""
+        if isinstance(ruta_imagen, (str, Path)):
+            try:
+                target_h, target_w = self.target_size
+                imagen = decodificar_imagen(ruta_imagen, tamano_minimo=(target_w, target_h))
+                return np.asarray(imagen)
+            except Exception:
+                imagen = cv2.imread(str(ruta_imagen))
+                if imagen is None:
+                    print(f"❌ Error: No se pudo cargar la imagen {ruta_imagen}")
+                    return None
+                return cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+        
+        elif isinstance(ruta_imagen, Image.Image):
+            ruta_imagen = corregir_orientacion(ruta_imagen)
+            if ruta_imagen.mode != 'RGB':
+                ruta_imagen = ruta_imagen.convert('RGB')
+            return np.asarray(ruta_imagen)
+        
+        elif isinstance(ruta_imagen, np.ndarray):
+            return ruta_imagen
+        
+        print(f"❌ Tipo de imagen no soportado: {type(ruta_imagen)}")
         return None
     
-    def _redimensionar_con_aspecto(self, imagen):
-        """Redimensiona la imagen manteniendo relación de aspecto y agregando padding necesario."""
-        h, w = imagen.shape[:2]
+    def _calcular_letterbox(self, dimensiones):
+        """Calcula el tamaño redimensionado y los desplazamientos del padding centrado."""
+        h, w = dimensiones
         target_h, target_w = self.target_size
         
         escala = min(target_w / w, target_h / h)
@@ -70,13 +189,20 @@ class ImageProcessor:
         nuevo_w = int(w * escala)
         nuevo_h = int(h * escala)
         
+        x_offset = (target_w - nuevo_w) // 2
+        y_offset = (target_h - nuevo_h) // 2
+        
+        return nuevo_w, nuevo_h, x_offset, y_offset
+    
+    def _redimensionar_con_aspecto(self, imagen):
+        """Redimensiona la imagen manteniendo relación de aspecto y agregando padding necesario."""
+        target_h, target_w = self.target_size
+        nuevo_w, nuevo_h, x_offset, y_offset = self._calcular_letterbox(imagen.shape[:2])
+        
         imagen_redim = cv2.resize(imagen, (nuevo_w, nuevo_h))
         
         imagen_final = np.zeros((target_h, target_w, 3), dtype=imagen.dtype)
         
-        y_offset = (target_h - nuevo_h) // 2
-        x_offset = (target_w - nuevo_w) // 2
-        
         imagen_final[y_offset:y_offset+nuevo_h, x_offset:x_offset+nuevo_w] = imagen_redim
         
         return imagen_final
@@ -87,78 +213,174 @@ class DatasetManager:
     def __init__(self):
         self.plantas_dir = PLANTAS_DIR
         self.processor = ImageProcessor()
+        self.manifest = ManifestDataset(self.plantas_dir)
+        self.cache_tensores = None
     
-    def cargar_dataset_completo(self, incluir_augmentation=False):
-        """Carga todo el dataset de imágenes desde las carpetas organizadas por especies."""
+    def cargar_dataset_completo(self, incluir_augmentation=False, num_procesos=None, usar_cache=False,
+                                semilla=None):
+        """Carga todo el dataset de imágenes decodificándolas en paralelo o leyéndolas de la cache de tensores.
+        
+        Args:
+            semilla: Semilla de la augmentation para obtener el mismo dataset en cada carga
+        """
         print("🔍 Cargando dataset completo...")
         
-        if not self.plantas_dir.exists():
-            raise Exception(f"Directorio de plantas no encontrado: {self.plantas_dir}")
+        muestras, nombres_especies = self.listar_muestras()
+        
+        conteos = self.manifest.contar_por_especie()
+        for nombre_especie in nombres_especies:
+            print(f"📁 {nombre_especie}: {conteos.get(nombre_especie, 0)} imágenes")
         
-        imagenes = []
-        etiquetas = []
-        nombres_especies = []
+        copias = 2 if incluir_augmentation else 1
+        imagenes = np.empty((len(muestras) * copias,) + self.processor.input_shape, dtype=np.float32)
+        etiquetas = np.empty(len(muestras) * copias, dtype=np.int64)
+        cargadas = 0
+        rng = np.random.default_rng(semilla)
         
-        carpetas_especies = sorted([d for d in self.plantas_dir.iterdir() if d.is_dir()])
+        if usar_cache:
+            bloques = self._leer_bloques_cache(muestras, num_procesos)
+        else:
+            bloques = self._decodificar_bloques(muestras, num_procesos)
         
-        for idx, carpeta_especie in enumerate(carpetas_especies):
-            nombre_especie = carpeta_especie.name
-            nombres_especies.append(nombre_especie)
+        for imagenes_bloque, etiquetas_bloque in bloques:
+            n = len(imagenes_bloque)
+            destino = slice(cargadas, cargadas + n * copias)
             
-            imagenes_especie = self._obtener_imagenes_carpeta(carpeta_especie)
+            imagenes[destino][::copias] = imagenes_bloque
+            etiquetas[destino] = np.repeat(etiquetas_bloque, copias)
             
-            print(f"📁 {nombre_especie}: {len(imagenes_especie)} imágenes")
+            if incluir_augmentation:
+                imagenes[destino][1::2] = aumentar_lote(imagenes_bloque.copy(), rng)
             
-            for ruta_imagen in imagenes_especie:
-                img_procesada = self.processor.cargar_y_procesar_imagen(ruta_imagen)
-                
-                if img_procesada is not None:
-                    imagenes.append(img_procesada)
-                    etiquetas.append(idx)
-                    
-                    if incluir_augmentation:
-                        img_aug = self._aplicar_augmentation(img_procesada)
-                        imagenes.append(img_aug)
-                        etiquetas.append(idx)
+            cargadas += n * copias
         
-        print(f"✅ Dataset cargado: {len(imagenes)} imágenes de {len(nombres_especies)} especies")
+        print(f"✅ Dataset cargado: {cargadas} imágenes de {len(nombres_especies)} especies")
         
         self._guardar_lista_especies(nombres_especies)
         
-        return np.array(imagenes), np.array(etiquetas), nombres_especies
+        return imagenes[:cargadas], etiquetas[:cargadas], nombres_especies
     
-    def _obtener_imagenes_carpeta(self, carpeta):
-        """Extrae todas las imágenes válidas de una carpeta específica."""
-        extensiones = ['.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG']
+    def _decodificar_bloques(self, muestras, num_procesos=None):
+        """Decodifica las muestras por bloques con el pool de procesos, entregando (imagenes, etiquetas)."""
+        num_procesos = num_procesos or MODEL_CONFIG["decode_workers"] or os.cpu_count() or 1
+        tamano_bloque = MODEL_CONFIG["batch_size"] * num_procesos
+        
+        with DecodificadorParalelo(num_procesos, tamano_bloque) as decodificador:
+            for inicio in range(0, len(muestras), tamano_bloque):
+                bloque = muestras[inicio:inicio + tamano_bloque]
+                imagenes_bloque, validas, _ = decodificador.decodificar_lote([ruta for ruta, _ in bloque])
+                etiquetas_bloque = np.array([etiqueta for _, etiqueta in bloque], dtype=np.int64)[validas]
+                yield imagenes_bloque, etiquetas_bloque
+    
+    def _leer_bloques_cache(self, muestras, num_procesos=None):
+        """Lee las muestras por bloques desde la cache de tensores, entregando (imagenes, etiquetas)."""
+        muestras, filas = self.preparar_cache_tensores(muestras, num_procesos)
+        tamano_bloque = MODEL_CONFIG["batch_size"]
+        
+        for inicio in range(0, len(muestras), tamano_bloque):
+            bloque = slice(inicio, inicio + tamano_bloque)
+            etiquetas_bloque = np.array([etiqueta for _, etiqueta in muestras[bloque]], dtype=np.int64)
+            yield self.cache_tensores.leer_lote(filas[bloque]), etiquetas_bloque
+    
+    def preparar_cache_tensores(self, muestras=None, num_procesos=None):
+        """Actualiza la cache de tensores con las imágenes nuevas o modificadas del dataset.
         
-        imagenes = [archivo for archivo in carpeta.iterdir() 
-                   if archivo.suffix in extensiones]
+        Args:
+            muestras: Tuplas (ruta, etiqueta); por defecto todo el dataset
+            num_procesos: Procesos para decodificar las imágenes faltantes
         
-        return sorted(imagenes)
-    
-    def _aplicar_augmentation(self, imagen):
-        """Aplica transformaciones aleatorias de aumento de datos a una imagen."""
-        img_aug = imagen.copy()
+        Returns:
+            tuple: (muestras, filas) con las muestras disponibles en la cache y su fila en ella
+        """
+        if muestras is None:
+            muestras, _ = self.listar_muestras()
+        
+        if self.cache_tensores is None:
+            self.cache_tensores = CacheTensores()
         
-        if np.random.random() > 0.5:
-            angulo = np.random.uniform(-15, 15)
-            h, w = img_aug.shape[:2]
-            centro = (w//2, h//2)
-            matriz_rot = cv2.getRotationMatrix2D(centro, angulo, 1.0)
-            img_aug = cv2.warpAffine(img_aug, matriz_rot, (w, h))
+        hashes_manifest = self.manifest.obtener_hashes()
+        hashes = [hashes_manifest.get(Path(ruta)) or calcular_hash_archivo(ruta) for ruta, _ in muestras]
+        
+        decodificador = DecodificadorParalelo(num_procesos)
+        try:
+            filas = self.cache_tensores.preparar(
+                [ruta for ruta, _ in muestras], hashes, self.processor, decodificador
+            )
+        finally:
+            decodificador.cerrar()
+        
+        validas = filas >= 0
+        muestras = [muestra for muestra, valida in zip(muestras, validas) if valida]
+        
+        return muestras, filas[validas]
+    
+    def listar_muestras(self):
+        """Lista las tuplas (ruta, etiqueta) del dataset y los nombres de especies usando el manifest."""
+        if not self.plantas_dir.exists():
+            raise Exception(f"Directorio de plantas no encontrado: {self.plantas_dir}")
         
-        if np.random.random() > 0.5:
-            img_aug = cv2.flip(img_aug, 1)
+        self.manifest.actualizar()
+        nombres_especies = self.manifest.listar_especies()
         
-        if np.random.random() > 0.5:
-            factor = np.random.uniform(0.8, 1.2)
-            img_aug = np.clip(img_aug * factor, 0, 1)
+        muestras = [
+            (ruta, idx)
+            for idx, especie in enumerate(nombres_especies)
+            for ruta in self.manifest.listar_imagenes(especie)
+        ]
         
-        if np.random.random() > 0.7:
-            ruido = np.random.normal(0, 0.02, img_aug.shape)
-            img_aug = np.clip(img_aug + ruido, 0, 1)
+        return muestras, nombres_especies
+            
+    def crear_cargador(self, muestras=None, tamano_lote=None, barajar=True, semilla=None,
+                       incluir_augmentation=False, profundidad_prefetch=None, num_procesos=None,
+                       usar_cache=False):
+        """Crea un cargador que entrega el dataset en lotes barajados con memoria acotada.
+            
+        A diferencia de cargar_dataset_completo, nunca mantiene todo el dataset en RAM:
+        solo el lote en uso más los lotes de prefetch. Con augmentation, cada imagen se
+        transforma al vuelo en cada época en lugar de duplicarse.
+            
+        Args:
+            muestras: Tuplas (ruta, etiqueta); por defecto todo el dataset
+            tamano_lote: Imágenes por lote
+            barajar: Si True, cambia el orden en cada época
+            semilla: Semilla para un orden y augmentation reproducibles
+            incluir_augmentation: Si True, aplica augmentation aleatoria a cada imagen
+            profundidad_prefetch: Lotes preparados por adelantado
+            num_procesos: Si se indica, decodifica cada lote con ese número de procesos
+            usar_cache: Si True, lee las imágenes de la cache de tensores en lugar de decodificarlas
+                
+        Returns:
+            CargadorDataset: Iterable de tuplas (imagenes, etiquetas) por época
+        """
+        if muestras is None:
+            muestras, _ = self.listar_muestras()
+                    
+        decodificador = None
+        filas_cache = None
+        if usar_cache:
+            muestras, filas_cache = self.preparar_cache_tensores(muestras, num_procesos)
+        elif num_procesos:
+            decodificador = DecodificadorParalelo(num_procesos, tamano_lote)
+        
+        return CargadorDataset(
+            muestras,
+            self.processor,
+            tamano_lote=tamano_lote,
+            barajar=barajar,
+            semilla=semilla,
+            funcion_augmentation=aumentar_lote if incluir_augmentation else None,
+            profundidad_prefetch=profundidad_prefetch,
+            decodificador=decodificador,
+            cache=self.cache_tensores if usar_cache else None,
+            filas_cache=filas_cache
+        )
+    
+    def _obtener_imagenes_carpeta(self, carpeta):
+        """Extrae todas las imágenes válidas de una carpeta específica."""
+        imagenes = [archivo for archivo in carpeta.iterdir() 
+                   if archivo.suffix in EXTENSIONES_IMAGEN]
         
-        return img_aug
+        return sorted(imagenes)
     
     def _guardar_lista_especies(self, nombres_especies):
         """Almacena la lista de nombres de especies en un archivo JSON."""
@@ -183,42 +405,25 @@ class DatasetManager:
             return None
     
     def contar_imagenes_por_especie(self):
-        """Genera un conteo de imágenes organizadas por nombre de especie."""
-        conteo = {}
-        
+        """Genera un conteo de imágenes por especie según la última sincronización del manifest."""
         if not self.plantas_dir.exists():
-            return conteo
-        
-        for carpeta in self.plantas_dir.iterdir():
-            if carpeta.is_dir():
-                imagenes = self._obtener_imagenes_carpeta(carpeta)
-                conteo[carpeta.name] = len(imagenes)
+            return {}
         
-        return conteo
+        return self.manifest.contar_por_especie()
     
     def contar_imagenes_nuevas(self):
-        """Cuenta las imágenes validadas por usuarios identificándolas por prefijo 'user_'."""
-        total_nuevas = 0
-        especies_con_nuevas = set()
-        detalle = {}
-        
-        for carpeta in self.plantas_dir.iterdir():
-            if carpeta.is_dir():
-                imagenes_nuevas = [img for img in self._obtener_imagenes_carpeta(carpeta)
-                                 if 'user_' in img.name]
-                
-                if len(imagenes_nuevas) > 0:
-                    total_nuevas += len(imagenes_nuevas)
-                    especies_con_nuevas.add(carpeta.name)
-                    detalle[carpeta.name] = len(imagenes_nuevas)
+        """Cuenta las imágenes validadas por usuarios (prefijo 'user_') registradas en el manifest."""
+        return self.manifest.contar_imagenes_nuevas()
         
-        return total_nuevas, len(especies_con_nuevas), detalle
-    
-    def guardar_imagen_validada(self, imagen, nombre_especie, session_id, correcto=True):
-        """Almacena una imagen validada por el usuario en la estructura del dataset."""
+    def guardar_imagen_validada(self, imagen, nombre_especie, session_id, correcto=True, esperar=False):
+        """Almacena una imagen validada por el usuario en la estructura del dataset.
+        
+        La codificación JPEG y la escritura se hacen en la cola de escritura diferida,
+        salvo que esperar sea True. Si la especie ya tiene la misma foto (o una casi
+        idéntica), se registra un voto para ella en lugar de guardar otra copia.
+        """
         try:
             carpeta_especie = self.plantas_dir / nombre_especie
-            carpeta_especie.mkdir(exist_ok=True)
             
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             status = "correct" if correcto else "corrected"
@@ -226,17 +431,11 @@ class DatasetManager:
             
             ruta_archivo = carpeta_especie / nombre_archivo
             
-            if isinstance(imagen, Image.Image):
-                imagen_pil = imagen
-            elif isinstance(imagen, np.ndarray):
-                if imagen.dtype == np.float32 or imagen.dtype == np.float64:
-                    imagen = (imagen * 255).astype(np.uint8)
-                imagen_pil = Image.fromarray(imagen)
-            else:
+            if isinstance(imagen, np.ndarray):
+                imagen = imagen.copy()
+            elif not isinstance(imagen, Image.Image):
                 raise ValueError(f"Tipo de imagen no soportado: {type(imagen)}")
             
-            imagen_pil.save(ruta_archivo, "JPEG", quality=MODEL_CONFIG.get("image_quality", 85))
-            
             resultado = {
                 "status": "guardada",
                 "archivo": nombre_archivo,
@@ -245,13 +444,104 @@ class DatasetManager:
                 "timestamp": timestamp
             }
             
-            print(f"✅ Imagen guardada: {ruta_archivo}")
+            if esperar:
+                resultado.update(escritor_imagenes.encolar_y_esperar(
+                    self._guardar_o_votar, imagen, ruta_archivo,
+                    descripcion=f"imagen {nombre_archivo}"
+                ))
+            else:
+                escritor_imagenes.encolar(
+                    self._guardar_o_votar, imagen, ruta_archivo,
+                    descripcion=f"imagen {nombre_archivo}"
+                )
+                resultado["status"] = "encolada"
+                print(f"📥 Imagen encolada para guardar: {ruta_archivo}")
+            
             return resultado
             
         except Exception as e:
             print(f"❌ Error guardando imagen: {e}")
             return {"status": "error", "mensaje": str(e)}
     
+    def _guardar_o_votar(self, imagen, ruta_archivo):
+        """Escribe la imagen validada o, si es un duplicado, suma un voto a la imagen existente."""
+        datos = codificar_jpeg(imagen)
+        hash_contenido = hashlib.blake2b(datos, digest_size=16).hexdigest()
+        hash_perceptual = calcular_hash_perceptual(imagen)
+        
+        duplicado = self.manifest.buscar_duplicado(ruta_archivo.parent.name, hash_contenido, hash_perceptual)
+        if duplicado is not None:
+            votos = self.manifest.registrar_voto(duplicado)
+            print(f"🔁 Imagen duplicada de {duplicado.name}: voto registrado ({votos} votos)")
+            return {"status": "duplicada", "duplicado_de": str(duplicado), "votos": votos}
+        
+        escribir_archivo_atomico(datos, ruta_archivo)
+        self.manifest.registrar_imagen(ruta_archivo, hash_contenido, hash_perceptual)
+        print(f"✅ Imagen guardada: {ruta_archivo}")
+        return {"status": "guardada"}
+    
+    def deduplicar_imagenes_usuario(self, aplicar=False):
+        """Busca copias exactas o casi idénticas entre las imágenes de usuarios de cada especie.
+        
+        Se conserva la imagen más antigua de cada grupo y las copias se convierten en votos.
+        
+        Args:
+            aplicar: Si False solo reporta; si True elimina las copias y transfiere sus votos
+        
+        Returns:
+            dict: Imágenes revisadas, duplicadas, bytes liberados y detalle por duplicado
+        """
+        self.manifest.actualizar()
+        distancia_maxima = RETRAINING_CONFIG["duplicate_max_hamming_distance"]
+        reporte = {"revisadas": 0, "duplicadas": 0, "bytes_liberados": 0, "detalle": []}
+        
+        for especie in self.manifest.listar_especies():
+            votos = self.manifest.obtener_votos(especie)
+            conservadas_hash = {}
+            conservadas_rutas = []
+            conservadas_perceptual = []
+            
+            for ruta, hash_contenido, hash_perceptual in self.manifest.listar_imagenes_usuario(especie):
+                reporte["revisadas"] += 1
+                
+                if hash_perceptual is None:
+                    try:
+                        hash_perceptual = calcular_hash_perceptual(decodificar_imagen(ruta))
+                        self.manifest.guardar_hash_perceptual(ruta, hash_perceptual)
+                    except Exception as e:
+                        print(f"⚠️ No se pudo leer {ruta}: {e}")
+                        continue
+                
+                original = conservadas_hash.get(hash_contenido)
+                if original is None and conservadas_perceptual:
+                    distancias = distancia_hamming(hash_perceptual, conservadas_perceptual)
+                    mejor = int(np.argmin(distancias))
+                    if distancias[mejor] <= distancia_maxima:
+                        original = conservadas_rutas[mejor]
+                
+                if original is None:
+                    conservadas_hash[hash_contenido] = ruta
+                    conservadas_rutas.append(ruta)
+                    conservadas_perceptual.append(hash_perceptual)
+                    continue
+                
+                reporte["duplicadas"] += 1
+                reporte["bytes_liberados"] += ruta.stat().st_size
+                reporte["detalle"].append({"duplicado": str(ruta), "original": str(original)})
+                
+                if aplicar:
+                    self.manifest.registrar_voto(original, votos.get(ruta, 1))
+                    ruta.unlink()
+        
+        if aplicar and reporte["duplicadas"]:
+            self.manifest.actualizar()
+        
+        accion = "eliminados" if aplicar else "encontrados"
+        print(f"🔁 Duplicados {accion}: {reporte['duplicadas']} de {reporte['revisadas']} imágenes de usuarios "
+              f"({reporte['bytes_liberados'] / 1024 / 1024:.1f} MB)")
+        
+        return reporte
+    
     def validar_estructura_dataset(self):
         """Verifica la integridad y estructura correcta del dataset de plantas."""
         validacion = {
@@ -266,25 +556,17 @@ class DatasetManager:
             validacion["errores"].append(f"Directorio no existe: {self.plantas_dir}")
             return validacion
         
-        carpetas = [d for d in self.plantas_dir.iterdir() if d.is_dir()]
+        self.manifest.actualizar()
+        conteo = self.manifest.contar_por_especie()
         
-        if len(carpetas) == 0:
+        if len(conteo) == 0:
             validacion["es_valido"] = False
             validacion["errores"].append("No se encontraron carpetas de especies")
             return validacion
         
-        total_imagenes = 0
-        especies_sin_imagenes = []
-        especies_pocas_imagenes = []
-        
-        for carpeta in carpetas:
-            imagenes = self._obtener_imagenes_carpeta(carpeta)
-            total_imagenes += len(imagenes)
-            
-            if len(imagenes) == 0:
-                especies_sin_imagenes.append(carpeta.name)
-            elif len(imagenes) == 1:
-                especies_pocas_imagenes.append(carpeta.name)
+        total_imagenes = sum(conteo.values())
+        especies_sin_imagenes = [especie for especie, n in conteo.items() if n == 0]
+        especies_pocas_imagenes = [especie for especie, n in conteo.items() if n == 1]
         
         if especies_sin_imagenes:
             validacion["advertencias"].extend([f"Sin imágenes: {esp}" for esp in especies_sin_imagenes])
@@ -293,24 +575,48 @@ class DatasetManager:
             validacion["advertencias"].extend([f"Solo 1 imagen: {esp}" for esp in especies_pocas_imagenes])
         
         validacion["estadisticas"] = {
-            "total_especies": len(carpetas),
+            "total_especies": len(conteo),
             "total_imagenes": total_imagenes,
-            "promedio_por_especie": total_imagenes / len(carpetas) if carpetas else 0,
+            "promedio_por_especie": total_imagenes / len(conteo),
             "especies_sin_imagenes": len(especies_sin_imagenes),
             "especies_con_pocas_imagenes": len(especies_pocas_imagenes)
         }
         
         return validacion
 
-def procesar_imagen_simple(imagen):
-    """Función utilitaria para procesar una imagen de forma rápida y sencilla."""
+def procesar_imagen_simple(imagen, layout="NCHW"):
+    """Función utilitaria para procesar una imagen de forma rápida y sencilla.
+    
+    El tensor retornado es el buffer reutilizable del hilo actual: se sobrescribe
+    en la siguiente llamada, por lo que debe consumirse antes de procesar otra imagen.
+    """
     processor = ImageProcessor()
-    return processor.procesar_para_prediccion(imagen)
+    buffer = obtener_buffer_entrada(processor.target_size, layout)
+    return processor.procesar_para_prediccion(imagen, layout, buffer)
+
+def calcular_hash_imagen(imagen):
+    """Calcula un hash del contenido de una imagen (PIL Image, numpy array o ruta)."""
+    hasher = hashlib.blake2b(digest_size=16)
+    
+    if isinstance(imagen, Image.Image):
+        hasher.update(f"{imagen.mode}{imagen.size}".encode())
+        hasher.update(imagen.tobytes())
+    elif isinstance(imagen, np.ndarray):
+        hasher.update(f"{imagen.dtype}{imagen.shape}".encode())
+        hasher.update(np.ascontiguousarray(imagen).tobytes())
+    elif isinstance(imagen, (str, Path)):
+        with open(imagen, 'rb') as f:
+            hasher.update(f.read())
+    else:
+        raise ValueError(f"Tipo de imagen no soportado: {type(imagen)}")
+    
+    return hasher.hexdigest()
 
 def obtener_estadisticas_dataset():
     """Función utilitaria para obtener estadísticas completas del dataset."""
     dataset_manager = DatasetManager()
     
+    # Sincroniza el manifest una sola vez; los conteos siguientes son lecturas del manifest
     validacion = dataset_manager.validar_estructura_dataset()
     
     nuevas_total, especies_nuevas, detalle_nuevas = dataset_manager.contar_imagenes_nuevas()
@@ -327,7 +633,23 @@ def obtener_estadisticas_dataset():
         "conteo_por_especie": conteo_especies
     }
 
-if __name__ == "__main__":
+def deduplicar_dataset(aplicar=False):
+    """Función de conveniencia para deduplicar las imágenes de usuarios del dataset."""
+    return DatasetManager().deduplicar_imagenes_usuario(aplicar)
+
+if __name__ == "__main__" and "--deduplicar" in sys.argv[1:]:
+    print("🔁 DEDUPLICACIÓN DE IMÁGENES DE USUARIOS")
+    print("=" * 50)
+    
+    aplicar = "--aplicar" in sys.argv[1:]
+    reporte = deduplicar_dataset(aplicar)
+    
+    for duplicado in reporte["detalle"][:10]:
+        print(f"   - {Path(duplicado['duplicado']).name} → {Path(duplicado['original']).name}")
+    if not aplicar and reporte["duplicadas"]:
+        print("\n   Ejecuta con --aplicar para eliminar las copias y registrarlas como votos")
+
+elif __name__ == "__main__":
     print("🔍 ANÁLISIS DEL DATASET")
     print("=" * 50)
     
@@ -0,0 +1,214 @@
+import atexit
+import io
+import os
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+from PIL import Image
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG, WRITE_QUEUE_CONFIG
+
+_DETENER = object()
+
+class EscritorDiferido:
+    """Cola acotada que ejecuta en segundo plano las escrituras de imágenes y envíos de feedback"""
+    
+    def __init__(self, capacidad=None, timeout_encolado=None):
+        self.capacidad = capacidad or WRITE_QUEUE_CONFIG["queue_size"]
+        self.timeout_encolado = timeout_encolado or WRITE_QUEUE_CONFIG["enqueue_timeout_seconds"]
+        self._cola = queue.Queue(maxsize=self.capacidad)
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._estadisticas = {
+            "completadas": 0,
+            "fallidas": 0,
+            "sincronas": 0,
+            "ultimo_error": None
+        }
+        atexit.register(self.detener)
+    
+    def iniciar(self):
+        """Arranca el hilo escritor; la cola se vacía al terminar el proceso."""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            
+            self._hilo = threading.Thread(
+                target=self._procesar_cola,
+                name="escritor-diferido",
+                daemon=True
+            )
+            self._hilo.start()
+    
+    def encolar(self, funcion, *args, descripcion=None, **kwargs):
+        """Encola una tarea de escritura y retorna de inmediato.
+        
+        Si la cola sigue llena tras el timeout, la tarea se ejecuta en el hilo
+        que llama para no perder la imagen.
+        
+        Returns:
+            bool: True si quedó encolada, False si se ejecutó de forma síncrona
+        """
+        self.iniciar()
+        tarea = (descripcion or funcion.__name__, funcion, args, kwargs)
+        
+        try:
+            self._cola.put(tarea, timeout=self.timeout_encolado)
+            return True
+        except queue.Full:
+            print(f"⚠️ Cola de escritura llena ({self.capacidad}), escribiendo de forma síncrona")
+            with self._lock:
+                self._estadisticas["sincronas"] += 1
+            self._ejecutar(tarea)
+            return False
+    
+    def encolar_y_esperar(self, funcion, *args, descripcion=None, timeout=None, **kwargs):
+        """Encola una tarea detrás de las pendientes y espera su resultado.
+        
+        Al correr en el mismo hilo escritor, la tarea ve el efecto de todas las
+        encoladas antes que ella y no compite con ellas.
+        
+        Returns:
+            El valor retornado por la función (sus excepciones se propagan)
+        """
+        futuro = Future()
+        
+        def _tarea():
+            try:
+                resultado = funcion(*args, **kwargs)
+            except Exception as e:
+                futuro.set_exception(e)
+                raise
+            futuro.set_result(resultado)
+            return resultado
+        
+        self.encolar(_tarea, descripcion=descripcion or funcion.__name__)
+        return futuro.result(timeout)
+    
+    def vaciar(self, timeout=None):
+        """Espera a que se completen todas las tareas encoladas."""
+        if timeout is None:
+            self._cola.join()
+            return True
+        
+        with self._cola.all_tasks_done:
+            return self._cola.all_tasks_done.wait_for(
+                lambda: self._cola.unfinished_tasks == 0, timeout
+            )
+    
+    def detener(self, timeout=None):
+        """Completa las tareas pendientes y detiene el hilo escritor.
+        
+        La espera está acotada para que una escritura bloqueada no impida que el proceso termine.
+        
+        Returns:
+            bool: True si el hilo terminó, False si se agotó el tiempo con tareas pendientes
+        """
+        if timeout is None:
+            timeout = WRITE_QUEUE_CONFIG["shutdown_timeout_seconds"]
+        
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                return True
+            hilo = self._hilo
+        
+        try:
+            self._cola.put(_DETENER, timeout=timeout)
+            hilo.join(timeout)
+        except queue.Full:
+            pass
+        
+        if hilo.is_alive():
+            # El marcador de detención cuenta como tarea pendiente si llegó a encolarse
+            with self._cola.mutex:
+                pendientes = self._cola.unfinished_tasks - (1 if _DETENER in self._cola.queue else 0)
+            print(f"⚠️ Escritor diferido detenido tras {timeout}s con {pendientes} tareas sin completar")
+            return False
+        
+        with self._lock:
+            self._hilo = None
+        return True
+    
+    def obtener_estadisticas(self):
+        """Retorna la profundidad de la cola y los contadores de tareas completadas y fallidas."""
+        with self._lock:
+            return {
+                "pendientes": self._cola.qsize(),
+                "capacidad": self.capacidad,
+                **self._estadisticas
+            }
+    
+    def _procesar_cola(self):
+        """Bucle del hilo escritor."""
+        while True:
+            tarea = self._cola.get()
+            try:
+                if tarea is _DETENER:
+                    return
+                self._ejecutar(tarea)
+            finally:
+                self._cola.task_done()
+    
+    def _ejecutar(self, tarea):
+        """Ejecuta una tarea registrando su resultado sin propagar errores."""
+        descripcion, funcion, args, kwargs = tarea
+        
+        try:
+            resultado = funcion(*args, **kwargs)
+            if isinstance(resultado, dict) and "error" in resultado:
+                raise Exception(resultado["error"])
+            with self._lock:
+                self._estadisticas["completadas"] += 1
+        
+        except Exception as e:
+            with self._lock:
+                self._estadisticas["fallidas"] += 1
+                self._estadisticas["ultimo_error"] = f"{descripcion}: {e}"
+            print(f"❌ Error en escritura diferida ({descripcion}): {e}")
+
+def convertir_a_pil(imagen):
+    """Convierte un array (uint8 o float en [0, 1]) o una imagen PIL a imagen PIL."""
+    if isinstance(imagen, Image.Image):
+        return imagen
+    
+    if isinstance(imagen, np.ndarray):
+        if imagen.dtype == np.float32 or imagen.dtype == np.float64:
+            imagen = (imagen * 255).astype(np.uint8)
+        return Image.fromarray(imagen)
+    
+    raise ValueError(f"Tipo de imagen no soportado: {type(imagen)}")
+
+def codificar_jpeg(imagen, calidad=None):
+    """Codifica la imagen como JPEG en memoria con la calidad configurada."""
+    buffer = io.BytesIO()
+    convertir_a_pil(imagen).save(buffer, "JPEG", quality=calidad or MODEL_CONFIG.get("image_quality", 85))
+    return buffer.getvalue()
+
+def escribir_archivo_atomico(datos, ruta_archivo):
+    """Escribe los bytes en un archivo temporal y lo renombra al destino final."""
+    ruta_archivo = Path(ruta_archivo)
+    ruta_archivo.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta_archivo.with_name(f".{ruta_archivo.name}.tmp")
+    
+    try:
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta_archivo)
+    
+    except Exception:
+        temporal.unlink(missing_ok=True)
+        raise
+    
+    return ruta_archivo
+
+escritor_imagenes = EscritorDiferido()
+
+def obtener_estadisticas_escritor():
+    """Función de conveniencia para consultar el estado de la cola de escritura."""
+    return escritor_imagenes.obtener_estadisticas()
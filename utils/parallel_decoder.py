@@ -0,0 +1,137 @@
+import numpy as np
+import multiprocessing
+import os
+import threading
+from multiprocessing import shared_memory
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG
+
+_estado_worker = {}
+
+def _inicializar_worker(nombre_memoria, forma_lote):
+    """Conecta el proceso worker a la memoria compartida y prepara su procesador de imágenes."""
+    from utils.image_processing import ImageProcessor
+    
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    _estado_worker["memoria"] = memoria
+    _estado_worker["lote"] = np.ndarray(forma_lote, dtype=np.float32, buffer=memoria.buf)
+    _estado_worker["processor"] = ImageProcessor()
+
+def _decodificar_fragmento(inicio, rutas):
+    """Decodifica un fragmento del lote escribiendo cada imagen en su fila de la memoria compartida.
+    
+    Returns:
+        list: Tuplas (fila, mensaje) de las imágenes que no pudieron procesarse
+    """
+    lote = _estado_worker["lote"]
+    processor = _estado_worker["processor"]
+    errores = []
+    
+    for desplazamiento, ruta in enumerate(rutas):
+        fila = inicio + desplazamiento
+        try:
+            imagen = processor.cargar_y_procesar_imagen(ruta)
+            if imagen is None:
+                errores.append((fila, f"No se pudo cargar {ruta}"))
+                continue
+            
+            lote[fila] = imagen
+        
+        except Exception as e:
+            errores.append((fila, f"{ruta}: {e}"))
+    
+    return errores
+
+class DecodificadorParalelo:
+    """Pool de procesos que decodifica lotes de imágenes sobre un buffer de memoria compartida"""
+    
+    def __init__(self, num_procesos=None, tamano_lote=None):
+        self.num_procesos = num_procesos or MODEL_CONFIG["decode_workers"] or os.cpu_count() or 1
+        self.tamano_lote = tamano_lote or MODEL_CONFIG["batch_size"]
+        
+        target_h, target_w = MODEL_CONFIG["target_size"]
+        self.forma_lote = (self.tamano_lote, target_h, target_w, 3)
+        
+        self._memoria = None
+        self._lote = None
+        self._pool = None
+        self._lock = threading.Lock()
+    
+    def __enter__(self):
+        self.iniciar()
+        return self
+    
+    def __exit__(self, *args):
+        self.cerrar()
+    
+    def iniciar(self):
+        """Reserva la memoria compartida y arranca los procesos worker."""
+        if self._pool is not None:
+            return
+        
+        bytes_lote = int(np.prod(self.forma_lote)) * np.dtype(np.float32).itemsize
+        self._memoria = shared_memory.SharedMemory(create=True, size=bytes_lote)
+        self._lote = np.ndarray(self.forma_lote, dtype=np.float32, buffer=self._memoria.buf)
+        
+        contexto = multiprocessing.get_context("spawn")
+        self._pool = contexto.Pool(
+            self.num_procesos,
+            initializer=_inicializar_worker,
+            initargs=(self._memoria.name, self.forma_lote)
+        )
+        print(f"🧵 Decodificación paralela: {self.num_procesos} procesos")
+    
+    def cerrar(self):
+        """Detiene los workers y libera la memoria compartida."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        
+        if self._memoria is not None:
+            self._lote = None
+            self._memoria.close()
+            self._memoria.unlink()
+            self._memoria = None
+    
+    def decodificar_lote(self, rutas):
+        """Decodifica un lote en paralelo conservando el orden de las rutas.
+        
+        Args:
+            rutas: Rutas de imágenes, como máximo tamano_lote
+        
+        Returns:
+            tuple: (imagenes, validas, errores) con las imágenes válidas en orden, la máscara
+                   de rutas cargadas y la lista de (indice, mensaje) de las fallidas
+        """
+        n = len(rutas)
+        if n > self.tamano_lote:
+            raise ValueError(f"El lote tiene {n} imágenes y el máximo es {self.tamano_lote}")
+        
+        self.iniciar()
+        
+        with self._lock:
+            tamano_fragmento = max(1, -(-n // self.num_procesos))
+            tareas = [
+                self._pool.apply_async(_decodificar_fragmento, (
+                    inicio,
+                    [str(ruta) for ruta in rutas[inicio:inicio + tamano_fragmento]]
+                ))
+                for inicio in range(0, n, tamano_fragmento)
+            ]
+            
+            errores = sorted(error for tarea in tareas for error in tarea.get())
+            
+            validas = np.ones(n, dtype=bool)
+            for fila, _ in errores:
+                validas[fila] = False
+            
+            imagenes = self._lote[:n][validas]
+        
+        for fila, mensaje in errores:
+            print(f"⚠️ Imagen omitida: {mensaje}")
+        
+        return imagenes, validas, errores
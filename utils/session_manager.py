@@ -6,6 +6,9 @@ import sys
 import numpy as np
 sys.path.append(str(Path(__file__).parent.parent))
 from config import PATHS, RETRAINING_CONFIG
+from model.prediction import PlantPredictor
+from utils.system_status import MonitorSistema
+from utils.dataset_manifest import calcular_hash_perceptual
 
 class SesionPrediccion:
     """Clase para manejar una sesión individual de predicción"""
@@ -13,6 +16,8 @@ class SesionPrediccion:
     def __init__(self, imagen_original=None):
         self.session_id = str(uuid.uuid4())[:8]
         self.imagen_original = imagen_original
+        self.hash_imagen = None
+        self.hash_perceptual = None
         self.intento_actual = 1
         self.max_intentos = RETRAINING_CONFIG["max_attempts_per_prediction"]
         self.predicciones_anteriores = []
@@ -69,6 +74,8 @@ class SesionPrediccion:
         """Convierte la sesión a formato diccionario para almacenamiento."""
         return {
             "session_id": self.session_id,
+            "hash_imagen": self.hash_imagen,
+            "hash_perceptual": self.hash_perceptual,
             "intento_actual": self.intento_actual,
             "max_intentos": self.max_intentos,
             "predicciones_anteriores": self.predicciones_anteriores,
@@ -282,188 +289,6 @@ class SessionManager:
         
         return stats
 
-class PlantPredictor:
-    """Sistema principal de predicción de plantas"""
-    
-    def __init__(self):
-        self.model_utils = None
-        self.modelo_cargado = False
-        self.cargar_modelo()
-    
-    def cargar_modelo(self):
-        """Inicializa y carga el modelo de aprendizaje automático."""
-        try:
-            from model.model_utils import ModelUtils
-            self.model_utils = ModelUtils()
-            self.modelo_cargado = self.model_utils.cargar_modelo()
-            
-            if self.modelo_cargado:
-                print(f"✅ Predictor: Modelo cargado: {len(self.model_utils.species_names)} especies")
-            else:
-                print("❌ Predictor: No se pudo cargar el modelo")
-                
-        except Exception as e:
-            print(f"❌ Error cargando modelo en predictor: {e}")
-            self.modelo_cargado = False
-    
-    def verificar_modelo_disponible(self):
-        """Verifica si el modelo está listo para realizar predicciones."""
-        return self.modelo_cargado and self.model_utils is not None
-    
-    def predecir_planta(self, imagen, especies_excluir=None):
-        """Identifica la especie de planta en una imagen dada."""
-        if not self.verificar_modelo_disponible():
-            return {
-                "error": "Modelo no disponible",
-                "mensaje": "El modelo no está cargado o entrenado"
-            }
-        
-        try:
-            from utils.image_processing import procesar_imagen_simple
-            imagen_procesada = procesar_imagen_simple(imagen)
-            
-            if imagen_procesada is None:
-                return {
-                    "error": "Error procesando imagen",
-                    "mensaje": "No se pudo procesar la imagen"
-                }
-            
-            if especies_excluir:
-                print(f"🚫 Predictor: Excluyendo {len(especies_excluir)} especies: {list(especies_excluir)[:3]}...")
-            
-            resultado = self.model_utils.predecir_especie(imagen_procesada, especies_excluir)
-            
-            if "error" in resultado:
-                return resultado
-            
-            from utils.firebase_config import obtener_info_planta
-            info_especie = obtener_info_planta(resultado["especie_predicha"])
-            
-            respuesta = {
-                "exito": True,
-                "especie_predicha": resultado["especie_predicha"],
-                "confianza": resultado["confianza"],
-                "info_especie": info_especie,
-                "top_predicciones": resultado["top_predicciones"][:5],
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            print(f"✅ Predictor: {resultado['especie_predicha']} (confianza: {resultado['confianza']:.3f})")
-            return respuesta
-            
-        except Exception as e:
-            print(f"❌ Error en predicción: {e}")
-            return {
-                "error": "Error en predicción",
-                "mensaje": str(e)
-            }
-    
-    def obtener_top_especies(self, imagen, cantidad=6, especies_excluir=None):
-        """Obtiene las especies más probables ordenadas por confianza."""
-        if not self.verificar_modelo_disponible():
-            return []
-        
-        try:
-            from utils.image_processing import procesar_imagen_simple
-            imagen_procesada = procesar_imagen_simple(imagen)
-            
-            if imagen_procesada is None:
-                return []
-            
-            print(f"🔍 Predictor: Obteniendo top {cantidad} especies, excluyendo {len(especies_excluir) if especies_excluir else 0}")
-            
-            top_especies = self.model_utils.obtener_top_especies(
-                imagen_procesada, cantidad, especies_excluir
-            )
-            
-            especies_completas = []
-            
-            for especie_data in top_especies:
-                from utils.firebase_config import obtener_info_planta
-                info_especie = obtener_info_planta(especie_data["especie"])
-                
-                especie_completa = {
-                    "especie": especie_data["especie"],
-                    "confianza": especie_data["confianza"],
-                    "info": info_especie
-                }
-                
-                especies_completas.append(especie_completa)
-            
-            print(f"✅ Predictor: Retornando {len(especies_completas)} especies")
-            return especies_completas
-            
-        except Exception as e:
-            print(f"❌ Error obteniendo top especies: {e}")
-            return []
-    
-    def guardar_resultado_feedback(self, imagen, especie_final, session_id, 
-                                 correcto=True, metodo="prediccion"):
-        """Almacena el feedback del usuario sobre la predicción realizada."""
-        try:
-            from utils.firebase_config import guardar_analisis
-            datos_analisis = {
-                "especie_final": especie_final,
-                "session_id": session_id,
-                "correcto": correcto,
-                "metodo": metodo,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            guardar_analisis(datos_analisis)
-            
-            resultado_api = self._enviar_imagen_a_api(
-                imagen, especie_final, session_id, correcto, metodo
-            )
-            
-            return {
-                "exito": True,
-                "mensaje": "Feedback guardado correctamente",
-                "api_response": resultado_api
-            }
-            
-        except Exception as e:
-            print(f"❌ Error guardando feedback: {e}")
-            return {
-                "error": "Error guardando feedback",
-                "mensaje": str(e)
-            }
-    
-    def _enviar_imagen_a_api(self, imagen, especie, session_id, correcto, metodo):
-        """Envía la imagen procesada a la API externa para almacenamiento."""
-        try:
-            import base64
-            import io
-            from PIL import Image
-            
-            if not isinstance(imagen, Image.Image):
-                if isinstance(imagen, np.ndarray):
-                    imagen = Image.fromarray((imagen * 255).astype(np.uint8))
-                else:
-                    return {"error": "Formato de imagen no soportado"}
-            
-            img_buffer = io.BytesIO()
-            imagen.save(img_buffer, format='JPEG', quality=85)
-            img_str = base64.b64encode(img_buffer.getvalue()).decode()
-            
-            api_data = {
-                "image_data": img_str,
-                "especie": especie,
-                "session_id": session_id,
-                "correcto": correcto,
-                "metodo": metodo
-            }
-            
-            print(f"📤 Simulando envío a API: {especie} ({'correcto' if correcto else 'corregido'})")
-            
-            return {
-                "status": "simulado",
-                "mensaje": "Imagen enviada a API (simulado)"
-            }
-            
-        except Exception as e:
-            return {"error": f"Error enviando a API: {e}"}
-
 class EnhancedSessionManager:
     """Gestiona las sesiones de predicción en Streamlit con mejoras"""
     
@@ -474,16 +299,26 @@ class EnhancedSessionManager:
     def iniciar_nueva_sesion(self, imagen_original):
         """Crea e inicializa una nueva sesión de predicción."""
         sesion = self.session_manager.crear_sesion(imagen_original)
+        
+        if imagen_original is not None:
+            from utils.image_processing import calcular_hash_imagen
+            sesion.hash_imagen = calcular_hash_imagen(imagen_original)
+            sesion.hash_perceptual = calcular_hash_perceptual(imagen_original)
+        
         return sesion
     
     def procesar_intento_prediccion(self, sesion, imagen, especies_excluir=None):
-        """Procesa un intento de predicción dentro de una sesión activa."""
+        """Procesa un intento de predicción dentro de una sesión activa sobre la imagen de la sesión."""
         if especies_excluir:
             print(f"🚫 SessionManager: Excluyendo especies: {list(especies_excluir)}")
         else:
             print("ℹ️ SessionManager: Sin especies excluidas")
         
-        resultado = self.predictor.predecir_planta(imagen, especies_excluir)
+        resultado = self.predictor.predecir_planta(
+            imagen, especies_excluir,
+            hash_imagen=sesion.hash_imagen,
+            hash_perceptual=sesion.hash_perceptual
+        )
         
         if resultado.get("exito"):
             especie_predicha = resultado['especie_predicha']
@@ -491,7 +326,7 @@ class EnhancedSessionManager:
             
             if especies_excluir and especie_predicha in especies_excluir:
                 print(f"⚠️ WARNING: El modelo sigue prediciendo una especie excluida: {especie_predicha}")
-                return self._obtener_siguiente_mejor_prediccion(imagen, especies_excluir)
+                return self._obtener_siguiente_mejor_prediccion(imagen, especies_excluir, sesion.hash_imagen)
             
             sesion.agregar_prediccion(
                 especie=especie_predicha,
@@ -503,12 +338,14 @@ class EnhancedSessionManager:
         
         return resultado
     
-    def _obtener_siguiente_mejor_prediccion(self, imagen, especies_excluir):
+    def _obtener_siguiente_mejor_prediccion(self, imagen, especies_excluir, hash_imagen=None):
         """Obtiene la siguiente mejor predicción excluyendo especies ya descartadas."""
         try:
             print("🔄 SessionManager: Obteniendo siguiente mejor predicción...")
             
-            top_especies = self.predictor.obtener_top_especies(imagen, cantidad=10, especies_excluir=especies_excluir)
+            top_especies = self.predictor.obtener_top_especies(
+                imagen, cantidad=10, especies_excluir=especies_excluir, hash_imagen=hash_imagen
+            )
             
             if top_especies and len(top_especies) > 0:
                 for especie_data in top_especies:
@@ -590,10 +427,12 @@ class EnhancedSessionManager:
         return self.predictor.obtener_top_especies(
             imagen=sesion.imagen_original,
             cantidad=cantidad,
-            especies_excluir=sesion.especies_descartadas
+            especies_excluir=sesion.especies_descartadas,
+            hash_imagen=sesion.hash_imagen
         )
 
 session_manager = EnhancedSessionManager()
+monitor_sistema = MonitorSistema(session_manager.predictor)
 
 def crear_nueva_sesion(imagen_original=None):
     """Función de conveniencia para crear una nueva sesión de predicción."""
@@ -611,40 +450,14 @@ def obtener_estadisticas_sesiones():
     """Función de conveniencia para obtener estadísticas del sistema de sesiones."""
     return session_manager.session_manager.obtener_estadisticas()
 
+def obtener_estadisticas_cache_predicciones():
+    """Función de conveniencia para consultar aciertos y fallos del cache de predicciones."""
+    return session_manager.predictor.cache_predicciones.obtener_estadisticas()
+
 def verificar_sistema_prediccion():
-    """Verifica el estado y funcionalidad del sistema completo de predicción."""
-    try:
-        predictor = PlantPredictor()
-        
-        if not predictor.verificar_modelo_disponible():
-            return {
-                "disponible": False,
-                "error": "Modelo no disponible",
-                "solucion": "Ejecuta: python model/train_model.py"
-            }
-        
-        import numpy as np
-        test_image = np.random.random((224, 224, 3)).astype(np.float32)
-        resultado = predictor.predecir_planta(test_image)
-        
-        if resultado.get("exito"):
-            return {
-                "disponible": True,
-                "especies": len(predictor.model_utils.species_names),
-                "test_especie": resultado["especie_predicha"],
-                "test_confianza": resultado["confianza"]
-            }
-        else:
-            return {
-                "disponible": False,
-                "error": resultado.get("error", "Error desconocido")
-            }
-            
-    except Exception as e:
-        return {
-            "disponible": False,
-            "error": f"Error en sistema: {e}"
-        }
+    """Retorna el estado en cache del sistema de predicción, verificándolo solo la primera vez."""
+    monitor_sistema.iniciar()
+    return monitor_sistema.obtener_estado()
 
 if __name__ == "__main__":
     print("🔄 TESTING SISTEMA DE SESIONES MEJORADO")
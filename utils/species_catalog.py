@@ -0,0 +1,375 @@
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import FIREBASE_CONFIG, CATALOG_CONFIG, PATHS
+
+class CatalogoEspecies:
+    """Copia local en memoria de la colección de plantas de Firestore, indexada por nombre del modelo"""
+    
+    def __init__(self, normalizar_nombre, ruta_snapshot=None, config=None, circuito=None):
+        """
+        Args:
+            normalizar_nombre: Función que convierte el nombre científico de Firestore al formato del modelo
+            ruta_snapshot: Archivo JSON donde se persiste el catálogo para arranques en frío
+            config: Configuración del catálogo (por defecto CATALOG_CONFIG)
+            circuito: InterruptorCircuito por el que pasan las cargas completas desde Firestore
+        """
+        self.normalizar_nombre = normalizar_nombre
+        self.circuito = circuito
+        self.ruta_snapshot = Path(ruta_snapshot or PATHS["species_catalog_file"])
+        self.config = config or CATALOG_CONFIG
+        self.coleccion = FIREBASE_CONFIG["collections"]["plantas"]
+        
+        self._documentos = {}
+        self._por_nombre = {}
+        self._por_clave = {}
+        self._por_binomio = {}
+        self._resueltos = {}
+        self._ausentes = {}
+        self._lock = threading.RLock()
+        
+        self.origen = None
+        self.ultima_sincronizacion = None
+        self._marca_actualizacion = None
+        self._snapshot_intentado = False
+        self._ultimo_intento_remoto = 0.0
+        self._listener = None
+        self._hilo_carga = None
+        self._hilo_delta = None
+        self._detener = threading.Event()
+    
+    def asegurar_cargado(self, db=None, esperar=False):
+        """Garantiza que el catálogo tenga datos: primero desde Firestore y, si no es posible, desde el snapshot local.
+        
+        La carga desde Firestore corre en un hilo aparte para no bloquear las búsquedas,
+        que mientras tanto usan el snapshot; con esperar=True se hace en el hilo que llama.
+        """
+        if self.origen == "firestore":
+            return True
+        
+        if db is not None:
+            with self._lock:
+                reintentar = time.monotonic() - self._ultimo_intento_remoto >= self.config["retry_interval_seconds"]
+                if reintentar:
+                    self._ultimo_intento_remoto = time.monotonic()
+            
+            if reintentar and esperar:
+                self._cargar_remoto(db)
+            elif reintentar:
+                self._cargar_en_segundo_plano(db)
+        
+        if self.origen is None and not self._snapshot_intentado:
+            self._snapshot_intentado = True
+            self.cargar_snapshot()
+        
+        return self.origen is not None
+    
+    def _cargar_remoto(self, db):
+        """Carga la colección completa a través del circuito y arranca la sincronización."""
+        try:
+            if self.circuito is not None:
+                self.circuito.ejecutar(self.cargar_desde_firestore, db)
+            else:
+                self.cargar_desde_firestore(db)
+            self.iniciar_sincronizacion(db)
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar el catálogo desde Firestore: {e}")
+    
+    def _cargar_en_segundo_plano(self, db):
+        """Lanza la carga completa en un hilo, salvo que ya haya una en curso."""
+        with self._lock:
+            if self._hilo_carga is not None and self._hilo_carga.is_alive():
+                return
+            
+            self._hilo_carga = threading.Thread(
+                target=self._cargar_remoto,
+                args=(db,),
+                name="catalogo-carga",
+                daemon=True
+            )
+            self._hilo_carga.start()
+    
+    def cargar_desde_firestore(self, db):
+        """Lee la colección completa por páginas y reemplaza el índice en memoria."""
+        inicio = time.perf_counter()
+        tamano_pagina = self.config["page_size"]
+        consulta = db.collection(self.coleccion).order_by("__name__")
+        
+        documentos = {}
+        ultimo = None
+        while True:
+            pagina = consulta.limit(tamano_pagina)
+            if ultimo is not None:
+                pagina = pagina.start_after(ultimo)
+            
+            docs = list(pagina.stream())
+            for doc in docs:
+                documentos[doc.id] = doc.to_dict()
+            
+            if len(docs) < tamano_pagina:
+                break
+            ultimo = docs[-1]
+        
+        marcas = [d[self.config["update_field"]] for d in documentos.values() if d.get(self.config["update_field"]) is not None]
+        
+        with self._lock:
+            self._documentos = documentos
+            self._marca_actualizacion = max(marcas) if marcas else None
+            self._reconstruir_indice()
+            self.origen = "firestore"
+            self.ultima_sincronizacion = datetime.now().isoformat()
+        
+        print(f"📚 Catálogo de especies cargado: {len(documentos)} documentos "
+              f"en {(time.perf_counter() - inicio) * 1000:.0f}ms")
+        self.guardar_snapshot()
+    
+    def cargar_snapshot(self):
+        """Carga el catálogo persistido en disco, si existe."""
+        if not self.ruta_snapshot.exists():
+            return False
+        
+        try:
+            with open(self.ruta_snapshot, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            
+            with self._lock:
+                self._documentos = snapshot["documentos"]
+                self._marca_actualizacion = snapshot.get("marca_actualizacion")
+                self._reconstruir_indice()
+                self.origen = "snapshot"
+                self.ultima_sincronizacion = snapshot.get("sincronizado")
+            
+            print(f"📚 Catálogo de especies cargado desde snapshot local: {len(self._documentos)} documentos")
+            return True
+        
+        except Exception as e:
+            print(f"⚠️ Snapshot del catálogo inválido: {e}")
+            return False
+    
+    def guardar_snapshot(self):
+        """Persiste el catálogo en disco de forma atómica."""
+        try:
+            with self._lock:
+                snapshot = {
+                    "coleccion": self.coleccion,
+                    "sincronizado": self.ultima_sincronizacion,
+                    "marca_actualizacion": self._marca_actualizacion,
+                    "documentos": self._documentos
+                }
+                contenido = json.dumps(snapshot, ensure_ascii=False, default=str)
+            
+            self.ruta_snapshot.parent.mkdir(parents=True, exist_ok=True)
+            temporal = self.ruta_snapshot.with_suffix(".tmp")
+            with open(temporal, 'w', encoding='utf-8') as f:
+                f.write(contenido)
+            os.replace(temporal, self.ruta_snapshot)
+        
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el snapshot del catálogo: {e}")
+    
+    def iniciar_sincronizacion(self, db):
+        """Mantiene el catálogo actualizado con un listener de Firestore o con sincronización delta periódica."""
+        if self._listener is not None or self._hilo_delta is not None:
+            return
+        
+        if self.config["sync_mode"] == "listener":
+            consulta = db.collection(self.coleccion)
+            self._listener = consulta.on_snapshot(self._aplicar_cambios_listener)
+            print("👂 Listener del catálogo de especies activo")
+        
+        elif self.config["sync_mode"] == "delta":
+            self._hilo_delta = threading.Thread(
+                target=self._bucle_delta,
+                args=(db,),
+                name="catalogo-delta",
+                daemon=True
+            )
+            self._hilo_delta.start()
+    
+    def detener_sincronizacion(self):
+        """Cancela el listener o el hilo de sincronización delta."""
+        self._detener.set()
+        if self._listener is not None:
+            self._listener.unsubscribe()
+            self._listener = None
+    
+    def _aplicar_cambios_listener(self, documentos, cambios, momento_lectura):
+        """Callback de on_snapshot: aplica altas, modificaciones y bajas al índice."""
+        try:
+            with self._lock:
+                for cambio in cambios:
+                    doc = cambio.document
+                    if cambio.type.name == "REMOVED":
+                        self._documentos.pop(doc.id, None)
+                    else:
+                        self._documentos[doc.id] = doc.to_dict()
+                
+                self._reconstruir_indice()
+                self.ultima_sincronizacion = datetime.now().isoformat()
+            
+            if cambios:
+                self.guardar_snapshot()
+        
+        except Exception as e:
+            print(f"⚠️ Error aplicando cambios del catálogo: {e}")
+    
+    def sincronizar_delta(self, db):
+        """Trae solo los documentos modificados después de la última marca de actualización.
+        
+        Las bajas no se detectan por esta vía; se reflejan en la siguiente carga completa.
+        """
+        campo = self.config["update_field"]
+        with self._lock:
+            marca = self._marca_actualizacion
+        
+        consulta = db.collection(self.coleccion)
+        if marca is not None:
+            consulta = consulta.where(campo, '>', marca)
+        
+        # La lectura de red se hace sin el lock para no bloquear las búsquedas
+        documentos = [(doc.id, doc.to_dict()) for doc in consulta.order_by(campo).stream()]
+        actualizados = len(documentos)
+        
+        with self._lock:
+            for doc_id, data in documentos:
+                self._documentos[doc_id] = data
+                self._marca_actualizacion = data.get(campo, self._marca_actualizacion)
+            
+            if actualizados:
+                self._reconstruir_indice()
+            self.ultima_sincronizacion = datetime.now().isoformat()
+        
+        if actualizados:
+            print(f"🔄 Catálogo de especies: {actualizados} documentos actualizados")
+            self.guardar_snapshot()
+        
+        return actualizados
+    
+    def _bucle_delta(self, db):
+        """Ejecuta la sincronización delta periódicamente."""
+        while not self._detener.wait(self.config["delta_interval_seconds"]):
+            try:
+                self.sincronizar_delta(db)
+            except Exception as e:
+                print(f"⚠️ Sincronización delta del catálogo falló: {e}")
+    
+    def _reconstruir_indice(self):
+        """Reconstruye los índices de nombres: formato del modelo, clave normalizada y binomio."""
+        self._por_nombre = {}
+        self._por_clave = {}
+        self._por_binomio = {}
+        for doc_id, data in self._documentos.items():
+            nombre_firestore = data.get('nombre_cientifico', '')
+            if not nombre_firestore:
+                continue
+            
+            self._por_nombre[self.normalizar_nombre(nombre_firestore)] = doc_id
+            clave = normalizar_clave(nombre_firestore)
+            self._por_clave.setdefault(clave, doc_id)
+            self._por_binomio.setdefault(" ".join(clave.split()[:2]), set()).add(doc_id)
+        
+        # Los documentos cambiaron: las resoluciones y ausencias anteriores ya no son confiables
+        self._resueltos = {}
+        self._ausentes = {}
+    
+    def resolver(self, nombre):
+        """Resuelve cualquier variante de un nombre científico al id de su documento.
+        
+        Prueba en orden el nombre del modelo, la clave normalizada (guiones bajos, puntos,
+        autoría entre paréntesis y mayúsculas), el binomio género-especie si es único y
+        una coincidencia aproximada. El resultado se memoriza hasta el próximo cambio del catálogo.
+        
+        Returns:
+            str o None: Id del documento, o None si la especie no está en el catálogo
+        """
+        with self._lock:
+            if nombre in self._por_nombre:
+                return self._por_nombre[nombre]
+            if nombre in self._resueltos:
+                return self._resueltos[nombre]
+            if self.es_ausente(nombre):
+                return None
+            
+            clave = normalizar_clave(nombre)
+            doc_id = self._por_clave.get(clave)
+            candidatos = set()
+            
+            if doc_id is None:
+                candidatos = self._por_binomio.get(" ".join(clave.split()[:2]), set())
+                if len(candidatos) == 1:
+                    doc_id = next(iter(candidatos))
+            
+            # Un binomio compartido por varias autorías es ambiguo: no se adivina
+            if doc_id is None and not candidatos and self._por_clave:
+                parecidos = difflib.get_close_matches(clave, self._por_clave, n=1, cutoff=self.config["fuzzy_cutoff"])
+                if parecidos:
+                    doc_id = self._por_clave[parecidos[0]]
+                    print(f"🎯 Coincidencia aproximada: {nombre} → {parecidos[0]}")
+            
+            if doc_id is not None:
+                self._resueltos[nombre] = doc_id
+            elif self.origen == "firestore":
+                # Solo un catálogo completo y sincronizado permite afirmar que la especie no existe
+                self.registrar_ausente(nombre)
+            
+            return doc_id
+    
+    def registrar_ausente(self, nombre):
+        """Recuerda por un tiempo limitado que una especie no existe en Firestore."""
+        with self._lock:
+            self._ausentes[nombre] = time.monotonic() + self.config["negative_cache_ttl_seconds"]
+    
+    def es_ausente(self, nombre):
+        """Indica si la especie está en la cache negativa y su entrada sigue vigente."""
+        with self._lock:
+            expira = self._ausentes.get(nombre)
+            if expira is None:
+                return False
+            if time.monotonic() >= expira:
+                del self._ausentes[nombre]
+                return False
+            return True
+    
+    def obtener(self, nombre_modelo):
+        """Retorna los datos del documento de una especie, o None si no está en el catálogo."""
+        with self._lock:
+            doc_id = self.resolver(nombre_modelo)
+            return None if doc_id is None else self._documentos.get(doc_id)
+    
+    def nombres_firestore(self):
+        """Retorna el mapa nombre del modelo → nombre científico en Firestore."""
+        with self._lock:
+            return {
+                nombre: self._documentos[doc_id].get('nombre_cientifico')
+                for nombre, doc_id in self._por_nombre.items()
+            }
+    
+    def obtener_estadisticas(self):
+        """Resume el estado del catálogo local."""
+        with self._lock:
+            return {
+                "documentos": len(self._documentos),
+                "especies_indexadas": len(self._por_nombre),
+                "variantes_indexadas": len(self._por_clave),
+                "resoluciones_memorizadas": len(self._resueltos),
+                "ausentes_en_cache": len(self._ausentes),
+                "origen": self.origen,
+                "ultima_sincronizacion": self.ultima_sincronizacion,
+                "sincronizacion": self.config["sync_mode"] if (self._listener or self._hilo_delta) else None
+            }
+
+def normalizar_clave(nombre):
+    """Reduce un nombre científico a una clave comparable: sin guiones bajos ni puntos, en minúsculas."""
+    clave = nombre.replace('_', ' ').replace('.', ' ').lower()
+    clave = re.sub(r'\(\s*', '(', clave)
+    clave = re.sub(r'\s*\)', ')', clave)
+    clave = re.sub(r'\s*\(', ' (', clave)
+    return ' '.join(clave.split())
@@ -0,0 +1,195 @@
+import numpy as np
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import MODEL_CONFIG, PATHS
+
+VERSION_CACHE = 1
+
+class CacheTensores:
+    """Cache en disco de imágenes ya redimensionadas (uint8) mapeada en memoria y direccionada por hash de contenido"""
+    
+    def __init__(self, directorio=None, target_size=None):
+        self.directorio = Path(directorio or PATHS["tensor_cache_dir"])
+        self.target_size = tuple(target_size or MODEL_CONFIG["target_size"])
+        
+        target_h, target_w = self.target_size
+        self.forma_fila = (target_h, target_w, 3)
+        self.bytes_fila = target_h * target_w * 3
+        
+        self.config_preprocesamiento = {
+            "version": VERSION_CACHE,
+            "target_size": list(self.target_size),
+            "padding": "letterbox_centrado_negro",
+            "dtype": "uint8"
+        }
+        firma = json.dumps(self.config_preprocesamiento, sort_keys=True).encode()
+        self.clave_config = hashlib.blake2b(firma, digest_size=8).hexdigest()
+        
+        self.ruta_datos = self.directorio / f"imagenes_{self.clave_config}.u8"
+        self.ruta_indice = self.directorio / f"indice_{self.clave_config}.json"
+        
+        self._filas = {}
+        self._total_filas = 0
+        self._imagenes = None
+        self._lock = threading.Lock()
+        
+        self._cargar_indice()
+    
+    def _cargar_indice(self):
+        """Lee el índice hash → fila si corresponde a la misma configuración y al archivo de datos."""
+        if not self.ruta_indice.exists() or not self.ruta_datos.exists():
+            return
+        
+        try:
+            with open(self.ruta_indice, 'r', encoding='utf-8') as f:
+                indice = json.load(f)
+            
+            if indice.get("config") != self.config_preprocesamiento:
+                return
+            if self.ruta_datos.stat().st_size < indice["total_filas"] * self.bytes_fila:
+                print("⚠️ Cache de tensores incompleta, se reconstruirá")
+                return
+            
+            self._filas = indice["filas"]
+            self._total_filas = indice["total_filas"]
+        
+        except Exception as e:
+            print(f"⚠️ Índice de cache de tensores inválido, se reconstruirá: {e}")
+    
+    def _guardar_indice(self):
+        """Escribe el índice de forma atómica con un archivo temporal."""
+        temporal = self.ruta_indice.with_suffix(".tmp")
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({
+                "config": self.config_preprocesamiento,
+                "total_filas": self._total_filas,
+                "filas": self._filas
+            }, f)
+        os.replace(temporal, self.ruta_indice)
+    
+    def _abrir_memmap(self, total_filas, modo="r+"):
+        """Mapea el archivo de datos ajustando su tamaño al número de filas."""
+        self._imagenes = None
+        if total_filas == 0:
+            return
+        
+        with open(self.ruta_datos, 'ab') as f:
+            f.truncate(total_filas * self.bytes_fila)
+        
+        self._imagenes = np.memmap(
+            self.ruta_datos, dtype=np.uint8, mode=modo,
+            shape=(total_filas,) + self.forma_fila
+        )
+    
+    def preparar(self, rutas, hashes, processor, decodificador=None):
+        """Asegura que todas las imágenes estén en la cache decodificando solo las nuevas o modificadas.
+        
+        Args:
+            rutas: Rutas de las imágenes
+            hashes: Hash de contenido de cada ruta (del manifest del dataset)
+            processor: ImageProcessor para decodificar las imágenes faltantes
+            decodificador: DecodificadorParalelo opcional para las reconstrucciones grandes
+        
+        Returns:
+            np.ndarray: Fila de cada imagen en la cache (-1 si no pudo decodificarse)
+        """
+        with self._lock:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            
+            en_uso = set(hashes)
+            obsoletas = len(self._filas) - len(en_uso & set(self._filas))
+            if obsoletas > len(self._filas) // 2:
+                self._compactar(en_uso)
+            
+            # Las imágenes que fallaron quedan registradas con fila -1 y no se reintentan
+            # mientras su contenido no cambie
+            pendientes = {}
+            for ruta, hash_imagen in zip(rutas, hashes):
+                if hash_imagen not in self._filas and hash_imagen not in pendientes:
+                    pendientes[hash_imagen] = ruta
+            
+            if pendientes:
+                print(f"🧊 Cache de tensores: decodificando {len(pendientes)} imágenes nuevas")
+                self._agregar(pendientes, processor, decodificador)
+                self._guardar_indice()
+            else:
+                self._abrir_memmap(self._total_filas)
+            
+            return np.array([self._filas.get(h, -1) for h in hashes], dtype=np.int64)
+    
+    def _agregar(self, pendientes, processor, decodificador):
+        """Decodifica las imágenes pendientes y las agrega al final del archivo de datos."""
+        hashes = list(pendientes)
+        rutas = [pendientes[h] for h in hashes]
+        
+        inicio = self._total_filas
+        self._abrir_memmap(inicio + len(rutas))
+        escritas = 0
+        
+        if decodificador is not None and len(rutas) > decodificador.tamano_lote:
+            for desde in range(0, len(rutas), decodificador.tamano_lote):
+                bloque = slice(desde, desde + decodificador.tamano_lote)
+                imagenes, validas, _ = decodificador.decodificar_lote(rutas[bloque])
+                
+                for hash_imagen in np.array(hashes[bloque])[~validas]:
+                    self._filas[str(hash_imagen)] = -1
+                
+                for hash_imagen, imagen in zip(np.array(hashes[bloque])[validas], imagenes):
+                    self._imagenes[inicio + escritas] = np.rint(imagen * 255.0)
+                    self._filas[str(hash_imagen)] = inicio + escritas
+                    escritas += 1
+        else:
+            for hash_imagen, ruta in zip(hashes, rutas):
+                imagen = processor._cargar_rgb(ruta)
+                if imagen is None:
+                    self._filas[hash_imagen] = -1
+                    continue
+                
+                self._imagenes[inicio + escritas] = processor._redimensionar_con_aspecto(imagen)
+                self._filas[hash_imagen] = inicio + escritas
+                escritas += 1
+        
+        self._total_filas = inicio + escritas
+        self._imagenes.flush()
+        self._abrir_memmap(self._total_filas)
+    
+    def _compactar(self, en_uso):
+        """Reescribe el archivo de datos conservando solo las filas de imágenes vigentes."""
+        conservadas = sorted((fila, h) for h, fila in self._filas.items() if h in en_uso and fila >= 0)
+        fallidas = {h: -1 for h, fila in self._filas.items() if h in en_uso and fila < 0}
+        print(f"🧹 Compactando cache de tensores: {self._total_filas} → {len(conservadas)} filas")
+        
+        self._abrir_memmap(self._total_filas, modo="r")
+        temporal = self.ruta_datos.with_suffix(".tmp")
+        
+        if conservadas:
+            nuevas = np.memmap(temporal, dtype=np.uint8, mode="w+",
+                               shape=(len(conservadas),) + self.forma_fila)
+            for nueva_fila, (fila, _) in enumerate(conservadas):
+                nuevas[nueva_fila] = self._imagenes[fila]
+            nuevas.flush()
+            del nuevas
+        else:
+            temporal.touch()
+        
+        self._imagenes = None
+        os.replace(temporal, self.ruta_datos)
+        
+        self._filas = {h: nueva_fila for nueva_fila, (_, h) in enumerate(conservadas)}
+        self._filas.update(fallidas)
+        self._total_filas = len(conservadas)
+        self._guardar_indice()
+    
+    def leer_lote(self, filas):
+        """Lee las filas indicadas del memmap y las normaliza a float32 en [0, 1]."""
+        return np.divide(self._imagenes[filas], np.float32(255.0), dtype=np.float32)
+    
+    def obtener_imagenes(self):
+        """Retorna la vista uint8 (N, H, W, 3) del memmap sin copiar datos."""
+        return self._imagenes
@@ -0,0 +1,164 @@
+import sqlite3
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+from config import PATHS
+
+ESQUEMA_DIARIO = """
+CREATE TABLE IF NOT EXISTS escrituras (
+    secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT NOT NULL UNIQUE,
+    coleccion TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    creado REAL NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    ultimo_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_escrituras_estado ON escrituras (estado, secuencia);
+"""
+
+class DiarioEscrituras:
+    """Diario local en SQLite donde toda escritura hacia Firestore queda registrada antes de enviarse"""
+    
+    def __init__(self, ruta_db=None):
+        self.ruta_db = Path(ruta_db or PATHS["write_journal_file"])
+        self._conexion = None
+        self._lock = threading.RLock()
+    
+    def _conectar(self):
+        """Abre la base de datos del diario y crea el esquema si no existe."""
+        if self._conexion is None:
+            self.ruta_db.parent.mkdir(parents=True, exist_ok=True)
+            self._conexion = sqlite3.connect(str(self.ruta_db), check_same_thread=False)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("PRAGMA synchronous=NORMAL")
+            self._conexion.executescript(ESQUEMA_DIARIO)
+        return self._conexion
+    
+    def agregar(self, coleccion, doc_id, datos, clave=None):
+        """Registra una escritura pendiente.
+        
+        Args:
+            coleccion: Colección de destino en Firestore
+            doc_id: Id del documento de destino
+            datos: Contenido del documento
+            clave: Clave de deduplicación (por defecto coleccion/doc_id)
+        
+        Returns:
+            bool: True si se registró, False si ya existía una escritura con la misma clave
+        """
+        with self._lock:
+            conexion = self._conectar()
+            cursor = conexion.execute(
+                "INSERT OR IGNORE INTO escrituras (clave, coleccion, doc_id, datos, creado) VALUES (?, ?, ?, ?, ?)",
+                (clave or f"{coleccion}/{doc_id}", coleccion, doc_id, codificar_datos(datos), time.time())
+            )
+            conexion.commit()
+            return cursor.rowcount > 0
+    
+    def leer_pendientes(self, limite):
+        """Retorna las escrituras pendientes más antiguas en orden de llegada."""
+        with self._lock:
+            filas = self._conectar().execute(
+                "SELECT secuencia, coleccion, doc_id, datos FROM escrituras "
+                "WHERE estado = 'pendiente' ORDER BY secuencia LIMIT ?",
+                (limite,)
+            ).fetchall()
+        
+        return [
+            {"secuencia": secuencia, "coleccion": coleccion, "id": doc_id, "datos": decodificar_datos(datos)}
+            for secuencia, coleccion, doc_id, datos in filas
+        ]
+    
+    def confirmar(self, secuencias):
+        """Elimina del diario las escrituras ya confirmadas por Firestore."""
+        with self._lock:
+            conexion = self._conectar()
+            conexion.executemany("DELETE FROM escrituras WHERE secuencia = ?", [(s,) for s in secuencias])
+            conexion.commit()
+    
+    def registrar_fallo(self, secuencias, error, max_intentos):
+        """Suma un intento a las escrituras y marca como fallidas las que agotaron sus reintentos.
+        
+        Returns:
+            int: Número de escrituras que pasaron a estado fallido
+        """
+        with self._lock:
+            conexion = self._conectar()
+            conexion.executemany(
+                "UPDATE escrituras SET intentos = intentos + 1, ultimo_error = ? WHERE secuencia = ?",
+                [(str(error), s) for s in secuencias]
+            )
+            marcadores = ",".join("?" * len(secuencias))
+            cursor = conexion.execute(
+                f"UPDATE escrituras SET estado = 'fallido' WHERE intentos >= ? AND secuencia IN ({marcadores})",
+                (max_intentos, *secuencias)
+            )
+            conexion.commit()
+            return cursor.rowcount
+    
+    def reintentar_fallidas(self):
+        """Devuelve las escrituras fallidas a la cola de pendientes con sus intentos en cero."""
+        with self._lock:
+            conexion = self._conectar()
+            cursor = conexion.execute(
+                "UPDATE escrituras SET estado = 'pendiente', intentos = 0 WHERE estado = 'fallido'"
+            )
+            conexion.commit()
+            return cursor.rowcount
+    
+    def contar_pendientes(self):
+        """Retorna el número de escrituras pendientes."""
+        with self._lock:
+            return self._conectar().execute(
+                "SELECT COUNT(*) FROM escrituras WHERE estado = 'pendiente'"
+            ).fetchone()[0]
+    
+    def obtener_metricas(self):
+        """Retorna la profundidad del diario y el retraso de la escritura pendiente más antigua."""
+        with self._lock:
+            conexion = self._conectar()
+            profundidad, mas_antigua = conexion.execute(
+                "SELECT COUNT(*), MIN(creado) FROM escrituras WHERE estado = 'pendiente'"
+            ).fetchone()
+            fallidas = conexion.execute(
+                "SELECT COUNT(*) FROM escrituras WHERE estado = 'fallido'"
+            ).fetchone()[0]
+        
+        return {
+            "profundidad": profundidad,
+            "retraso_segundos": round(time.time() - mas_antigua, 1) if mas_antigua else 0.0,
+            "fallidas": fallidas
+        }
+    
+    def cerrar(self):
+        """Cierra la conexión con la base de datos."""
+        with self._lock:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
+
+def codificar_datos(datos):
+    """Serializa un documento a JSON conservando los datetime."""
+    def _codificar(valor):
+        if isinstance(valor, datetime):
+            return {"__datetime__": valor.isoformat()}
+        raise TypeError(f"Tipo no serializable en el diario: {type(valor)}")
+    
+    return json.dumps(datos, ensure_ascii=False, default=_codificar)
+
+def decodificar_datos(texto):
+    """Reconstruye un documento serializado con codificar_datos."""
+    def _decodificar(objeto):
+        if set(objeto) == {"__datetime__"}:
+            return datetime.fromisoformat(objeto["__datetime__"])
+        return objeto
+    
+    return json.loads(texto, object_hook=_decodificar)